@@ -24,6 +24,12 @@ except ImportError:
 # documentation root, use os.path.abspath to make it absolute, like shown here.
 sys.path.insert(0, os.path.abspath('..'))
 
+# Tab binds the plotting methods lazily. Bind the functions themselves, so
+# that autodoc picks up their docstrings.
+import tap
+import tap.plot
+tap.plot.EXT.apply(tap.Tab)
+
 # -- General configuration -----------------------------------------------------
 
 # If your documentation needs a minimal Sphinx version, state it here.
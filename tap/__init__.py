@@ -1,11 +1,18 @@
 from base import Tab, merge
 
-from reader import load
+from reader import load, load_chunks
+from stutil import RunningStats, RunningCorrel, QuantileSketch
+from stutil import RunningHistogram
+from extension import LazyExtension
 
+# the extension modules and their dependencies, e.g. matplotlib, are only 
+# imported when one of their methods is called
+EXTENSIONS = [
+  LazyExtension('plotting', 'tap.plot', 'plot_enrichment', 'plot', 
+                'plot_histogram', 'plot_bar', 'plot_hexbin', 'plot_density',
+                'plot_roc'),
+  LazyExtension('writer', 'tap.writer'),
+]
 
-import plot
-import writer
-
-for ext in [plot, writer]:
-  ext.EXT.apply(Tab)
-
+for ext in EXTENSIONS:
+  ext.apply(Tab)
@@ -0,0 +1,691 @@
+"""
+Vectorized column aggregates
+
+When NumPy is available, the statistics of :class:`~tap.Tab` (sum, mean,
+median, ...) are computed on ndarrays instead of Python lists. Each column is
+converted once into an array of values and a validity mask; the aggregates
+are then computed from the array in C. Without NumPy, the functions in this
+module return None and the callers fall back to :mod:`tap.stutil`.
+
+NumPy is imported on first use, not when importing this module.
+"""
+from __future__ import with_statement
+import math
+from column import ColumnarRows, IndexedRows
+from stutil import matthews_correl, percentile_index
+from stutil import RunningStats, RunningCorrel, QuantileSketch
+
+_NOT_LOADED = object()
+_numpy = _NOT_LOADED
+
+# dtype for the values of each numeric column type
+DTYPES = {'int' : 'int64', 'float' : 'float64', 'bool' : 'bool'}
+
+
+def numpy_module():
+  '''
+  Returns the numpy module, or None if numpy can not be imported
+  '''
+  global _numpy
+  if _numpy is _NOT_LOADED:
+    try:
+      import numpy
+      _numpy = numpy
+    except ImportError:
+      _numpy = None
+  return _numpy
+
+
+def _unpack_bitmap(np, bitmap, num_bits):
+  bits = np.unpackbits(np.frombuffer(bytes(bitmap), dtype=np.uint8))
+  # unpackbits is big-endian within a byte, the validity bitmap is not
+  return bits.reshape(-1, 8)[:, ::-1].ravel()[:num_bits].astype(bool)
+
+
+def _typed_arrays(np, column, dtype):
+  # the buffer is copied, the array.array may be resized later on
+  values = np.frombuffer(column.data, dtype=column.data.typecode).astype(dtype)
+  valid = None
+  if column.null_count > 0:
+    valid = _unpack_bitmap(np, column.valid, len(column))
+  return values, valid
+
+
+def _column_arrays(np, tab, idx, dtype):
+  num_rows = len(tab.rows)
+  if num_rows == 0:
+    return np.zeros(0, dtype=dtype), None
+  rows = tab.rows
+  if isinstance(rows, ColumnarRows):
+    column = rows.columns[idx]
+    if column.is_typed:
+      return _typed_arrays(np, column, dtype)
+  if isinstance(rows, IndexedRows) and rows.is_columnar:
+    column = rows.rows.columns[idx]
+    if column.is_typed:
+      # view on a columnar table: select the rows from the arrays of the
+      # whole column
+      values, valid = _typed_arrays(np, column, dtype)
+      indices = np.frombuffer(rows.indices, dtype=rows.indices.typecode)
+      if valid is not None:
+        valid = valid[indices]
+      return values[indices], valid
+  raw = list(tab[idx])
+  if None not in raw:
+    return np.array(raw, dtype=dtype), None
+  valid = np.fromiter((v is not None for v in raw), dtype=bool,
+                      count=num_rows)
+  values = np.array([v if v is not None else 0 for v in raw], dtype=dtype)
+  return values, valid
+
+
+def numeric_column(tab, col):
+  '''
+  Returns a :class:`NumericColumn` for column *col* of *tab*. Returns None if
+  numpy is not available, the column is not numeric or can not be represented
+  as an array (e.g. ints exceeding 64 bits).
+
+  :param col: column name or index
+  '''
+  np = numpy_module()
+  if np is None:
+    return None
+  if not isinstance(col, int):
+    col = tab.col_index(col)
+  col_type = tab.col_types[col]
+  if col_type not in DTYPES:
+    return None
+  try:
+    values, valid = _column_arrays(np, tab, col, DTYPES[col_type])
+  except (OverflowError, TypeError, ValueError):
+    return None
+  return NumericColumn(np, values, valid, col_type)
+
+
+def argsort(tab, cols, descending, na_position=None):
+  '''
+  Stable permutation sorting *tab* by the columns at the indices *cols*, see
+  :meth:`tap.Tab.argsort`. Returns None if numpy is not available or one of
+  the columns is not numeric.
+
+  :param descending: list of bools, true for the columns to sort in
+                     descending order
+  '''
+  keys = []
+  for col, desc in zip(cols, descending):
+    num_col = numeric_column(tab, col)
+    if num_col is None:
+      return None
+    np = num_col.np
+    values = num_col.values
+    if values.dtype.kind == 'f' and np.isnan(values).any():
+      # NaN is not ordered, leave its position to the Python sort
+      return None
+    if values.dtype.kind == 'b':
+      values = values.astype('int8')
+    if desc:
+      # negate for descending order, this keeps equal values in their order
+      if values.dtype.kind == 'i' and len(values) and \
+         values.min() == np.iinfo(values.dtype).min:
+        return None
+      values = -values
+    keys.append((values, num_col.valid, desc))
+  # lexsort sorts by the last key first. Within a column, the position of
+  # the None values takes precedence over the values.
+  lex_keys = []
+  for values, valid, desc in reversed(keys):
+    lex_keys.append(values)
+    if valid is not None:
+      nulls_first = na_position == 'first' or \
+                    (na_position is None and not desc)
+      lex_keys.append(valid if nulls_first else ~valid)
+  return np.lexsort(lex_keys).tolist()
+
+
+class NumericColumn(object):
+  '''
+  Values of a numeric column as ndarray together with a validity mask. The
+  mask is None when the column does not contain any None values.
+
+  Like the functions in :mod:`tap.stutil`, the aggregates raise a
+  :class:`RuntimeError` for empty columns.
+  '''
+  def __init__(self, np, values, valid, col_type):
+    self.np = np
+    self.values = values
+    self.valid = valid
+    self.col_type = col_type
+    self._non_null = None
+    self._sorted = None
+
+  @property
+  def non_null(self):
+    '''
+    Array of the values which are not None
+    '''
+    if self._non_null is None:
+      if self.valid is None:
+        self._non_null = self.values
+      else:
+        self._non_null = self.values[self.valid]
+    return self._non_null
+
+  @property
+  def sorted(self):
+    '''
+    Sorted array of the values which are not None
+    '''
+    if self._sorted is None:
+      self._sorted = self.np.sort(self.non_null, kind='mergesort')
+    return self._sorted
+
+  def _ensure_not_empty(self, what):
+    if len(self.non_null) == 0:
+      raise RuntimeError("Can't calculate %s of empty sequence" % what)
+
+  def count(self):
+    return len(self.non_null)
+
+  def sum(self):
+    if len(self.non_null) == 0:
+      return 0
+    if self.col_type == 'float':
+      return float(self.non_null.sum())
+    return int(self.non_null.sum(dtype='int64'))
+
+  def mean(self):
+    self._ensure_not_empty('mean')
+    return float(self.non_null.mean(dtype='float64'))
+
+  def _select(self, positions):
+    # values at positions of the sorted values. Unless they are sorted
+    # already, they are only partitioned around the positions, in O(n)
+    if self._sorted is not None:
+      return self._sorted[positions]
+    kth = sorted(set(positions))
+    return self.np.partition(self.non_null, kth)[positions]
+
+  def median(self):
+    self._ensure_not_empty('median')
+    num = len(self.non_null)
+    if num % 2 == 1:
+      return self._select([(num-1)/2])[0].item()
+    low, high = self._select([(num-1)/2, (num-1)/2+1])
+    return (float(low)+float(high))/2.0
+
+  def std_dev(self):
+    self._ensure_not_empty('mean')
+    return float(self.non_null.std(dtype='float64'))
+
+  def percentiles(self, nths):
+    num = len(self.non_null)
+    if num == 0:
+      return [None]*len(nths)
+    return self._select([percentile_index(num, nth) for nth in nths]).tolist()
+
+  def quantile_sketch(self, k=200):
+    '''
+    :class:`~tap.stutil.QuantileSketch` summarizing the values
+    '''
+    sketch = QuantileSketch(k)
+    sketch.add_sorted(self.sorted)
+    return sketch
+
+  def running_stats(self):
+    '''
+    :class:`~tap.stutil.RunningStats` accumulator holding the values
+    '''
+    values = self.non_null
+    if len(values) == 0:
+      return RunningStats()
+    mean = values.mean(dtype='float64')
+    diff = values - mean
+    return RunningStats.from_moments(len(values), mean,
+                                     self.np.dot(diff, diff), self.min(),
+                                     self.max())
+
+  def min(self):
+    if len(self.non_null) == 0:
+      return None
+    return self.non_null.min().item()
+
+  def max(self):
+    if len(self.non_null) == 0:
+      return None
+    return self.non_null.max().item()
+
+
+def _both_valid(np, col1, col2):
+  # mask of the positions where neither column is None, None if there are no
+  # None values at all
+  if col1.valid is None:
+    return col2.valid
+  if col2.valid is None:
+    return col1.valid
+  return col1.valid & col2.valid
+
+
+def _class_labels(class_num, class_dir, class_cutoff):
+  # bool array, true for the rows classified as positives
+  if class_num.col_type == 'bool':
+    return class_num.values
+  if class_dir == '-':
+    return class_num.values <= class_cutoff
+  return class_num.values >= class_cutoff
+
+
+def _ranked_counts(np, num_col, class_num, labels, descending):
+  # number of rows and of positives up to the end of each run of equal
+  # scores, starting with 0. Rows where the score or class is None are
+  # ignored. Returns None if the scores contain NaN.
+  scores, hits = num_col.values, labels
+  valid = _both_valid(np, num_col, class_num)
+  if valid is not None:
+    scores, hits = scores[valid], hits[valid]
+  if scores.dtype.kind == 'f' and np.isnan(scores).any():
+    return None
+  if len(scores) == 0:
+    return np.zeros(2, dtype='int64'), np.zeros(2, dtype='int64')
+  # the order of equal scores does not matter, the curve only gets a point
+  # after the last row of each score value
+  order = np.argsort(scores, kind='mergesort')
+  if descending:
+    order = order[::-1]
+  scores = scores[order]
+  hits = np.cumsum(hits[order], dtype='int64')
+  ends = np.append(np.flatnonzero(scores[1:] != scores[:-1]),
+                   len(scores) - 1)
+  return np.concatenate(([0], ends + 1)), np.concatenate(([0], hits[ends]))
+
+
+def _normalized_curve(x, y):
+  if x[-1] == 0 or y[-1] == 0:
+    return None
+  return x / float(x[-1]), y / float(y[-1])
+
+
+def ranking_curves(tab, score_cols, class_col, class_dir, class_cutoff,
+                   descending, roc):
+  '''
+  ROC (if *roc* is true) or enrichment curves of the columns at the indices
+  *score_cols*, see :meth:`tap.Tab.compute_roc`. Returns a list with one
+  curve or None per score column, or None if numpy is not available or one of
+  the columns can not be represented as an array.
+
+  :param descending: true to rank the highest scores first
+  '''
+  class_num = numeric_column(tab, class_col)
+  if class_num is None:
+    return None
+  np = class_num.np
+  labels = _class_labels(class_num, class_dir, class_cutoff)
+  curves = []
+  for col in score_cols:
+    num_col = numeric_column(tab, col)
+    if num_col is None:
+      return None
+    counts = _ranked_counts(np, num_col, class_num, labels, descending)
+    if counts is None:
+      return None
+    num, hits = counts
+    curve = _normalized_curve(num - hits if roc else num, hits)
+    if curve is not None:
+      curve = (curve[0].tolist(), curve[1].tolist())
+    curves.append(curve)
+  return curves
+
+
+def _mcc_counts(np, num_col, class_num, labels, score_dir, score_cutoff):
+  # confusion matrix with the same treatment of None scores as
+  # tap.Tab.compute_mcc: as None is smaller than any number, None scores are
+  # predicted positive for score_dir '-' and negative for '+'. For bool
+  # scores, None is never right.
+  values = num_col.values
+  if num_col.col_type == 'bool':
+    pred_pos, pred_neg = values, ~values
+  elif score_dir == '-':
+    pred_pos, pred_neg = values <= score_cutoff, values > score_cutoff
+  else:
+    pred_pos, pred_neg = values >= score_cutoff, values < score_cutoff
+  if num_col.valid is not None:
+    missing = ~num_col.valid
+    pred_pos = pred_pos & num_col.valid
+    pred_neg = pred_neg & num_col.valid
+    if num_col.col_type != 'bool':
+      if score_dir == '-':
+        pred_pos = pred_pos | missing
+      else:
+        pred_neg = pred_neg | missing
+  pos, neg = labels, ~labels
+  if class_num.valid is not None:
+    pos, neg = pos & class_num.valid, neg & class_num.valid
+  num_pos, num_neg = int(pos.sum()), int(neg.sum())
+  tp = int((pos & pred_pos).sum())
+  tn = int((neg & pred_neg).sum())
+  return tp, num_neg - tn, num_pos - tp, tn
+
+
+def score_metrics(tab, score_cols, class_col, metrics, score_dir, class_dir,
+                  score_cutoff, class_cutoff):
+  '''
+  Values of *metrics* for the columns at the indices *score_cols*, see
+  :meth:`tap.Tab.evaluate_scores`. Returns a list with one list of values
+  per score column, or None if numpy is not available or one of the columns
+  can not be represented as an array.
+  '''
+  class_num = numeric_column(tab, class_col)
+  if class_num is None:
+    return None
+  np = class_num.np
+  labels = _class_labels(class_num, class_dir, class_cutoff)
+  results = []
+  for col in score_cols:
+    num_col = numeric_column(tab, col)
+    if num_col is None:
+      return None
+    counts = None
+    if 'roc_auc' in metrics or 'enrichment_auc' in metrics:
+      counts = _ranked_counts(np, num_col, class_num, labels, score_dir=='+')
+      if counts is None:
+        return None
+    values = []
+    for metric in metrics:
+      if metric == 'mcc':
+        try:
+          values.append(matthews_correl(*_mcc_counts(np, num_col, class_num,
+                                                     labels, score_dir,
+                                                     score_cutoff)))
+        except RuntimeError:
+          values.append(None)
+        continue
+      num, hits = counts
+      curve = _normalized_curve(num - hits if metric == 'roc_auc' else num,
+                                hits)
+      values.append(curve and float(np.trapz(curve[1], curve[0])))
+    results.append(values)
+  return results
+
+
+def running_correl(col1, col2):
+  '''
+  :class:`~tap.stutil.RunningCorrel` accumulator holding the pairs of values
+  of two :class:`NumericColumn` instances where both values are not None
+  '''
+  np = col1.np
+  xs, ys = col1.values, col2.values
+  both = _both_valid(np, col1, col2)
+  if both is not None:
+    xs, ys = xs[both], ys[both]
+  if len(xs) == 0:
+    return RunningCorrel()
+  mean_x, mean_y = xs.mean(dtype='float64'), ys.mean(dtype='float64')
+  dx, dy = xs - mean_x, ys - mean_y
+  return RunningCorrel.from_moments(len(xs), mean_x, mean_y, np.dot(dx, dx),
+                                    np.dot(dy, dy), np.dot(dx, dy))
+
+
+def add_to_histogram(hist, num_col, weight_col=None):
+  '''
+  Adds the values of a :class:`NumericColumn` to the
+  :class:`~tap.stutil.RunningHistogram` *hist*, weighted by the values of
+  *weight_col*. Rows where the weight is None are ignored.
+  '''
+  np = num_col.np
+  values = num_col.values.astype('float64')
+  na = np.isnan(values)
+  if num_col.valid is not None:
+    na |= ~num_col.valid
+  weights = None
+  if weight_col is not None:
+    weights = weight_col.values
+    if weights.dtype.kind == 'b':
+      weights = weights.astype('int64')
+    if weight_col.valid is not None:
+      keep = weight_col.valid
+      values, na, weights = values[keep], na[keep], weights[keep]
+  def _total(selected):
+    if weights is None:
+      return int(np.count_nonzero(selected))
+    return weights[selected].sum().item()
+  na_count = _total(na)
+  if weights is not None:
+    weights = weights[~na]
+  values = values[~na]
+  edges = np.array(hist.edges)
+  below = _total(values < edges[0])
+  above = _total(values > edges[-1])
+  counts = np.histogram(values, bins=edges, weights=weights)[0]
+  hist.add_counts(counts.tolist(), below, above, na_count)
+
+
+def correl(col1, col2):
+  '''
+  Pearson correlation coefficient of two :class:`NumericColumn` instances,
+  only taking the positions into account where both values are not None.
+  Raises the same errors as :func:`tap.stutil.correl`.
+  '''
+  np = col1.np
+  xs, ys = col1.values, col2.values
+  both = _both_valid(np, col1, col2)
+  if both is not None:
+    xs, ys = xs[both], ys[both]
+  if len(xs) == 0:
+    raise RuntimeError("Can't calculate mean of empty sequence")
+  if len(xs) == 1:
+    raise RuntimeError("Can't calculate correl of sequences with length 1.")
+  dx = xs - xs.mean(dtype='float64')
+  dy = ys - ys.mean(dtype='float64')
+  sigma = math.sqrt(float(np.dot(dx, dx)))*math.sqrt(float(np.dot(dy, dy)))
+  if sigma == 0.0:
+    raise ZeroDivisionError('float division by zero')
+  return float(np.dot(dx, dy))/sigma
+
+
+def _average_ranks(np, values, order=None):
+  # ranks starting at 1, ties get the average of their ranks. order is the
+  # permutation sorting values, if it is known already
+  if order is None:
+    order = np.argsort(values, kind='mergesort')
+  ordered = values[order]
+  new_group = np.concatenate(([True], ordered[1:] != ordered[:-1]))
+  starts = np.flatnonzero(new_group)
+  ends = np.append(starts[1:], len(values))
+  ranks = np.empty(len(values), dtype='float64')
+  ranks[order] = ((starts+ends+1)/2.0)[np.cumsum(new_group)-1]
+  return ranks
+
+
+def _pair_correl(np, xs, ys):
+  try:
+    return correl(NumericColumn(np, xs, None, 'float'),
+                  NumericColumn(np, ys, None, 'float'))
+  except (RuntimeError, ZeroDivisionError):
+    return None
+
+
+def correl_matrix(num_cols, spearman=False, pairwise_na=True,
+                  chunk_size=65536):
+  '''
+  Pearson (or Spearman, if *spearman* is true) correlation coefficients of
+  all pairs of the :class:`NumericColumn` instances *num_cols*, see
+  :meth:`tap.Tab.correl_matrix`. Returns a list of lists, which contains None
+  where the coefficient is not defined.
+
+  The sums needed for the coefficients are accumulated with matrix products
+  over blocks of *chunk_size* rows, so that only one block of the columns is
+  held as matrix at a time.
+  '''
+  np = num_cols[0].np
+  values = [c.values for c in num_cols]
+  valid = [c.valid for c in num_cols]
+  if not pairwise_na:
+    complete = None
+    for mask in valid:
+      if mask is not None:
+        complete = mask if complete is None else complete & mask
+    if complete is not None:
+      values = [v[complete] for v in values]
+    valid = [None]*len(values)
+  raw_values = values
+  if spearman:
+    values = []
+    for v, mask in zip(raw_values, valid):
+      ranks = np.zeros(len(v), dtype='float64')
+      if mask is None:
+        ranks = _average_ranks(np, v)
+      else:
+        ranks[mask] = _average_ranks(np, v[mask])
+      values.append(ranks)
+  # center the columns on the mean of their values, the sums of each pair
+  # are then corrected for the mean of the rows used by the pair
+  centered = []
+  for v, mask in zip(values, valid):
+    v = v.astype('float64')
+    if mask is None:
+      if len(v):
+        v -= v.mean()
+    else:
+      if mask.any():
+        v -= v[mask].mean()
+      v[~mask] = 0.0
+    centered.append(v)
+  num_rows = len(values[0])
+  k = len(values)
+  missing = [mask is not None for mask in valid]
+  sxy = np.zeros((k, k))
+  if any(missing):
+    n = np.zeros((k, k))
+    sx = np.zeros((k, k))
+    sxx = np.zeros((k, k))
+  for start in xrange(0, num_rows, chunk_size):
+    stop = min(start+chunk_size, num_rows)
+    x = np.column_stack([v[start:stop] for v in centered])
+    sxy += np.dot(x.T, x)
+    if any(missing):
+      ones = np.ones(stop-start)
+      m = np.column_stack([mask[start:stop] if mask is not None else ones
+                           for mask in valid]).astype('float64')
+      n += np.dot(m.T, m)
+      sx += np.dot(x.T, m)
+      sxx += np.dot((x*x).T, m)
+  if not any(missing):
+    n = np.empty((k, k))
+    n.fill(num_rows)
+    sx = np.repeat(np.array([v.sum() for v in centered])[:, None], k, axis=1)
+    sxx = np.repeat(np.diag(sxy)[:, None], k, axis=1)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    cov = sxy - sx*sx.T/n
+    var_x = sxx - sx*sx/n
+    var_y = var_x.T
+    r = cov/np.sqrt(var_x*var_y)
+    undefined = (n < 2) | ~(var_x > 0) | ~(var_y > 0)
+  matrix = [[None if undefined[i, j] else float(r[i, j]) for j in range(k)]
+            for i in range(k)]
+  if spearman:
+    # ranks of the values in a column are only valid for pairs which use all
+    # of its values, pairs with other rows missing are ranked separately
+    counts = np.diag(n)
+    orders = [None]*k
+    for i in range(k):
+      for j in range(i+1, k):
+        if n[i, j] == counts[i] and n[i, j] == counts[j]:
+          continue
+        both = _both_valid(np, num_cols[i], num_cols[j])
+        rows = np.flatnonzero(both)
+        # position of each row of the pair among the rows of the pair
+        positions = np.cumsum(both)-1
+        pair_ranks = []
+        for col in (i, j):
+          if orders[col] is None:
+            orders[col] = np.argsort(raw_values[col], kind='mergesort')
+          # the order of the whole column, restricted to the rows of the
+          # pair, sorts the values of the pair without sorting again
+          order = orders[col][both[orders[col]]]
+          pair_ranks.append(_average_ranks(np, raw_values[col][rows],
+                                           positions[order]))
+        matrix[i][j] = _pair_correl(np, pair_ranks[0], pair_ranks[1])
+        matrix[j][i] = matrix[i][j]
+  return matrix
+
+
+def _per_group(group_values, present, num_groups, empty):
+  # list with one value per group, empty for the groups without values
+  if len(present) == num_groups:
+    return group_values.tolist()
+  result = [empty]*num_groups
+  for group, value in zip(present.tolist(), group_values.tolist()):
+    result[group] = value
+  return result
+
+
+def group_index(np, group_ids):
+  '''
+  Returns an int array with the index of the group of each row and the
+  permutation sorting the rows by group, as required by
+  :func:`group_aggregates`
+  '''
+  ids = np.array(group_ids, dtype='intp')
+  return ids, np.argsort(ids)
+
+
+def group_aggregates(num_col, index, num_groups, aggregates):
+  '''
+  Aggregates of the values of a :class:`NumericColumn` for each group, see
+  :meth:`tap.base.TabGroups.agg`. Returns a dict mapping each of the names
+  in *aggregates* to a list with one value per group.
+
+  :param index: group index of the rows, see :func:`group_index`
+  '''
+  np = num_col.np
+  ids, order = index
+  values = num_col.values
+  if 'median' in aggregates and len(values):
+    # sort by value within each group, with a single sort of the group
+    # index combined with the rank of the value
+    ranks = np.empty(len(values), dtype='int64')
+    ranks[np.argsort(values)] = np.arange(len(values))
+    order = np.argsort(ids*len(values)+ranks)
+  # the values of each group are a contiguous slice of the sorted values
+  values, ids = values[order], ids[order]
+  if num_col.valid is not None:
+    valid = num_col.valid[order]
+    values, ids = values[valid], ids[valid]
+  is_bool = values.dtype.kind == 'b'
+  if is_bool:
+    values = values.astype('int64')
+  counts = np.bincount(ids, minlength=num_groups)
+  present = np.flatnonzero(counts)
+  num = counts[present]
+  starts = (np.cumsum(counts)-counts)[present]
+  sums = None
+  if len(values):
+    sums = np.add.reduceat(values, starts)
+  result = {}
+  for name in aggregates:
+    if name == 'count':
+      result[name] = counts.tolist()
+      continue
+    if len(values) == 0:
+      result[name] = [0 if name == 'sum' else None]*num_groups
+      continue
+    if name == 'sum':
+      group_values = sums
+    elif name == 'mean':
+      group_values = sums/num.astype('float64')
+    elif name == 'std_dev':
+      means = sums/num.astype('float64')
+      diff = values-np.repeat(means, num)
+      group_values = np.sqrt(np.add.reduceat(diff*diff, starts)/num)
+    elif name == 'median':
+      low = values[starts+(num-1)//2].astype('float64')
+      high = values[starts+num//2].astype('float64')
+      group_values = (low+high)/2.0
+    elif name == 'min':
+      group_values = np.minimum.reduceat(values, starts)
+    else:
+      group_values = np.maximum.reduceat(values, starts)
+    if is_bool and name in ('min', 'max'):
+      group_values = group_values.astype(bool)
+    result[name] = _per_group(group_values, present, num_groups,
+                              0 if name == 'sum' else None)
+  return result
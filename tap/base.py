@@ -4,39 +4,36 @@ import math
 import itertools
 import operator
 import cPickle
-from stutil import median, mean, std_dev, correl
+import array
+import weakref
+from stutil import median, mean, std_dev, correl, ranks, trapz, matthews_correl
+from stutil import select, percentile_index
+from stutil import RunningStats, RunningCorrel, QuantileSketch
+from stutil import RunningHistogram
 import typeutil
 import format
-
-
-class BinaryColExpr:
-  def __init__(self, op, lhs, rhs):
-    self.op=op
-    self.lhs=lhs
-    self.rhs=rhs
-    if typeutil.is_scalar(lhs):
-      self.lhs=itertools.cyle([self.lhs])
-    if typeutil.is_scalar(rhs):
-      self.rhs=itertools.cycle([self.rhs])
-  def __iter__(self):
-    for l, r in zip(self.lhs, self.rhs):
-      if l!=None and r!=None:
-        yield self.op(l, r)
-      else:
-        yield None
-  def __add__(self, rhs):
-    return BinaryColExpr(operator.add, self, rhs)
-
-  def __sub__(self, rhs):
-    return BinaryColExpr(operator.sub, self, rhs)
-
-  def __mul__(self, rhs):
-    return BinaryColExpr(operator.mul, self, rhs)
-
-  def __div__(self, rhs):
-    return BinaryColExpr(operator.div, self, rhs)
-
-class TabCol:
+import accel
+import binary
+import join
+import group
+import parallel
+from column import Column, ColumnarRows, IndexedRows
+from index import HashIndex
+import expr
+from expr import ColExpr, LeafExpr, BinaryColExpr, ConstExpr
+
+# metrics supported by Tab.evaluate_scores
+SCORE_METRICS=('roc_auc', 'enrichment_auc', 'mcc')
+
+# aggregates supported by TabGroups.agg, in the order of the result columns
+GROUP_AGGREGATES=('count', 'sum', 'mean', 'median', 'std_dev', 'min', 'max')
+
+
+class TabCol(LeafExpr):
+  '''
+  Column of a table. Besides reading and writing the values of the column,
+  columns may be combined into expressions, see :mod:`tap.expr`.
+  '''
   def __init__(self, table, col):
     self._table=table
     if type(col)==str:
@@ -45,29 +42,58 @@ class TabCol:
       self.col_index=col
 
   def __iter__(self):
-    for row in self._table.rows:
-      yield row[self.col_index]
+    rows=self._table.rows
+    if isinstance(rows, ColumnarRows):
+      return iter(rows.columns[self.col_index])
+    if isinstance(rows, IndexedRows):
+      return iter(rows.column(self.col_index))
+    return (row[self.col_index] for row in rows)
 
   def __len__(self):
     return len(self._table.rows)
 
+  def __nonzero__(self):
+    return len(self)>0
+
   def __getitem__(self, index):
-    return self._table.rows[index][self.col_index]
+    rows=self._table.rows
+    if isinstance(rows, ColumnarRows):
+      return rows.columns[self.col_index][index]
+    return rows[index][self.col_index]
 
   def __setitem__(self, index, value):
-    self._table.rows[index][self.col_index]=value
-  
-  def __add__(self, rhs):
-    return BinaryColExpr(operator.add, self, rhs)
+    if self._table._views is not None:
+      self._table._before_modification()
+    rows=self._table.rows
+    hash_index=self._table._indices.get(self._table.col_names[self.col_index])
+    if hash_index is not None:
+      if index<0:
+        index+=len(rows)
+      hash_index.update(index, self[index], value)
+    if isinstance(rows, ColumnarRows):
+      rows.columns[self.col_index][index]=value
+    else:
+      rows[index][self.col_index]=value
+
+  def result_type(self):
+    return self._table.col_types[self.col_index]
 
-  def __sub__(self, rhs):
-    return BinaryColExpr(operator.sub, self, rhs)
+  def _leaf_key(self):
+    return (id(self._table), self.col_index)
 
-  def __mul__(self, rhs):
-    return BinaryColExpr(operator.mul, self, rhs)
+  def _leaf_values(self):
+    rows=self._table.rows
+    if isinstance(rows, ColumnarRows):
+      return rows.columns[self.col_index].tolist()
+    if isinstance(rows, IndexedRows):
+      return rows.column(self.col_index)
+    return [row[self.col_index] for row in rows]
 
-  def __div__(self, rhs):
-    return BinaryColExpr(operator.div, self, rhs)
+  def _leaf_arrays(self, np):
+    num_col=accel.numeric_column(self._table, self.col_index)
+    if num_col is None:
+      return None
+    return num_col.values, num_col.valid
 
 
 class Tab(object):
@@ -75,6 +101,8 @@ class Tab(object):
   """
 
   SUPPORTED_TYPES=('int', 'float', 'bool', 'string',)
+
+  STORAGE_TYPES=('rows', 'columnar',)
   
   
   def __init__(self, col_names=None, col_types=None, **kwargs):
@@ -84,9 +112,14 @@ class Tab(object):
     
     self.col_types = self._parse_col_types(col_types)
     self.rows=[]    
+    self._indices={}
+    # weak references to the views sharing the rows of the table, None if 
+    # there are none
+    self._views=None
     if len(kwargs)>=0:
       if not col_names:
         self.col_names=[v for v in kwargs.keys()]
+      self._update_col_indices()
       if not self.col_types:
         self.col_types=[typeutil.guess_array_type(kwargs.get(c, [None])) for c in self.col_names]
       if len(kwargs)>0:
@@ -94,13 +127,37 @@ class Tab(object):
 
   def __getattr__(self, col_name):
     # pickling doesn't call the standard __init__ defined above and thus
-    # col_names might not be defined. This leads to infinite recursions.
-    # Protect against it by checking that col_names is contained in 
+    # the column lookup might not be defined. This leads to infinite 
+    # recursions. Protect against it by checking that it is contained in 
     # __dict__
-    if 'col_names' not in self.__dict__ or col_name not in self.col_names:
+    if '_col_indices' not in self.__dict__ or not self.has_col(col_name):
       raise AttributeError(col_name)
     return TabCol(self, col_name)
 
+  def __getstate__(self):
+    state=dict(self.__dict__)
+    state.pop('_col_indices', None)
+    state.pop('_views', None)
+    # only store the names of the indexed columns, the indices are rebuilt
+    # when loading the table
+    state['_indices']=list(self._indices.keys())
+    return state
+
+  def __setstate__(self, state):
+    indexed_cols=state.pop('_indices', [])
+    self.__dict__.update(state)
+    self._update_col_indices()
+    self._views=None
+    self._indices={}
+    for col in indexed_cols:
+      self.create_index(col)
+
+  def _update_col_indices(self):
+    # maps column names to column indices. For duplicate names, the first 
+    # column wins, as for list.index
+    self._col_indices=dict((name, i) for i, name 
+                           in reversed(list(enumerate(self.col_names))))
+
 
   @staticmethod
   def _parse_col_types(col_types, exp_num=None):
@@ -120,6 +177,48 @@ class Tab(object):
     '''
     return self.name
 
+  def set_storage(self, storage):
+    '''
+    Set the storage backend of the table.
+
+    By default, the data of a table is stored as a list of rows (*rows*).
+    Alternatively, the data can be stored column-wise (*columnar*), where int,
+    float and bool columns are kept in typed, contiguous buffers. Columnar
+    storage is much more compact and speeds up column-wise operations such
+    as :meth:`sum`, :meth:`mean` or iterating over a column, at the expense
+    of row-wise access.
+
+    With columnar storage, :attr:`rows` is a list-like view on the columns
+    whose items are row proxies reading and writing the underlying columns.
+    :meth:`add_row`, :meth:`filter`, :meth:`sort`, :func:`merge` and all other
+    methods keep working as before.
+
+    :param storage: storage backend, either *rows* or *columnar*
+    :type storage: :class:`str`
+
+    :raises: :class:`ValueError` if storage is unknown
+    '''
+    if storage not in Tab.STORAGE_TYPES:
+      raise ValueError('unknown storage "%s"' % storage)
+    if storage==self.get_storage():
+      return
+    self._before_modification()
+    if storage=='columnar':
+      self.rows=ColumnarRows.from_rows(self.rows, self.col_types)
+    else:
+      self.rows=self.rows.to_rows()
+
+  def get_storage(self):
+    '''
+    Get the storage backend of the table, i.e. *rows* or *columnar*
+    '''
+    rows=self.rows
+    if isinstance(rows, IndexedRows):
+      rows=rows.rows
+    if isinstance(rows, ColumnarRows):
+      return 'columnar'
+    return 'rows'
+
   def rename_col(self, old_name, new_name):
     """
     Rename column *old_name* to *new_name*.
@@ -130,9 +229,12 @@ class Tab(object):
     """
     if old_name==new_name:
       return
+    hash_index=self._indices.pop(old_name, None)
     self.add_col(new_name, self.col_types[self.col_index(old_name)],
                 self[old_name])
     self.remove_col(old_name)
+    if hash_index is not None:
+      self._indices[new_name]=hash_index
 
   def col_index(self, col):
     '''
@@ -140,9 +242,20 @@ class Tab(object):
 
     :raises: ValueError if no column with the name is found
     '''
-    if col not in self.col_names:
-      raise ValueError('Tab has no column named "%s"' % col)
-    return self.col_names.index(col)
+    try:
+      idx=self._col_indices.get(col)
+    except TypeError:
+      idx=None
+    if idx==None or idx>=len(self.col_names) or self.col_names[idx]!=col:
+      # col_names may have been modified directly, update the lookup
+      self._update_col_indices()
+      try:
+        idx=self._col_indices.get(col)
+      except TypeError:
+        idx=None
+      if idx==None:
+        raise ValueError('Tab has no column named "%s"' % col)
+    return idx
   
   def get_col_names(self):
     '''
@@ -170,7 +283,11 @@ class Tab(object):
     '''
     Checks if the column with a given name is present in the table.
     '''
-    return col in self.col_names
+    try:
+      self.col_index(col)
+      return True
+    except ValueError:
+      return False
   
   def __getitem__(self, k):
     if type(k)==int:
@@ -179,13 +296,48 @@ class Tab(object):
       return TabCol(self, k)
 
   def __setitem__(self, k, value):
+    '''
+    Sets the values of a column, given by name or index. *value* may be a
+    scalar, an iterable or an expression over columns, e.g.
+
+    .. code-block:: python
+
+      tab['z']=tab.x*2+tab.y
+
+    Assigning to a column name which does not exist yet adds a new column.
+    Its type is the type of the expression or, for other values, is guessed
+    from the values.
+    '''
+    if isinstance(value, ColExpr):
+      col_type=value.result_type()
+      value=value.evaluate()
+    else:
+      col_type=None
     col_index=k
     if type(k)!=int:
+      if not self.has_col(k):
+        if col_type is None:
+          if typeutil.is_scalar(value):
+            col_type=typeutil.guess_array_type([value])
+          else:
+            value=list(value)
+            col_type=typeutil.guess_array_type(value)
+        self.add_col(k, col_type, value)
+        return
       col_index=self.col_index(k)
+    self._before_modification()
     if typeutil.is_scalar(value):
       value=itertools.cycle([value])
-    for r, v in zip(self.rows, value):
-      r[col_index]=v
+    if isinstance(self.rows, ColumnarRows):
+      column=self.rows.columns[col_index]
+      for i, v in itertools.izip(xrange(len(column)), value):
+        column[i]=v
+    else:
+      for r, v in zip(self.rows, value):
+        r[col_index]=v
+    col_name=self.col_names[col_index]
+    if col_name in self._indices:
+      self.create_index(col_name)
 
   def to_string(self, float_format='%.3f', int_format='%d', rows=None):
     '''
@@ -229,6 +381,20 @@ Statistics for column %(col)s
   min                    : %(min)f
   max                    : %(max)f
 '''
+     # convert the column only once for all of the statistics
+     num_col = accel.numeric_column(self, idx)
+     if num_col is not None:
+       data = {
+         'col' : col,
+         'num' : len(self.rows),
+         'num_non_null' : num_col.count(),
+         'median' : num_col.median(),
+         'mean' : num_col.mean(),
+         'stddev' : num_col.std_dev(),
+         'min' : num_col.min(),
+         'max' : num_col.max(),
+       }
+       return text % data
      data = {
        'col' : col,
        'num' : len(self.rows),
@@ -241,6 +407,94 @@ Statistics for column %(col)s
      }
      return text % data
 
+  def describe(self, cols=None, percentiles=(25, 50, 75), workers=None):
+    '''
+    Summary statistics of numeric columns. Returns a new table with one row
+    per column and the columns *col_name*, *count* (number of values which 
+    are not None), *mean*, *median*, *std_dev*, *min*, *max* and one column 
+    per percentile, named after the percentile, e.g. *p25*.
+
+    The columns are independent of each other, and can be distributed over 
+    several worker processes with *workers*. The data of the columns is 
+    copied into shared memory once, instead of being sent to the workers. 
+    This is fastest for tables with columnar storage (see 
+    :meth:`set_storage`).
+
+    **Example:**
+
+    .. code-block:: python
+
+      tab.set_storage('columnar')
+      print tab.describe(workers=8).to_string()
+
+    :param cols: names of the columns to describe. By default, all int, float 
+                 and bool columns are described.
+    :type cols: :class:`list`
+
+    :param percentiles: percentiles to compute, each between 0 and 100. See 
+                        :meth:`percentiles` for their definition.
+
+    :param workers: number of worker processes. By default, all columns are 
+                    described in the current process.
+    :type workers: :class:`int`
+
+    :raises: :class:`TypeError` if one of the columns is not numeric
+    '''
+    if cols is None:
+      cols=[name for name, col_type in zip(self.col_names, self.col_types)
+            if col_type in ('int', 'float', 'bool')]
+    indices=[self._ensure_col_type('describe', col, 'numeric') for col in cols]
+    for nth in percentiles:
+      if nth < 0 or nth > 100:
+        raise ValueError("percentiles must be between 0 and 100")
+    summaries=[None]*len(indices)
+    if workers>1 and len(indices)>1:
+      # share the typed column buffers with the workers, columns which can
+      # not be shared (e.g. ints exceeding 64 bits) are described here
+      shared=[]
+      for i, idx in enumerate(indices):
+        if isinstance(self.rows, ColumnarRows):
+          column=self.rows.columns[idx]
+        else:
+          column=Column(self.col_types[idx], self[idx])
+        if column.is_typed:
+          shared.append((i, parallel.SharedColumn(column)))
+        else:
+          summaries[i]=self._describe_col(idx, percentiles)
+      num_tasks=min(workers, len(shared))
+      tasks=[range(len(shared))[i::num_tasks] for i in range(num_tasks)]
+      results=parallel.map_in_processes(_describe_task, tasks, workers,
+                                        _init_describe_worker,
+                                        ([col for i, col in shared], 
+                                         percentiles))
+      for task, task_results in zip(tasks, results):
+        for j, summary in zip(task, task_results):
+          summaries[shared[j][0]]=summary
+    else:
+      summaries=[self._describe_col(idx, percentiles) for idx in indices]
+    names=['col_name', 'count', 'mean', 'median', 'std_dev', 'min', 'max']
+    names+=['p%g' % nth for nth in percentiles]
+    result=Tab(names, 'si'+'f'*(len(names)-2))
+    for col, summary in zip(cols, summaries):
+      result.add_row([col]+summary)
+    return result
+
+  def _describe_col(self, idx, nths):
+    # count, mean, median, std_dev, min, max and percentiles of a column
+    num_col=accel.numeric_column(self, idx)
+    if num_col is not None:
+      count=num_col.count()
+      if count==0:
+        return [0]+[None]*(5+len(nths))
+      return [count, num_col.mean(), num_col.median(), num_col.std_dev(),
+              num_col.min(), num_col.max()]+num_col.percentiles(nths)
+    vals=sorted(v for v in self[idx] if v!=None)
+    if len(vals)==0:
+      return [0]+[None]*(5+len(nths))
+    num=len(vals)
+    return [num, mean(vals), median(vals), std_dev(vals), vals[0], 
+            vals[-1]]+[vals[percentile_index(num, nth)] for nth in nths]
+
   def _add_rows_from_dict(self, d, overwrite=None):
     '''
     Add one or more rows from a :class:`dictionary <dict>`.
@@ -276,6 +530,9 @@ Statistics for column %(col)s
         raise ValueError("Cannot add rows: length of data must be equal " + \
                          "for all columns in %s"%str(d))
     
+    if overwrite:
+      overwrite_idx = self.col_index(overwrite)
+
     # convert column based dict to row based dict and create row and add data
     for i,data in enumerate(zip(*d.values())):
       new_row = [None for a in range(len(self.col_names))]
@@ -284,20 +541,18 @@ Statistics for column %(col)s
         
       # partially overwrite existing row with new data
       if overwrite:
-        overwrite_idx = self.col_index(overwrite)
         added = False
-        for i,r in enumerate(self.rows):
-          if r[overwrite_idx]==new_row[overwrite_idx]:
-            for j,e in enumerate(self.rows[i]):
-              if new_row[j]==None:
-                new_row[j] = e
-            self.rows[i] = new_row
-            added = True
-            break
+        i = self._find_row(overwrite_idx, new_row[overwrite_idx])
+        if i!=None:
+          for j,e in enumerate(self.rows[i]):
+            if new_row[j]==None:
+              new_row[j] = e
+          self._replace_row(i, new_row)
+          added = True
           
       # if not overwrite or overwrite did not find appropriate row
       if not overwrite or not added:
-        self.rows.append(new_row)
+        self._append_row(new_row)
 
   def _ensure_col_type(self, func, col, ty): 
     idx = self.col_index(col)
@@ -420,15 +675,91 @@ Statistics for column %(col)s
       if overwrite:
         overwrite_idx = self.col_index(overwrite)
         added = False
-        for i,r in enumerate(self.rows):
-          if r[overwrite_idx]==new_row[overwrite_idx]:
-            self.rows[i] = new_row
-            added = True
-            break
+        i = self._find_row(overwrite_idx, new_row[overwrite_idx])
+        if i!=None:
+          self._replace_row(i, new_row)
+          added = True
       
       # if not overwrite or overwrite did not find appropriate row
       if not overwrite or not added:
-        self.rows.append(new_row)
+        self._append_row(new_row)
+
+  def _find_row(self, col_idx, value):
+    # index of the first row whose value in column col_idx equals value, or
+    # None. Uses the hash index of the column, if there is one.
+    hash_index=self._indices.get(self.col_names[col_idx])
+    if hash_index is not None:
+      try:
+        return hash_index.first(value)
+      except TypeError:
+        # unhashable value, fall back to a scan
+        pass
+    for i, row in enumerate(self.rows):
+      if row[col_idx]==value:
+        return i
+    return None
+
+  def _indexed_cols(self):
+    return [(self.col_index(col), hash_index) 
+            for col, hash_index in self._indices.iteritems()]
+
+  def _append_row(self, row):
+    if self._views is not None:
+      self._before_modification()
+    self.rows.append(row)
+    if self._indices:
+      row_idx=len(self.rows)-1
+      for col_idx, hash_index in self._indexed_cols():
+        hash_index.add(row[col_idx], row_idx)
+
+  def _replace_row(self, row_idx, row):
+    if self._views is not None:
+      self._before_modification()
+    if self._indices:
+      old_row=self.rows[row_idx]
+      for col_idx, hash_index in self._indexed_cols():
+        hash_index.update(row_idx, old_row[col_idx], row[col_idx])
+    self.rows[row_idx]=row
+
+  def create_index(self, col):
+    '''
+    Creates a hash index on column *col*. The index maps each value of the
+    column to the rows holding that value. It speeds up finding the row to
+    overwrite in :meth:`add_row` with ``overwrite=col`` and equality
+    predicates on *col* in :meth:`filter` from a scan over all rows to a
+    dictionary lookup.
+
+    The index is kept up-to-date when rows are added, overwritten or sorted
+    and when values are assigned through the table. Modifying 
+    :attr:`rows` directly leaves the index stale; call :meth:`create_index` 
+    again to rebuild it.
+
+    Creating the index for an already indexed column rebuilds it.
+
+    :param col: name of the column
+    :type col: :class:`str`
+    :raises: :exc:`ValueError` when *col* is not a valid column
+    '''
+    self._indices[col]=HashIndex(self[self.col_index(col)])
+
+  def drop_index(self, col):
+    '''
+    Removes the hash index on column *col*, if there is one.
+
+    :param col: name of the column
+    :type col: :class:`str`
+    '''
+    self._indices.pop(col, None)
+
+  def has_index(self, col):
+    '''
+    Returns true, if there is a hash index on column *col*
+    '''
+    return col in self._indices
+
+  def _rebuild_indices(self):
+    for col in self._indices.keys():
+      self.create_index(col)
 
   def remove_col(self, col):
     """
@@ -438,8 +769,14 @@ Statistics for column %(col)s
     :type col: :class:`str`
     """
     idx = self.col_index(col)
+    self._before_modification()
     del self.col_names[idx]
     del self.col_types[idx]
+    self._update_col_indices()
+    self._indices.pop(col, None)
+    if isinstance(self.rows, ColumnarRows):
+      self.rows.remove_column(idx)
+      return
     for row in self.rows:
       del row[idx]
 
@@ -506,12 +843,17 @@ Statistics for column %(col)s
     None, rows are added for every item in data.
     """
 
-    if col_name in self.col_names:
+    if self.has_col(col_name):
       raise ValueError('Column with name %s already exists'%col_name)
 
     col_type = self._parse_col_types(col_type, exp_num=1)[0]
+    self._before_modification()
+    if isinstance(self.rows, ColumnarRows):
+      self._add_column(col_name, col_type, data)
+      return
     self.col_names.append(col_name)
     self.col_types.append(col_type)
+    self._col_indices[col_name]=len(self.col_names)-1
 
     if len(self.rows)>0:
       if typeutil.is_scalar(data):
@@ -521,18 +863,42 @@ Statistics for column %(col)s
         if hasattr(data, '__len__') and len(data)!=len(self.rows):
           self.col_names.pop()
           self.col_types.pop()
+          del self._col_indices[col_name]
           raise ValueError('Length of data (%i) must correspond to number of '%len(data) +\
                            'existing rows (%i)'%len(self.rows))
         for row, d in zip(self.rows, data):
           row.append(d)
 
-    elif data!=None and len(self.col_names)==1:
+    elif data is not None and len(self.col_names)==1:
       if typeutil.is_scalar(data):
         self.add_row({col_name : data})
       else:
         for v in data:
           self.add_row({col_name : v})
 
+  def _add_column(self, col_name, col_type, data):
+    # add_col for columnar storage
+    num_rows = len(self.rows)
+    if num_rows==0:
+      values = []
+      if data is not None and len(self.col_names)==0:
+        if typeutil.is_scalar(data):
+          data = [data]
+        values = [typeutil.coerce(v, col_type) for v in data]
+      self.rows = ColumnarRows(self.rows.columns+[Column(col_type, values)])
+    elif typeutil.is_scalar(data):
+      self.rows.add_column(Column(col_type, itertools.repeat(data, num_rows)))
+    else:
+      if hasattr(data, '__len__') and len(data)!=num_rows:
+        raise ValueError('Length of data (%i) must correspond to number of '%len(data) +\
+                         'existing rows (%i)'%num_rows)
+      values = list(itertools.islice(data, num_rows))
+      values.extend([None]*(num_rows-len(values)))
+      self.rows.add_column(Column(col_type, values))
+    self.col_names.append(col_name)
+    self.col_types.append(col_type)
+    self._col_indices[col_name]=len(self.col_names)-1
+
   def filter(self, *args, **kwargs):
     """
     Returns a filtered table only containing rows matching all the predicates 
@@ -550,42 +916,299 @@ Statistics for column %(col)s
       tab.filter(town='Basel', male=True)
       
     will return the rows with "town" equal to "Basel" and "male" equal to true.
+    If the value of a keyword argument is a set, the rows holding any of the
+    values in the set are returned, e.g. ``tab.filter(town=set(['Basel', 
+    'Bern']))``.
+
     args are unary callables returning true if the row should be included in the
-    result and false if not.
+    result and false if not. Alternatively, args may be expressions over the 
+    columns of the table, see :mod:`tap.expr`, e.g.
+
+    .. code-block:: python
+
+      tab.filter((tab.score>0.5) & (tab.town!='Basel'))
+      tab.filter(tab.score.between(0.2, 0.8), tab.town.isin(towns))
+
+    will return the rows where the expression is true. Rows for which the 
+    expression is None are not included.
+
+    The keyword arguments and expressions are compiled into a single 
+    expression, which is evaluated in one pass over the columns. Callables are
+    only called for the rows matching all other predicates. The values of the
+    matching rows are copied into the new table as they are, without 
+    coercing them again.
+
+    To obtain the matching rows without copying them, use 
+    :meth:`filter_indices` or :meth:`filter_mask`.
     """
-    filt_tab=Tab(list(self.col_names), list(self.col_types))
-    for row in self.rows:
-      matches=True
-      for func in args:
-        if not func(row):
-          matches=False
-          break
-      for key, val in kwargs.iteritems():
-        if row[self.col_index(key)]!=val:
-          matches=False
-          break
-      if matches:
-        filt_tab.add_row(row)
-    return filt_tab
+    return self._take_rows(self.filter_indices(*args, **kwargs))
+
+  def filter_indices(self, *args, **kwargs):
+    """
+    Returns the indices of the rows matching all the predicates in kwargs and 
+    args, in ascending order. The predicates are the same as for 
+    :meth:`filter`.
+    """
+    candidates, indexed_key=self._candidate_indices(kwargs)
+    preds=[]
+    rows=self.rows
+    for key, val in kwargs.iteritems():
+      if candidates is None:
+        preds.append(self._kwarg_predicate(key, val))
+      elif key!=indexed_key:
+        # only a few candidate rows, test them directly
+        idx=self.col_index(key)
+        if isinstance(val, (set, frozenset)):
+          candidates=[i for i in candidates if rows[i][idx] in val]
+        else:
+          candidates=[i for i in candidates if rows[i][idx]==val]
+    funcs=[]
+    for arg in args:
+      if isinstance(arg, ColExpr):
+        if len(arg)!=len(rows):
+          raise ValueError('Length of expression (%i) must correspond to '
+                           'number of rows (%i)' % (len(arg), len(rows)))
+        preds.append(arg)
+      else:
+        funcs.append(arg)
+
+    # predicates evaluating to bools are combined into a single expression, 
+    # others are evaluated separately, since & does not give their truth value
+    conds=[pred for pred in preds if pred.result_type()=='bool']
+    selected=candidates
+    if conds:
+      matching=expr.true_indices(*conds)
+      if selected is None:
+        selected=matching
+      else:
+        matching=set(matching)
+        selected=[i for i in selected if i in matching]
+    if selected is None:
+      selected=xrange(len(rows))
+    for pred in preds:
+      if pred.result_type()!='bool':
+        mask=pred.evaluate()
+        selected=[i for i in selected if mask[i]]
+    for func in funcs:
+      selected=[i for i in selected if func(rows[i])]
+    return list(selected)
+
+  def filter_mask(self, *args, **kwargs):
+    """
+    Returns a list containing true for the rows matching all the predicates in
+    kwargs and args and false for all other rows. The predicates are the same 
+    as for :meth:`filter`.
+    """
+    mask=[False]*len(self.rows)
+    for row_idx in self.filter_indices(*args, **kwargs):
+      mask[row_idx]=True
+    return mask
+
+  def _kwarg_predicate(self, key, val):
+    # expression for the keyword argument key=val of filter
+    col=TabCol(self, key)
+    if isinstance(val, (set, frozenset)):
+      return col.isin(val)
+    if val is None:
+      return col==None
+    return BinaryColExpr('==', col, ConstExpr(val))
+
+  def _candidate_indices(self, kwargs):
+    # indices of the rows which may match the equality predicates in kwargs. 
+    # When one of the columns is indexed, these are only the rows holding the 
+    # value in the indexed column with the fewest matches. Returns None and 
+    # None if none of the columns is indexed and the indices and the name of 
+    # the indexed column otherwise.
+    candidates, indexed_key=None, None
+    for key, val in kwargs.iteritems():
+      hash_index=self._indices.get(key)
+      if hash_index is None:
+        continue
+      try:
+        if isinstance(val, (set, frozenset)):
+          row_indices=sorted(set(itertools.chain.from_iterable(
+                             hash_index.lookup(v) for v in val)))
+        else:
+          row_indices=hash_index.lookup(val)
+      except TypeError:
+        continue
+      if candidates is None or len(row_indices)<len(candidates):
+        candidates, indexed_key=row_indices, key
+    return candidates, indexed_key
+
+  def _take_rows(self, indices):
+    # new table containing the rows at indices, in that order. The values are
+    # copied without coercing them.
+    tab=Tab(list(self.col_names), list(self.col_types))
+    rows=self.rows
+    if isinstance(rows, ColumnarRows):
+      tab.rows=ColumnarRows([col.take(indices) for col in rows.columns],
+                            len(indices))
+    elif isinstance(rows, IndexedRows):
+      tab.rows=rows.take(indices)
+    else:
+      tab.rows=[list(rows[i]) for i in indices]
+    return tab
 
-  def sort(self, by, order='+'):
+  def view(self, rows=None):
     """
-    Performs an in-place sort of the table, based on column *by*.
+    Returns a :class:`TabView` on the given rows of the table, without copying
+    them.
 
-    :param by: column name by which to sort
-    :type by: :class:`str`
+    :param rows: the rows to include, either a :class:`slice` or an iterable 
+                 of row indices. All rows, if None.
+    :raises: :class:`IndexError` if one of the row indices is out of range
+    """
+    num_rows=len(self.rows)
+    if rows is None:
+      rows=slice(None)
+    if isinstance(rows, slice):
+      indices=array.array('l', xrange(*rows.indices(num_rows)))
+    else:
+      indices=array.array('l', rows)
+      if indices and (min(indices)<-num_rows or max(indices)>=num_rows):
+        raise IndexError('row index out of range')
+      if indices and min(indices)<0:
+        indices=array.array('l', (i+num_rows if i<0 else i for i in indices))
+    return TabView(self, indices)
+
+  def filter_view(self, *args, **kwargs):
+    """
+    Same as :meth:`filter`, but returns a :class:`TabView` on the matching 
+    rows instead of a copy of them.
+    """
+    indices=array.array('l', self.filter_indices(*args, **kwargs))
+    return TabView(self, indices)
 
-    :param order: ascending (``-``) or descending (``+``) order
-    :type order: :class:`str` (i.e. *+*, *-*)
+  def head(self, num=10):
     """
-    sign=-1
-    if order=='-':
-      sign=1
-    key_index=self.col_index(by)
-    def _key_cmp(lhs, rhs):
-      return sign*cmp(lhs[key_index], rhs[key_index])
-    self.rows=sorted(self.rows, _key_cmp)
-    
+    Returns a :class:`TabView` on the first *num* rows of the table
+    """
+    return self.view(slice(0, num))
+
+  def tail(self, num=10):
+    """
+    Returns a :class:`TabView` on the last *num* rows of the table
+    """
+    return self.view(slice(max(len(self.rows)-num, 0), None))
+
+  def _before_modification(self):
+    # called before the rows of the table are modified. Views share the rows
+    # with the table, so they receive a copy of their rows first.
+    if self._views is None:
+      return
+    for view in self._views.keys():
+      view._materialize()
+    self._views=None
+
+  def sort(self, by, order='+', na_position=None):
+    """
+    Performs an in-place sort of the table, based on one or several columns.
+    The sort is stable, i.e. rows with equal values keep their relative 
+    order.
+
+    :param by: column name by which to sort, or list of column names. Rows 
+               with equal values in the first column are sorted by the second 
+               column and so on.
+    :type by: :class:`str` or :class:`list`
+
+    :param order: ascending (``-``) or descending (``+``) order, or a list 
+                  with the order for each column in *by*
+    :type order: :class:`str` (i.e. *+*, *-*) or :class:`list`
+
+    :param na_position: where to put None values, either *first* or *last*.
+                        By default, None is smaller than any other value,
+                        i.e. None values come first in ascending and last in
+                        descending order.
+
+    :returns: the permutation applied to the rows, i.e. a list whose item *i*
+              is the index row *i* had before sorting. It can be used to 
+              reorder other data aligned with the rows of the table.
+    """
+    perm=self.argsort(by, order, na_position)
+    self._before_modification()
+    if isinstance(self.rows, ColumnarRows):
+      self.rows.reorder(perm)
+    else:
+      rows=self.rows
+      self.rows=[rows[i] for i in perm]
+    self._rebuild_indices()
+    return perm
+
+  def argsort(self, by, order='+', na_position=None):
+    """
+    Returns the permutation sorting the table without modifying the table. 
+    The arguments are the same as for :meth:`sort`.
+
+    :returns: list of row indices in sorted order
+    """
+    if isinstance(by, basestring):
+      by=[by]
+    if not by:
+      raise ValueError('at least one column to sort by is required')
+    if isinstance(order, basestring):
+      order=[order]*len(by)
+    if len(order)!=len(by):
+      raise ValueError('number of orders (%d) must correspond to number of '
+                       'columns (%d)' % (len(order), len(by)))
+    if na_position not in (None, 'first', 'last'):
+      raise ValueError('na_position must be "first" or "last", not "%s"' % 
+                       na_position)
+    col_indices=[self.col_index(col) for col in by]
+    descending=[o!='-' for o in order]
+    perm=accel.argsort(self, col_indices, descending, na_position)
+    if perm is not None:
+      return perm
+    perm=range(len(self.rows))
+    # successive stable sorts, starting with the least significant column
+    for col_idx, desc in reversed(zip(col_indices, descending)):
+      values=list(self[col_idx])
+      key=values.__getitem__
+      if na_position is not None and None in values:
+        if (na_position=='last')!=desc:
+          key=lambda i: (values[i] is None, values[i])
+        else:
+          key=lambda i: (values[i] is not None, values[i])
+      perm.sort(key=key, reverse=desc)
+    return perm
+
+  def group_by(self, cols, method='auto'):
+    """
+    Groups the rows of the table by the values of one or several columns. 
+    Returns a :class:`TabGroups` object, whose :meth:`~TabGroups.agg` method 
+    computes aggregates for each group:
+
+    .. code-block:: python
+
+      per_target=tab.group_by('target').agg(mean='score', count='id')
+      print per_target.to_string()
+
+    The groups are determined in a single pass over the table, instead of 
+    filtering the table once for each distinct value. Rows with None in one 
+    of the columns form their own group.
+
+    :param cols: column name or list of column names
+    :type cols: :class:`str` or :class:`list`
+
+    :param method: *hash* looks up the values of each row in a dictionary, 
+                   *sort* walks the rows in sorted order. *auto* uses *sort*
+                   if the table is already sorted by the columns and *hash* 
+                   otherwise.
+
+    :raises: :class:`ValueError` if *method* is unknown
+    """
+    if isinstance(cols, basestring):
+      cols=[cols]
+    if not cols:
+      raise ValueError('at least one column to group by is required')
+    col_indices=[self.col_index(col) for col in cols]
+    if len(col_indices)==1:
+      keys=list(self[col_indices[0]])
+    else:
+      keys=zip(*[list(self[idx]) for idx in col_indices])
+    unique, group_ids=group.group_rows(keys, method)
+    return TabGroups(self, col_indices, unique, group_ids)
+
   def get_unique(self, col, ignore_nan=True):
     """
     Extract a list of all unique values from one column
@@ -596,11 +1219,9 @@ Statistics for column %(col)s
     :param ignore_nan: ignore all *None* values
     :type ignore_nan: :class:`bool`
     """
-    idx = self.col_index(col)
     seen = {}
     result = []
-    for row in self.rows:
-      item = row[idx]
+    for item in self[col]:
       if item!=None or ignore_nan==False:
         if item in seen: continue
         seen[item] = 1
@@ -649,9 +1270,9 @@ Statistics for column %(col)s
     elif col_type=='string':
       max_val = chr(0)
     max_idx = None
-    for i in range(0, len(self.rows)):
-      if self.rows[i][idx]>max_val:
-        max_val = self.rows[i][idx]
+    for i, val in enumerate(self[idx]):
+      if val>max_val:
+        max_val = val
         max_idx = i
     return max_val, max_idx
 
@@ -703,9 +1324,9 @@ Statistics for column %(col)s
     elif col_type=='string':
       min_val=chr(255)
     min_idx=None
-    for i,row in enumerate(self.rows):
-      if row[idx]!=None and row[idx]<min_val:
-        min_val=row[idx]
+    for i, val in enumerate(self[idx]):
+      if val!=None and val<min_val:
+        min_val=val
         min_idx=i
     return min_val, min_idx
 
@@ -755,8 +1376,11 @@ Statistics for column %(col)s
 
     :raises: :class:`TypeError` if column type is ``string``
     """
-    self._ensure_col_type('sum', col, 'numeric')
+    idx = self._ensure_col_type('sum', col, 'numeric')
 
+    num_col = accel.numeric_column(self, idx)
+    if num_col is not None:
+      return num_col.sum()
     return sum([x for x in self[col] if x!=None])
 
   def mean(self, col):
@@ -773,11 +1397,13 @@ Statistics for column %(col)s
 
     :raises: :class:`TypeError` if column type is ``string``
     """
-    self._ensure_col_type('mean', col, 'numeric') 
-
-    vals = [v for v in self[col] if v!=None]
+    idx = self._ensure_col_type('mean', col, 'numeric') 
 
+    num_col = accel.numeric_column(self, idx)
     try:
+      if num_col is not None:
+        return num_col.mean()
+      vals = [v for v in self[col] if v!=None]
       return mean(vals)
     except Exception, e:
       print e
@@ -864,28 +1490,54 @@ Statistics for column %(col)s
       values[min(len(values), int(round(len(values)*p/100+0.5)-1))]
 
     where values are the sorted values of *col* not equal to none
+    The values are not sorted, the percentiles are selected in linear time.
+    For approximate percentiles with bounded memory, see 
+    :meth:`quantile_sketch`.
+
     :param: nths: list of percentiles to be calculated. Each percentil is a number between 0 and 100.
 
     :raises: :class:`TypeError` if column type is ``string``
     :returns: List of percentils in the same order as given in *nths*
     """
-    self._ensure_col_type('percentiles', col, 'numeric')
+    idx = self._ensure_col_type('percentiles', col, 'numeric')
     for nth in nths:
       if nth < 0 or nth > 100:
         raise ValueError("percentiles must be between 0 and 100")
-    vals=[]
-    for v in self[col]:
-      if v!=None:
-        vals.append(v)
-    vals=sorted(vals)
+    num_col = accel.numeric_column(self, idx)
+    if num_col is not None:
+      return num_col.percentiles(nths)
+    vals=[v for v in self[col] if v!=None]
     if len(vals)==0:
       return [None]*len(nths)
-    percentiles=[]
-    
-    for nth in nths:
-      p=vals[min(len(vals)-1, int(round(len(vals)*nth/100.0+0.5)-1))]
-      percentiles.append(p)
-    return percentiles
+    return select(vals, [percentile_index(len(vals), nth) for nth in nths])
+
+  def quantile_sketch(self, col, k=200):
+    """
+    Returns a :class:`~tap.stutil.QuantileSketch` summarizing the values of 
+    column *col* which are not None. Sketches of several tables can be 
+    merged, to compute approximate percentiles of a file which is loaded in 
+    chunks, with bounded memory:
+
+    .. code-block:: python
+
+      sketch=QuantileSketch()
+      for chunk in load_chunks('scores.csv', chunk_rows=100000):
+        sketch.merge(chunk.quantile_sketch('score'))
+      p50, p90, p99=sketch.percentiles([50, 90, 99])
+
+    For tables which fit into memory, :meth:`percentiles` and :meth:`median` 
+    are exact and faster.
+
+    :param k: accuracy parameter of the sketch, see 
+              :class:`~tap.stutil.QuantileSketch`
+
+    :raises: :class:`TypeError` if column type is ``string``
+    """
+    idx = self._ensure_col_type('quantile_sketch', col, 'numeric')
+    num_col = accel.numeric_column(self, idx)
+    if num_col is not None:
+      return num_col.quantile_sketch(k)
+    return QuantileSketch(k, self[idx])
 
   def median(self, col):
     """
@@ -903,8 +1555,11 @@ Statistics for column %(col)s
     if col_type!='int' and col_type!='float' and col_type!='bool':
       raise TypeError("median can only be used on numeric column types")
     
-    vals=[v for v in self[col] if v!=None]
+    num_col = accel.numeric_column(self, idx)
     try:
+      if num_col is not None:
+        return num_col.median()
+      vals=[v for v in self[col] if v!=None]
       return median(vals)
     except:
       return None
@@ -925,16 +1580,120 @@ Statistics for column %(col)s
     if col_type!='int' and col_type!='float' and col_type!='bool':
       raise TypeError("std_dev can only be used on numeric column types")
     
-    vals=[v for v in self[col] if v!=None]
-    for v in self[col]:
-      if v!=None:
-        vals.append(v)
+    num_col = accel.numeric_column(self, idx)
     try:
-      return std_dev(vals)
+      if num_col is not None:
+        return num_col.std_dev()
+      return RunningStats(self[idx]).std_dev()
     except Exception, e:
       print e
       return None
 
+  def running_stats(self, col):
+    """
+    Returns a :class:`~tap.stutil.RunningStats` accumulator holding the values
+    of column *col* which are not None. Unlike :meth:`mean` or 
+    :meth:`std_dev`, the accumulators of several tables can be merged, e.g. to
+    compute statistics over a file which is loaded in chunks:
+
+    .. code-block:: python
+
+      stats=RunningStats()
+      for chunk in load_chunks('scores.csv', chunk_rows=100000):
+        stats.merge(chunk.running_stats('score'))
+      print stats.count(), stats.mean(), stats.std_dev()
+
+    :param col: column name
+    :type col: :class:`str`
+
+    :raises: :class:`TypeError` if column type is ``string``
+    """
+    idx = self._ensure_col_type('running_stats', col, 'numeric')
+    num_col = accel.numeric_column(self, idx)
+    if num_col is not None:
+      return num_col.running_stats()
+    return RunningStats(self[idx])
+
+  def histogram(self, col, num_bins=10, bounds=None, edges=None, 
+                weights=None):
+    """
+    Returns a :class:`~tap.stutil.RunningHistogram` with the counts of the 
+    values of column *col* in bins. The bins are either given by their 
+    *edges*, or have equal width and span *bounds*. By default, they span 
+    the values of the column. None and NaN values are counted separately:
+
+    .. code-block:: python
+
+      hist=tab.histogram('score', num_bins=20, bounds=(0.0, 1.0))
+      for low, count in zip(hist.edges, hist.counts):
+        print low, count
+      print hist.below, hist.above, hist.na_count
+
+    To compute the histogram of a file which is loaded in chunks, pass the 
+    same edges for each chunk and merge the histograms, see 
+    :class:`~tap.stutil.RunningHistogram`.
+
+    :param num_bins: number of bins between the *bounds*
+    :type num_bins: :class:`int`
+
+    :param bounds: start and end of the bins
+    :type bounds: :class:`tuple` of length two
+
+    :param edges: strictly increasing list of bin edges, used instead of 
+                  *num_bins* and *bounds*
+    :type edges: :class:`list`
+
+    :param weights: column name with the weight of each value. Rows where the
+                    weight is None are ignored.
+    :type weights: :class:`str`
+
+    :raises: :class:`TypeError` if one of the columns is not numeric
+    """
+    idx = self._ensure_col_type('histogram', col, 'numeric')
+    weight_idx = None
+    if weights is not None:
+      weight_idx = self._ensure_col_type('histogram', weights, 'numeric')
+    num_col = accel.numeric_column(self, idx)
+    if edges is None and bounds is None:
+      low, high = None, None
+      if num_col is not None:
+        low, high = num_col.min(), num_col.max()
+      if num_col is None or low!=low or high!=high:
+        # NaN values are counted as None values, not binned
+        vals = [v for v in self[idx] if v!=None and v==v]
+        low, high = (min(vals), max(vals)) if vals else (None, None)
+      if low is None:
+        low, high = 0.0, 1.0
+      elif low == high:
+        low, high = low-0.5, high+0.5
+      bounds = (low, high)
+    hist = RunningHistogram(edges, bounds, num_bins)
+    if num_col is not None:
+      weight_col = None
+      if weight_idx is not None:
+        weight_col = accel.numeric_column(self, weight_idx)
+      if weight_idx is None or weight_col is not None:
+        accel.add_to_histogram(hist, num_col, weight_col)
+        return hist
+    hist.extend(self[idx], None if weight_idx is None else self[weight_idx])
+    return hist
+
+  def running_correl(self, col1, col2):
+    """
+    Returns a :class:`~tap.stutil.RunningCorrel` accumulator holding the 
+    pairs of values of *col1* and *col2* where both values are not None. See 
+    :meth:`running_stats` for an example.
+
+    :raises: :class:`TypeError` if a column type is ``string``
+    """
+    idx1 = self._ensure_col_type('running_correl', col1, 'numeric')
+    idx2 = self._ensure_col_type('running_correl', col2, 'numeric')
+    num_col1 = accel.numeric_column(self, idx1)
+    num_col2 = accel.numeric_column(self, idx2)
+    if num_col1 is not None and num_col2 is not None:
+      return accel.running_correl(num_col1, num_col2)
+    return RunningCorrel(itertools.izip(self[idx1], self[idx2]))
+
   def count(self, col, ignore_nan=True):
     """
     count the number of cells in column that are not equal to None.
@@ -945,13 +1704,15 @@ Statistics for column %(col)s
     :param ignore_nan: ignore all *None* values
     :type ignore_nan: :class:`bool`
     """
-    count=0
     idx=self.col_index(col)
-    for r in self.rows:
-      if ignore_nan:
-        if r[idx]!=None:
-          count+=1
-      else:
+    if not ignore_nan:
+      return len(self.rows)
+    if isinstance(self.rows, ColumnarRows):
+      column=self.rows.columns[idx]
+      return len(column)-column.null_count
+    count=0
+    for val in self[idx]:
+      if val!=None:
         count+=1
     return count
 
@@ -971,12 +1732,12 @@ Statistics for column %(col)s
     if typeutil.is_string_like(col1) and typeutil.is_string_like(col2):
       col1 = self.col_index(col1)
       col2 = self.col_index(col2)
-    vals1, vals2=([],[])
-    for v1, v2 in self.zip_non_null(col1, col2):
-      vals1.append(v1)
-      vals2.append(v2)
+    num_col1 = accel.numeric_column(self, col1)
+    num_col2 = accel.numeric_column(self, col2)
     try:
-      return correl(vals1, vals2)
+      if num_col1 is not None and num_col2 is not None:
+        return accel.correl(num_col1, num_col2)
+      return RunningCorrel(itertools.izip(self[col1], self[col2])).correl()
     except Exception, e:
       print e
       return None
@@ -1019,6 +1780,91 @@ Statistics for column %(col)s
       raise
     
 
+  def correl_matrix(self, cols=None, method='pearson', pairwise_na=True):
+    """
+    Calculate the correlation coefficients between all pairs of the columns
+    *cols*. Each column is read only once, which is much faster than calling 
+    :meth:`correl` or :meth:`spearman_correl` for every pair.
+
+    **Example:**
+
+    .. code-block:: python
+
+      mat=tab.correl_matrix(['x', 'y', 'z'], method='spearman')
+      print mat.to_string()
+
+    :param cols: names of the columns. By default, all int, float and bool 
+                 columns are used.
+    :type cols: :class:`list`
+
+    :param method: *pearson* for the Pearson correlation coefficient (see 
+                   :meth:`correl`) or *spearman* for Spearman's rank 
+                   correlation coefficient (see :meth:`spearman_correl`)
+
+    :param pairwise_na: if true, rows are ignored for a pair of columns when 
+                        one of the two values is None. Otherwise, rows with a
+                        None value in any of the columns are ignored for all 
+                        pairs.
+
+    :returns: :class:`Tab` with a string column *col_name* and one float 
+              column for each of *cols*. Row *i* holds the coefficients of 
+              column *i* with all columns. Coefficients which can not be 
+              calculated, e.g. for a column with constant values, are None.
+
+    :raises: :class:`TypeError` if one of the columns is not numeric
+    """
+    if method not in ('pearson', 'spearman'):
+      raise ValueError("method must be either 'pearson' or 'spearman'")
+    if cols is None:
+      cols=[name for name, col_type in zip(self.col_names, self.col_types)
+            if col_type in ('int', 'float', 'bool')]
+    indices=[self._ensure_col_type('correl_matrix', col, 'numeric') 
+             for col in cols]
+    spearman=method=='spearman'
+    matrix=None
+    num_cols=[accel.numeric_column(self, idx) for idx in indices]
+    if num_cols and None not in num_cols:
+      matrix=accel.correl_matrix(num_cols, spearman, pairwise_na)
+    if matrix is None:
+      matrix=self._correl_matrix(indices, spearman, pairwise_na)
+    result=Tab(['col_name']+list(cols), 's'+'f'*len(cols))
+    for col, coeffs in zip(cols, matrix):
+      result.add_row([col]+coeffs)
+    return result
+
+  def _correl_matrix(self, indices, spearman, pairwise_na):
+    columns=[list(self[idx]) for idx in indices]
+    if not pairwise_na:
+      rows=[row for row in zip(*columns) if None not in row]
+      columns=[list(col) for col in zip(*rows)] or [[] for idx in indices]
+    ranked=columns
+    if spearman:
+      ranked=[]
+      for col in columns:
+        # rank the values once, None values keep their place
+        non_null=[v for v in col if v!=None]
+        col_ranks=iter(ranks(non_null))
+        ranked.append([None if v==None else col_ranks.next() for v in col])
+    num=len(columns)
+    counts=[len(col)-col.count(None) for col in columns]
+    matrix=[[None]*num for i in range(num)]
+    for i in range(num):
+      for j in range(i, num):
+        pairs=[(x, y) for x, y in zip(ranked[i], ranked[j]) 
+               if x!=None and y!=None]
+        if spearman and (len(pairs)!=counts[i] or len(pairs)!=counts[j]):
+          # the ranks of the whole columns don't apply to the rows of the pair
+          pairs=[(x, y) for x, y in zip(columns[i], columns[j])
+                 if x!=None and y!=None]
+          pairs=zip(ranks([x for x, y in pairs]), ranks([y for x, y in pairs]))
+        try:
+          coeff=correl([x for x, y in pairs], [y for x, y in pairs])
+        except (RuntimeError, ZeroDivisionError):
+          coeff=None
+        matrix[i][j]=coeff
+        matrix[j][i]=coeff
+    return matrix
+
   def save(self, stream_or_filename, format='ost', sep=','):
     """
     save the table to stream or file pointed to by filename. The following 
@@ -1029,6 +1875,7 @@ Statistics for column %(col)s
     ost             ost-specific format (human readable)
     csv             comma separated values (human readable)
     pickle          pickled byte stream (binary)
+    tapb            columnar binary format (binary)
     html            HTML table
     context         ConTeXt table
     =============   =======================================
@@ -1036,7 +1883,7 @@ Statistics for column %(col)s
     :param stream_or_filename: filename or stream for writing output
     :type stream_or_filename: :class:`str` or :class:`file`
 
-    :param format: output format (i.e. *ost*, *csv*, *pickle*)
+    :param format: output format (i.e. *ost*, *csv*, *pickle*, *tapb*)
     :type format: :class:`str`
 
     :raises: :class:`ValueError` if format is unknown
@@ -1048,6 +1895,8 @@ Statistics for column %(col)s
       return self._save_csv(stream_or_filename, sep=sep)
     if format=='pickle':
       return self._save_pickle(stream_or_filename)
+    if format=='tapb':
+      return binary.save(self, stream_or_filename)
     if format=='html':
       return self._save_html(stream_or_filename)
     if format=='context':
@@ -1343,6 +2192,119 @@ Statistics for column %(col)s
       print "Function needs numpy, but I could not import it."
       raise
 
+  def _classification_columns(self, score_cols, class_col, score_dir,
+                              class_dir, bool_scores):
+    # indices of the score columns and of the class column, after checking 
+    # their types and the directions
+    ALLOWED_DIR = ['+','-']
+
+    score_indices = []
+    for col in score_cols:
+      score_idx = self.col_index(col)
+      score_type = self.col_types[score_idx]
+      if bool_scores:
+        if score_type!='int' and score_type!='float' and score_type!='bool':
+          raise TypeError("Score column must be numeric or bool type")
+      elif score_type!='int' and score_type!='float':
+        raise TypeError("Score column must be numeric type")
+      score_indices.append(score_idx)
+
+    class_idx = self.col_index(class_col)
+    class_type = self.col_types[class_idx]
+    if class_type!='int' and class_type!='float' and class_type!='bool':
+      raise TypeError("Classifier column must be numeric or bool type")
+
+    if (score_dir not in ALLOWED_DIR) or (class_dir not in ALLOWED_DIR):
+      raise ValueError("Direction must be one of %s"%str(ALLOWED_DIR))
+    return score_indices, class_idx
+
+  def _class_labels(self, class_idx, class_dir, class_cutoff):
+    # True for positives, False for negatives and None where the class is 
+    # unknown
+    class_type = self.col_types[class_idx]
+    labels = []
+    for class_val in self[class_idx]:
+      if class_val==None:
+        labels.append(None)
+      elif class_type=='bool':
+        labels.append(class_val==True)
+      else:
+        labels.append((class_dir=='-' and class_val<=class_cutoff) or
+                      (class_dir=='+' and class_val>=class_cutoff))
+    return labels
+
+  def _ranked_counts(self, score_idx, labels, score_dir):
+    # number of rows and of positives up to the end of each run of equal 
+    # scores, starting with 0
+    ranked = [(score_val, is_pos) for score_val, is_pos
+              in zip(self[score_idx], labels)
+              if score_val!=None and is_pos!=None]
+    # ties need not be ordered, a point is only added after the last row of
+    # each score value
+    ranked.sort(key=operator.itemgetter(0), reverse=(score_dir=='+'))
+    x = [0]
+    y = [0]
+    num = 0
+    hits = 0
+    for i, (score_val, is_pos) in enumerate(ranked):
+      if i>0 and score_val!=old_score_val:
+        x.append(num)
+        y.append(hits)
+      old_score_val = score_val
+      num += 1
+      if is_pos:
+        hits += 1
+    x.append(num)
+    y.append(hits)
+    return x, y
+
+  def _mcc_counts(self, score_idx, labels, score_dir, score_cutoff):
+    # true positives, false positives, false negatives and true negatives
+    score_type = self.col_types[score_idx]
+    tp = 0
+    fp = 0
+    fn = 0
+    tn = 0
+    for score_val, is_pos in zip(self[score_idx], labels):
+      if is_pos==None:
+        continue
+      if is_pos:
+        if (score_type=='bool' and score_val==True) or (score_type!='bool' and ((score_dir=='-' and score_val<=score_cutoff) or (score_dir=='+' and score_val>=score_cutoff))):
+          tp += 1
+        else:
+          fn += 1
+      else:
+        if (score_type=='bool' and score_val==False) or (score_type!='bool' and ((score_dir=='-' and score_val>score_cutoff) or (score_dir=='+' and score_val<score_cutoff))):
+          tn += 1
+        else:
+          fp += 1
+    return tp, fp, fn, tn
+
+  def _ranking_curves(self, score_col, class_col, score_dir, class_dir,
+                      class_cutoff, roc):
+    # common implementation of compute_roc and compute_enrichment. Returns a
+    # single curve, or a list of curves if score_col is a list
+    batched = not isinstance(score_col, basestring)
+    score_cols = list(score_col) if batched else [score_col]
+    score_indices, class_idx = self._classification_columns(score_cols, 
+                                                            class_col, 
+                                                            score_dir,
+                                                            class_dir, False)
+    curves = accel.ranking_curves(self, score_indices, class_idx, class_dir,
+                                  class_cutoff, score_dir=='+', roc)
+    if curves is None:
+      labels = self._class_labels(class_idx, class_dir, class_cutoff)
+      curves = []
+      for score_idx in score_indices:
+        x, y = self._ranked_counts(score_idx, labels, score_dir)
+        if roc:
+          # false instead of all positives
+          x = [n-h for n, h in zip(x, y)]
+        curves.append(_normalized_curve(x, y))
+    if batched:
+      return curves
+    return curves[0]
+
   def compute_enrichment(self, score_col, class_col, score_dir='-', 
                          class_dir='-', class_cutoff=2.0):
     '''
@@ -1362,66 +2324,19 @@ Statistics for column %(col)s
        * if ``class_dir=='-'``: values in the classification column that are less than or equal to class_cutoff will be counted as positives
        * if ``class_dir=='+'``: values in the classification column that are larger than or equal to class_cutoff will be counted as positives
 
-    During the calculation, the table will be sorted according to *score_dir*,
-    where a '-' values means smallest values first and therefore, the smaller
-    the value, the better.
+    The datapoints are ranked according to *score_dir*, where a '-' values 
+    means smallest values first and therefore, the smaller the value, the 
+    better. The table itself is not modified.
+
+    To compute the enrichment of several score columns at once, pass a list
+    of column names as *score_col*. A list with one curve per column is 
+    returned in this case.
     
     :warning: If either the value of *class_col* or *score_col* is *None*, the
               data in this row is ignored.
     '''
-    
-    ALLOWED_DIR = ['+','-']
-    
-    score_idx = self.col_index(score_col)
-    score_type = self.col_types[score_idx]
-    if score_type!='int' and score_type!='float':
-      raise TypeError("Score column must be numeric type")
-    
-    class_idx = self.col_index(class_col)
-    class_type = self.col_types[class_idx]
-    if class_type!='int' and class_type!='float' and class_type!='bool':
-      raise TypeError("Classifier column must be numeric or bool type")
-    
-    if (score_dir not in ALLOWED_DIR) or (class_dir not in ALLOWED_DIR):
-      raise ValueError("Direction must be one of %s"%str(ALLOWED_DIR))
-    
-    self.sort(score_col, score_dir)
-    
-    x = [0]
-    y = [0]
-    enr = 0
-    old_score_val = None
-    i = 0
-
-    for row in self.rows:
-      class_val = row[class_idx]
-      score_val = row[score_idx]
-      if class_val==None or score_val==None:
-        continue
-      if class_val!=None:
-        if old_score_val==None:
-          old_score_val = score_val
-        if score_val!=old_score_val:
-          x.append(i)
-          y.append(enr)
-          old_score_val = score_val
-        i+=1
-        if class_type=='bool':
-          if class_val==True:
-            enr += 1
-        else:
-          if (class_dir=='-' and class_val<=class_cutoff) or (class_dir=='+' and class_val>=class_cutoff):
-            enr += 1
-    x.append(i)
-    y.append(enr)
-
-    # if no false positives or false negatives values are found return None
-    if x[-1]==0 or y[-1]==0:
-      return None
-
-    x = [float(v)/x[-1] for v in x]
-    y = [float(v)/y[-1] for v in y]
-    return x,y
+    return self._ranking_curves(score_col, class_col, score_dir, class_dir,
+                                class_cutoff, roc=False)
     
   def compute_enrichment_auc(self, score_col, class_col, score_dir='-', 
                              class_dir='-', class_cutoff=2.0):
@@ -1430,7 +2345,8 @@ Statistics for column %(col)s
     rule.
     
     For more information about parameters of the enrichment, see
-    :meth:`compute_enrichment`.
+    :meth:`compute_enrichment`. If *score_col* is a list, a list with the 
+    area under the curve of each column is returned.
 
     :warning: The function depends on *numpy*
     '''
@@ -1440,6 +2356,8 @@ Statistics for column %(col)s
       enr = self.compute_enrichment(score_col, class_col, score_dir,
                                           class_dir, class_cutoff)
       
+      if not isinstance(score_col, basestring):
+        return [e and np.trapz(e[1], e[0]) for e in enr]
       if enr==None:
         return None
       return np.trapz(enr[1], enr[0])
@@ -1465,73 +2383,29 @@ Statistics for column %(col)s
        - if ``class_dir=='-'``: values in the classification column that are less than or equal to *class_cutoff* will be counted as positives
        - if ``class_dir=='+'``: values in the classification column that are larger than or equal to *class_cutoff* will be counted as positives
 
-    During the calculation, the table will be sorted according to *score_dir*,
-    where a '-' values means smallest values first and therefore, the smaller
-    the value, the better.
+    The datapoints are ranked according to *score_dir*, where a '-' values 
+    means smallest values first and therefore, the smaller the value, the 
+    better. The table itself is not modified.
 
     If *class_col* does not contain any positives (i.e. value is True (if column
     is of type bool) or evaluated to True (if column is of type int or float
     (depending on *class_dir* and *class_cutoff*))) the ROC is not defined and
     the function will return *None*.
 
-    :warning: If either the value of *class_col* or *score_col* is *None*, the
-              data in this row is ignored.
-    '''
-
-    ALLOWED_DIR = ['+','-']
-
-    score_idx = self.col_index(score_col)
-    score_type = self.col_types[score_idx]
-    if score_type!='int' and score_type!='float':
-      raise TypeError("Score column must be numeric type")
-
-    class_idx = self.col_index(class_col)
-    class_type = self.col_types[class_idx]
-    if class_type!='int' and class_type!='float' and class_type!='bool':
-      raise TypeError("Classifier column must be numeric or bool type")
+    To compute the ROC of several score columns at once, pass a list of 
+    column names as *score_col*. A list with one curve (or None) per column is
+    returned in this case:
 
-    if (score_dir not in ALLOWED_DIR) or (class_dir not in ALLOWED_DIR):
-      raise ValueError("Direction must be one of %s"%str(ALLOWED_DIR))
-
-    self.sort(score_col, score_dir)
+    .. code-block:: python
 
-    x = [0]
-    y = [0]
-    tp = 0
-    fp = 0
-    old_score_val = None
+      for name, roc in zip(score_cols, tab.compute_roc(score_cols, 'active')):
+        print name, roc
 
-    for i,row in enumerate(self.rows):
-      class_val = row[class_idx]
-      score_val = row[score_idx]
-      if class_val==None or score_val==None:
-        continue
-      if old_score_val==None:
-        old_score_val = score_val
-      if score_val!=old_score_val:
-        x.append(fp)
-        y.append(tp)
-        old_score_val = score_val
-      if class_type=='bool':
-        if class_val==True:
-          tp += 1
-        else:
-          fp += 1
-      else:
-        if (class_dir=='-' and class_val<=class_cutoff) or (class_dir=='+' and class_val>=class_cutoff):
-          tp += 1
-        else:
-          fp += 1
-    x.append(fp)
-    y.append(tp)
-    
-    # if no false positives or false negatives values are found return None
-    if x[-1]==0 or y[-1]==0:
-      return None
-    
-    x = [float(v)/x[-1] for v in x]
-    y = [float(v)/y[-1] for v in y]
-    return x,y
+    :warning: If either the value of *class_col* or *score_col* is *None*, the
+              data in this row is ignored.
+    '''
+    return self._ranking_curves(score_col, class_col, score_dir, class_dir,
+                                class_cutoff, roc=True)
 
   def compute_roc_auc(self, score_col, class_col, score_dir='-',
                     class_dir='-', class_cutoff=2.0):
@@ -1540,7 +2414,8 @@ Statistics for column %(col)s
     using the trapezoidal rule.
     
     For more information about parameters of the ROC, see
-    :meth:`compute_roc`.
+    :meth:`compute_roc`. If *score_col* is a list, a list with the area under
+    the curve of each column is returned.
 
     :warning: The function depends on *numpy*
     '''
@@ -1550,6 +2425,8 @@ Statistics for column %(col)s
       roc = self.compute_roc(score_col, class_col, score_dir,
                             class_dir, class_cutoff)
 
+      if not isinstance(score_col, basestring):
+        return [r and np.trapz(r[1], r[0]) for r in roc]
       if not roc:
         return None
       return np.trapz(roc[1], roc[0])
@@ -1580,57 +2457,130 @@ Statistics for column %(col)s
     The two possibilities can be used together, i.e. 'bool' type for one column
     and 'float'/'int' type and cutoff/direction for the other column.
     '''
-    ALLOWED_DIR = ['+','-']
+    score_indices, class_idx = self._classification_columns([score_col],
+                                                            class_col,
+                                                            score_dir,
+                                                            class_dir, True)
+    labels = self._class_labels(class_idx, class_dir, class_cutoff)
+    counts = self._mcc_counts(score_indices[0], labels, score_dir, 
+                              score_cutoff)
+    try:
+      return matthews_correl(*counts)
+    except RuntimeError, e:
+      print "Could not compute MCC: %s" % str(e)
+      return None
 
-    score_idx = self.col_index(score_col)
-    score_type = self.col_types[score_idx]
-    if score_type!='int' and score_type!='float' and score_type!='bool':
-      raise TypeError("Score column must be numeric or bool type")
+  def evaluate_scores(self, score_cols, class_col, metrics=None, 
+                      score_dir='-', class_dir='-', score_cutoff=2.0, 
+                      class_cutoff=2.0, workers=None):
+    '''
+    Evaluates several score columns against the same classification column
+    (*class_col*) and returns the results as a new table with one row per 
+    score column.
 
-    class_idx = self.col_index(class_col)
-    class_type = self.col_types[class_idx]
-    if class_type!='int' and class_type!='float' and class_type!='bool':
-      raise TypeError("Classifier column must be numeric or bool type")
+    The classification of the datapoints into positives and negatives is 
+    only derived once, and all metrics of a score column are computed from a
+    single ranking of its values. For the meaning of the directions and 
+    cutoffs, see :meth:`compute_roc` and :meth:`compute_mcc`.
 
-    if (score_dir not in ALLOWED_DIR) or (class_dir not in ALLOWED_DIR):
-      raise ValueError("Direction must be one of %s"%str(ALLOWED_DIR))
-     
-    tp = 0
-    fp = 0
-    fn = 0
-    tn = 0
+    **Example:**
 
-    for i,row in enumerate(self.rows):
-      class_val = row[class_idx]
-      score_val = row[score_idx]
-      if class_val!=None:
-        if (class_type=='bool' and class_val==True) or (class_type!='bool' and ((class_dir=='-' and class_val<=class_cutoff) or (class_dir=='+' and class_val>=class_cutoff))):
-          if (score_type=='bool' and score_val==True) or (score_type!='bool' and ((score_dir=='-' and score_val<=score_cutoff) or (score_dir=='+' and score_val>=score_cutoff))):
-            tp += 1
-          else:
-            fn += 1
+    .. code-block:: python
+
+      res=tab.evaluate_scores(['score_a', 'score_b'], 'rmsd', 
+                              metrics=['roc_auc', 'mcc'])
+      print res.to_string()
+
+    :param score_cols: names of the score columns
+    :type score_cols: :class:`list`
+
+    :param metrics: metrics to compute, any of *roc_auc*, *enrichment_auc* 
+                    and *mcc*. By default, all of them are computed.
+    :type metrics: :class:`list`
+
+    :param workers: number of worker processes to distribute the score 
+                    columns over. By default, everything is computed in the
+                    current process.
+    :type workers: :class:`int`
+
+    :returns: :class:`Tab` with a string column *score_col*, holding the 
+              names of the score columns, and a float column for each 
+              metric. Metrics which are not defined for a score column, e.g.
+              because there are no positives, are None.
+    '''
+    if metrics is None:
+      metrics = list(SCORE_METRICS)
+    for metric in metrics:
+      if metric not in SCORE_METRICS:
+        raise ValueError("Unknown metric '%s', must be one of %s" % \
+                         (metric, ', '.join(SCORE_METRICS)))
+    if isinstance(score_cols, basestring):
+      score_cols = [score_cols]
+    ranked = 'roc_auc' in metrics or 'enrichment_auc' in metrics
+    score_indices, class_idx = self._classification_columns(score_cols,
+                                                            class_col,
+                                                            score_dir,
+                                                            class_dir,
+                                                            not ranked)
+    options = (score_dir, class_dir, score_cutoff, class_cutoff)
+    if workers>1 and len(score_indices)>1:
+      # send each worker a table with the class column and its share of 
+      # the score columns
+      tasks = []
+      num_tasks = min(workers, len(score_indices))
+      for i in range(num_tasks):
+        indices = [class_idx]+score_indices[i::num_tasks]
+        task_tab = Tab(['c%d' % j for j in range(len(indices))],
+                       [self.col_types[j] for j in indices])
+        if isinstance(self.rows, ColumnarRows):
+          columns = [self.rows.columns[j] for j in indices]
         else:
-          if (score_type=='bool' and score_val==False) or (score_type!='bool' and ((score_dir=='-' and score_val>score_cutoff) or (score_dir=='+' and score_val<score_cutoff))):
-            tn += 1
-          else:
-            fp += 1
-
-    mcc = None
-    msg = None
-    if (tp+fn)==0:
-      msg = 'factor (tp + fn) is zero'
-    elif (tp+fp)==0:
-      msg = 'factor (tp + fp) is zero'
-    elif (tn+fn)==0:
-      msg = 'factor (tn + fn) is zero'
-    elif (tn+fp)==0:
-      msg = 'factor (tn + fp) is zero'
-    
-    if msg:
-      print "Could not compute MCC: MCC is not defined since %s" % msg
+          columns = [Column(self.col_types[j], self[j]) for j in indices]
+        # columnar tables are much faster to pickle
+        task_tab.rows = ColumnarRows(columns, len(self.rows))
+        tasks.append((task_tab, metrics, options))
+      results = [None]*len(score_indices)
+      for i, task_results in enumerate(
+          parallel.map_in_processes(_score_metrics_task, tasks, workers)):
+        results[i::num_tasks] = task_results
     else:
-      mcc = ((tp*tn)-(fp*fn)) / math.sqrt((tp+fn)*(tp+fp)*(tn+fn)*(tn+fp))
-    return mcc
+      results = self._score_metrics(score_indices, class_idx, metrics, 
+                                    *options)
+    result = Tab(['score_col']+list(metrics), 's'+'f'*len(metrics))
+    for score_col, values in zip(score_cols, results):
+      result.add_row([score_col]+values)
+    return result
+
+  def _score_metrics(self, score_indices, class_idx, metrics, score_dir, 
+                     class_dir, score_cutoff, class_cutoff):
+    # list with the values of the metrics for each score column
+    results = accel.score_metrics(self, score_indices, class_idx, metrics,
+                                  score_dir, class_dir, score_cutoff,
+                                  class_cutoff)
+    if results is not None:
+      return results
+    labels = self._class_labels(class_idx, class_dir, class_cutoff)
+    results = []
+    for score_idx in score_indices:
+      if 'roc_auc' in metrics or 'enrichment_auc' in metrics:
+        num, hits = self._ranked_counts(score_idx, labels, score_dir)
+      values = []
+      for metric in metrics:
+        if metric=='mcc':
+          try:
+            values.append(matthews_correl(*self._mcc_counts(score_idx, labels,
+                                                            score_dir, 
+                                                            score_cutoff)))
+          except RuntimeError:
+            values.append(None)
+          continue
+        x = num
+        if metric=='roc_auc':
+          x = [n-h for n, h in zip(num, hits)]
+        curve = _normalized_curve(x, hits)
+        values.append(curve and trapz(curve[1], curve[0]))
+      results.append(values)
+    return results
     
 
   def empty(self, col_name=None, ignore_nan=True):
@@ -1700,9 +2650,263 @@ Statistics for column %(col)s
       row = tab.rows[i]
       data = dict(zip(tab.col_names,row))
       self.add_row(data, overwrite)
-    
 
-def merge(table1, table2, by, only_matching=False):
+
+def _normalized_curve(x, y):
+  # if no false positives or false negatives values are found return None
+  if x[-1]==0 or y[-1]==0:
+    return None
+  x = [float(v)/x[-1] for v in x]
+  y = [float(v)/y[-1] for v in y]
+  return x,y
+
+# columns shared with the worker processes of Tab.describe
+_describe_columns=None
+
+def _init_describe_worker(columns, nths):
+  global _describe_columns
+  _describe_columns=(columns, nths)
+
+def _describe_task(indices):
+  # worker of Tab.describe, describes the shared columns at indices
+  columns, nths=_describe_columns
+  summaries=[]
+  for i in indices:
+    column=columns[i].to_column()
+    tab=Tab(['x'], [column.col_type])
+    tab.rows=ColumnarRows([column], len(column))
+    summaries.append(tab._describe_col(0, nths))
+  return summaries
+
+def _score_metrics_task(task):
+  # worker of Tab.evaluate_scores, the first column holds the classes
+  tab, metrics, options=task
+  return tab._score_metrics(range(1, len(tab.col_names)), 0, metrics, 
+                            *options)
+
+def _compose_indices(outer, inner):
+  # the indices outer[i] for i in inner, as array
+  np=accel.numpy_module()
+  if np is None or len(inner)==0:
+    return array.array('l', [outer[i] for i in inner])
+  composed=np.frombuffer(outer, dtype=outer.typecode)[
+           np.frombuffer(inner, dtype=inner.typecode)]
+  return array.array('l', composed.tostring())
+
+
+class TabView(Tab):
+  """
+  View on a subset of the rows of a table, created by :meth:`Tab.view`,
+  :meth:`Tab.filter_view`, :meth:`Tab.head` and :meth:`Tab.tail`.
+
+  A view only stores the indices of its rows and reads the values from the
+  table it was created from. It supports all the methods of :class:`Tab`.
+  The read-only methods, e.g. the statistics, :meth:`~Tab.zip`,
+  :meth:`~Tab.to_string`, :meth:`~Tab.save` or plotting, work on the rows of
+  the table directly. Views of views refer to the original table, so that
+  chaining filters does not copy any rows:
+
+  .. code-block:: python
+
+    hits=tab.filter_view(tab.score>0.5).filter_view(town='Basel')
+    print hits.mean('score')
+
+  The rows are copied on write: Before the view is modified, e.g. by
+  :meth:`~Tab.add_row`, :meth:`~Tab.add_col` or :meth:`~Tab.sort`, it receives
+  its own copy of its rows. Likewise, all views of a table receive their copy
+  before the table is modified through one of its methods. Modifying the rows
+  directly, e.g. by assigning to ``tab.rows[i][j]``, bypasses this mechanism
+  and is not supported for tables which have views.
+  """
+  def __init__(self, tab, indices):
+    self._parent=None
+    Tab.__init__(self, list(tab.col_names), list(tab.col_types))
+    self.name=tab.name
+    self.comment=tab.comment
+    if isinstance(tab, TabView) and tab._parent is not None:
+      # refer to the original table instead of the view
+      indices=_compose_indices(tab.rows.indices, indices)
+      tab=tab._parent
+    self._parent=tab
+    self.rows=IndexedRows(tab.rows, indices)
+    if tab._views is None:
+      tab._views=weakref.WeakKeyDictionary()
+    tab._views[self]=True
+    # the rows are shared with tab, see _before_modification
+    self._views=weakref.WeakKeyDictionary()
+
+  def is_materialized(self):
+    """
+    Returns true, if the view holds its own copy of the rows
+    """
+    return self._parent is None
+
+  def to_tab(self):
+    """
+    Returns a new :class:`Tab` holding a copy of the rows of the view
+    """
+    tab=self._take_rows(xrange(len(self.rows)))
+    tab.name=self.name
+    tab.comment=self.comment
+    return tab
+
+  def _materialize(self):
+    if self._parent is None:
+      return
+    self.rows=self.rows.take(xrange(len(self.rows)))
+    if self._parent._views is not None:
+      self._parent._views.pop(self, None)
+    self._parent=None
+
+  def _before_modification(self):
+    self._materialize()
+    Tab._before_modification(self)
+
+  def __reduce_ex__(self, protocol):
+    # views are pickled as regular tables
+    return self.to_tab().__reduce_ex__(protocol)
+
+
+class TabGroups(object):
+  """
+  Rows of a table grouped by the values of one or several columns, created by
+  :meth:`Tab.group_by`. The groups are in the order of their first row.
+
+  Iterating over the groups yields pairs of the values of the grouping 
+  columns (a tuple, if grouping by several columns) and a :class:`TabView` 
+  on the rows of the group:
+
+  .. code-block:: python
+
+    for target, rows in tab.group_by('target'):
+      print target, rows.max_row('score')
+  """
+  def __init__(self, tab, col_indices, keys, group_ids):
+    self.tab=tab
+    self._col_indices=col_indices
+    self._keys=keys
+    self._group_ids=group_ids
+    self._numpy_index=None
+
+  def __len__(self):
+    return len(self._keys)
+
+  def keys(self):
+    """
+    Returns the list of the values of the grouping columns for each group
+    """
+    return list(self._keys)
+
+  def __iter__(self):
+    rows=[array.array('l') for key in self._keys]
+    for row_index, group_id in enumerate(self._group_ids):
+      rows[group_id].append(row_index)
+    for key, indices in zip(self._keys, rows):
+      yield key, TabView(self.tab, indices)
+
+  def agg(self, **aggregates):
+    """
+    Computes aggregates of columns for each group. The keyword arguments map 
+    the name of an aggregate to a column name or a list of column names. The 
+    supported aggregates are
+
+    - count: number of values which are not None
+    - sum, mean, median, std_dev: see the methods of :class:`Tab` with the 
+      same name. They require numeric columns.
+    - min, max: smallest and largest value
+
+    None values are ignored. For groups without any values, the sum is 0 
+    and the other aggregates, except for the count, are None.
+
+    Returns a new table with one row per group. It holds the grouping 
+    columns, followed by one column per aggregate and column, named 
+    *<aggregate>_<column>*. These columns are ordered as the aggregates in 
+    the list above, and then as the given column names, e.g. 
+
+    .. code-block:: python
+
+      groups=tab.group_by(['target', 'method'])
+      stats=groups.agg(mean=['score', 'rmsd'], count='score', max='score')
+
+    has the columns *target*, *method*, *count_score*, *mean_score*, 
+    *mean_rmsd* and *max_score*.
+
+    :raises: :class:`ValueError` if an aggregate is unknown, 
+             :class:`TypeError` if an aggregate requires a numeric column, but
+             the column is not numeric
+    """
+    tab=self.tab
+    requested=[]
+    for name in GROUP_AGGREGATES:
+      cols=aggregates.pop(name, [])
+      if isinstance(cols, basestring):
+        cols=[cols]
+      for col in cols:
+        if name in ('count', 'min', 'max'):
+          idx=tab.col_index(col)
+        else:
+          idx=tab._ensure_col_type(name, col, 'numeric')
+        requested.append((name, idx))
+    if aggregates:
+      raise ValueError('unknown aggregate "%s"' % sorted(aggregates)[0])
+    # the aggregates of each column are computed together
+    values={}
+    for idx in sorted(set(idx for name, idx in requested)):
+      names=[name for name, i in requested if i==idx]
+      values[idx]=self._aggregate_col(idx, names)
+
+    col_names=[tab.col_names[idx] for idx in self._col_indices]
+    col_types=[tab.col_types[idx] for idx in self._col_indices]
+    if len(self._col_indices)==1:
+      columns=[list(self._keys)]
+    else:
+      columns=[list(keys) for keys in zip(*self._keys)] or \
+              [[] for idx in self._col_indices]
+    for name, idx in requested:
+      col_type=tab.col_types[idx]
+      if name=='count':
+        col_type='int'
+      elif name=='sum':
+        col_type='float' if col_type=='float' else 'int'
+      elif name not in ('min', 'max'):
+        col_type='float'
+      col_names.append('%s_%s' % (name, tab.col_names[idx]))
+      col_types.append(col_type)
+      columns.append(values[idx][name])
+    result=Tab(col_names, col_types)
+    if tab.get_storage()=='columnar':
+      result.rows=ColumnarRows([Column(t, values) for t, values
+                                in zip(col_types, columns)], len(self._keys))
+    else:
+      result.rows=[list(row) for row in zip(*columns)]
+    return result
+
+  def _aggregate_col(self, idx, names):
+    # dict mapping each aggregate in names to the list of its group values
+    num_col=accel.numeric_column(self.tab, idx)
+    if num_col is not None:
+      if self._numpy_index is None:
+        self._numpy_index=accel.group_index(num_col.np, self._group_ids)
+      return accel.group_aggregates(num_col, self._numpy_index, len(self),
+                                    names)
+    group_values=[[] for key in self._keys]
+    for group_id, value in itertools.izip(self._group_ids, self.tab[idx]):
+      if value!=None:
+        group_values[group_id].append(value)
+    funcs={'count' : len, 'sum' : sum, 'mean' : mean, 
+           'median' : lambda xs: float(median(xs)), 'std_dev' : std_dev, 
+           'min' : min, 'max' : max}
+    result={}
+    for name in names:
+      func=funcs[name]
+      if name in ('count', 'sum'):
+        result[name]=[func(xs) for xs in group_values]
+      else:
+        result[name]=[func(xs) if xs else None for xs in group_values]
+    return result
+
+
+def merge(table1, table2, by, only_matching=False, how=None, method='auto'):
   """
   Returns a new table containing the data from both tables. The rows are 
   combined based on the common values in the column(s) by. The option 'by' can
@@ -1736,10 +2940,30 @@ def merge(table1, table2, by, only_matching=False):
   3      20    200
   4      None  400
   ===== ===== =====
-  
+
+  The columns of the second table which have the same name as a column of the
+  first table are renamed by appending a counter, e.g. *y_2*.
+
+  *how* selects which rows are kept:
+
+  - inner: only rows with a matching row in the other table. This is the
+    default if *only_matching* is true.
+  - left: all rows of the first table
+  - right: all rows of the second table
+  - outer: all rows of both tables. This is the default if *only_matching* is
+    false.
+
+  Rows matching several rows in the other table are combined with each of
+  them. The rows of the result are in the order of the first table (the 
+  second table for right joins), followed by the unmatched rows of the 
+  second table for outer joins.
+
+  :param method: algorithm used to find matching rows. *hash* builds a 
+                 dictionary from the keys of the second table, *sort* walks 
+                 both tables in key order. *auto* uses *sort* if both tables 
+                 are already sorted by the key columns and *hash* otherwise.
+  :raises: :class:`ValueError` if *how* or *method* are unknown
   """
-  def _key(row, indices):
-    return tuple([row[i] for i in indices])
   def _keep(indices, cn, ct, ni):
     ncn, nct, nni=([],[],[])
     for i in range(len(cn)):
@@ -1748,6 +2972,16 @@ def merge(table1, table2, by, only_matching=False):
         nct.append(ct[i])
         nni.append(ni[i])
     return ncn, nct, nni
+  def _keys(table, indices):
+    if len(indices)==1:
+      return list(TabCol(table, indices[0]))
+    return zip(*[list(TabCol(table, i)) for i in indices])
+  def _take(values, indices):
+    return [values[i] if i is not None else None for i in indices]
+  if how is None:
+    how='outer'
+    if only_matching:
+      how='inner'
   col_names=list(table2.col_names)
   col_types=list(table2.col_types)
   new_index=[i for i in range(len(col_names))]
@@ -1765,42 +2999,36 @@ def merge(table1, table2, by, only_matching=False):
       counter+=1
       try_name='%s_%d' % (name, counter)
     col_names[i]=try_name
-  common1={}
   if isinstance(by, str):
     common1_indices=[table1.col_names.index(by)]
   else:
     common1_indices=[table1.col_names.index(b) for b in by]
-  for row in table1.rows:
-    key=_key(row, common1_indices)
-    if key in common1:
-      raise ValueError('duplicate key "%s in first table"' % (str(key)))
-    common1[key]=row
-  common2={}
-  for row in table2.rows:
-    key=_key(row, common2_indices)
-    if key in common2:
-      raise ValueError('duplicate key "%s" in second table' % (str(key)))
-    common2[key]=row
+
+  left, right=join.join_indices(_keys(table1, common1_indices), 
+                                _keys(table2, common2_indices), how, method)
+  columns=[]
+  for index in range(len(table1.col_names)):
+    columns.append(_take(list(TabCol(table1, index)), left))
+  if how in ('right', 'outer'):
+    # rows only present in the second table take the key from there
+    for common1_index, common2_index in zip(common1_indices, common2_indices):
+      values=list(TabCol(table2, common2_index))
+      col_type=table1.col_types[common1_index]
+      coerce=table2.col_types[common2_index]!=col_type
+      column=columns[common1_index]
+      for k, (i, j) in enumerate(zip(left, right)):
+        if i is None:
+          value=values[j]
+          if coerce:
+            value=typeutil.coerce(value, col_type)
+          column[k]=value
+  for index in new_index:
+    columns.append(_take(list(TabCol(table2, index)), right))
+
   new_tab=Tab(table1.col_names+col_names, table1.col_types+col_types)
-  for k, v in common1.iteritems():
-    row=v+[None for i in range(len(table2.col_names)-len(common2_indices))]
-    matched=False
-    if k in common2:
-      matched=True
-      row2=common2[k]
-      for i, index in enumerate(new_index):
-        row[len(table1.col_names)+i]=row2[index]
-    if only_matching and not matched:
-      continue
-    new_tab.add_row(row)
-  if only_matching:
-    return new_tab
-  for k, v in common2.iteritems():
-    if not k in common1:
-      v2=[v[i] for i in new_index]
-      row=[None for i in range(len(table1.col_names))]+v2
-      for common1_index, common2_index in zip(common1_indices, common2_indices):
-        row[common1_index]=v[common2_index]
-      new_tab.add_row(row)
+  if table1.get_storage()=='columnar':
+    new_tab.rows=ColumnarRows([Column(t, values) for t, values
+                               in zip(new_tab.col_types, columns)], len(left))
+  else:
+    new_tab.rows=[list(row) for row in zip(*columns)]
   return new_tab
-
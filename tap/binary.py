@@ -0,0 +1,332 @@
+"""
+Binary columnar file format
+
+Tables saved in the *tapb* format store each column in a contiguous, typed
+buffer. Loading such a file only copies the buffers into the columns of a
+table with columnar storage, without parsing or converting any values. The
+file is memory-mapped, so that loading a subset of the columns only reads the
+parts of the file holding these columns.
+
+The file starts with the magic bytes ``TAPB``, followed by the format version
+and the size of the header, both as little-endian unsigned 32-bit integers.
+The header is a JSON document containing the name, comment and number of rows
+of the table and a description of each column:
+
+  name, type
+    name and type of the column
+  encoding
+    how the values are stored, see below
+  buffers
+    list of (offset, size) pairs, locating the buffers of the column relative
+    to the start of the data section
+  valid
+    (offset, size) of the validity bitmap, where bit *i* (least significant
+    bit first) is set when row *i* holds a value. Null, if the column does not
+    contain any None values.
+  null_count
+    number of None values in the column
+
+The data section starts at the first multiple of 8 after the header. Each
+buffer is aligned to 8 bytes. All numbers are stored little-endian. The
+following encodings are used:
+
+  int64, float64, bool8
+    one buffer holding a value for each row, 0 for None values
+  bytes
+    used for string columns. The first buffer holds *num_rows+1* int64 offsets
+    into the second buffer, which contains the concatenated strings.
+  pickle
+    one buffer holding the pickled list of values. This is used for columns
+    whose values can not be represented by one of the other encodings, e.g.
+    ints exceeding 64 bits or unicode strings.
+"""
+import array
+import cPickle
+import json
+import mmap
+import struct
+import sys
+
+import base
+from column import Column, ColumnarRows, LazyColumns
+
+MAGIC = 'TAPB'
+VERSION = 1
+
+_PREAMBLE = struct.Struct('<4sII')
+
+# encoding and array typecode of the fixed-width column types
+_ENCODINGS = {
+  'int' : ('int64', 'l'),
+  'float' : ('float64', 'd'),
+  'bool' : ('bool8', 'b'),
+}
+
+# the int64 buffers can be read into an array.array directly if a C long
+# has 64 bits
+_LONG_IS_INT64 = array.array('l').itemsize == 8
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def _align(offset):
+  return (offset + 7) & ~7
+
+
+def _to_little_endian(data):
+  if _BIG_ENDIAN and data.itemsize > 1:
+    data = array.array(data.typecode, data)
+    data.byteswap()
+  return data
+
+
+def _int64_buffer(values):
+  if _LONG_IS_INT64:
+    if not isinstance(values, array.array):
+      values = array.array('l', values)
+    return _to_little_endian(values)
+  return struct.pack('<%dq' % len(values), *values)
+
+
+def _buffer_size(buf):
+  if isinstance(buf, array.array):
+    return len(buf) * buf.itemsize
+  return len(buf)
+
+
+def _column_for_tab(tab, idx):
+  rows = tab.rows
+  if isinstance(rows, ColumnarRows):
+    return rows.columns[idx]
+  return Column(tab.col_types[idx], tab[idx])
+
+
+def _encode_column(col_type, column):
+  # returns the encoding, the list of buffers and the validity bitmap, if
+  # needed
+  if column.is_typed:
+    encoding = _ENCODINGS[col_type][0]
+    if col_type == 'int':
+      data = _int64_buffer(column.data)
+    else:
+      data = _to_little_endian(column.data)
+    valid = None
+    if column.null_count > 0:
+      valid = column.valid
+    return encoding, [data], valid
+  values = column.data
+  if col_type == 'string' and \
+     all(type(v) is str for v in values if v is not None):
+    offsets = [0]
+    total = 0
+    for v in values:
+      if v is not None:
+        total += len(v)
+      offsets.append(total)
+    blob = ''.join(v for v in values if v is not None)
+    valid = None
+    if column.null_count > 0:
+      valid = _bitmap(values)
+    return 'bytes', [_int64_buffer(offsets), blob], valid
+  return 'pickle', [cPickle.dumps(list(values), cPickle.HIGHEST_PROTOCOL)], None
+
+
+def _bitmap(values):
+  bitmap = bytearray((len(values) + 7) >> 3)
+  for i, v in enumerate(values):
+    if v is not None:
+      bitmap[i >> 3] |= 1 << (i & 7)
+  return bitmap
+
+
+def save(tab, stream_or_filename):
+  '''
+  Saves *tab* in the tapb format
+  '''
+  descriptions = []
+  buffers = []
+  offset = 0
+  for idx, (col_name, col_type) in enumerate(zip(tab.col_names,
+                                                 tab.col_types)):
+    column = _column_for_tab(tab, idx)
+    encoding, col_buffers, valid = _encode_column(col_type, column)
+    desc = {
+      'name' : col_name,
+      'type' : col_type,
+      'encoding' : encoding,
+      'buffers' : [],
+      'valid' : None,
+      'null_count' : column.null_count if encoding != 'pickle' else 0,
+    }
+    for buf in col_buffers:
+      size = _buffer_size(buf)
+      desc['buffers'].append([offset, size])
+      buffers.append((offset, buf))
+      offset = _align(offset + size)
+    if valid is not None:
+      size = len(valid)
+      desc['valid'] = [offset, size]
+      buffers.append((offset, valid))
+      offset = _align(offset + size)
+    descriptions.append(desc)
+  header = json.dumps({
+    'name' : tab.name,
+    'comment' : tab.comment,
+    'num_rows' : len(tab.rows),
+    'columns' : descriptions,
+  })
+
+  file_opened = False
+  if not hasattr(stream_or_filename, 'write'):
+    stream = open(stream_or_filename, 'wb')
+    file_opened = True
+  else:
+    stream = stream_or_filename
+  stream.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+  stream.write(header)
+  written = _PREAMBLE.size + len(header)
+  stream.write('\0' * (_align(written) - written))
+  written = 0
+  for buf_offset, buf in buffers:
+    stream.write('\0' * (buf_offset - written))
+    if isinstance(buf, array.array):
+      buf = buf.tostring()
+    stream.write(str(buf))
+    written = buf_offset + len(buf)
+  if file_opened:
+    stream.close()
+
+
+def _read_header(data):
+  # returns the header and the offset of the data section
+  if len(data) < _PREAMBLE.size:
+    raise IOError('Cannot read table from empty or truncated stream')
+  magic, version, header_size = _PREAMBLE.unpack(data[:_PREAMBLE.size])
+  if magic != MAGIC:
+    raise IOError('Not a tapb file')
+  if version > VERSION:
+    raise IOError('Unsupported tapb version %d' % version)
+  start = _PREAMBLE.size
+  header = json.loads(data[start:start + header_size])
+  for desc in header['columns']:
+    desc['name'] = desc['name'].encode('utf-8')
+    desc['type'] = desc['type'].encode('utf-8')
+  return header, _align(start + header_size)
+
+
+def _read_int64(raw):
+  if _LONG_IS_INT64:
+    values = array.array('l')
+    values.fromstring(raw)
+    if _BIG_ENDIAN:
+      values.byteswap()
+    return values
+  return struct.unpack('<%dq' % (len(raw) // 8), raw)
+
+
+def _decode_column(data, data_start, desc, num_rows):
+  '''
+  Decodes the column described by *desc* from *data*, which may be a string
+  or a memory map of the file
+  '''
+  def _buffer(location):
+    offset, size = location
+    return data[data_start + offset:data_start + offset + size]
+
+  col_type, encoding = desc['type'], desc['encoding']
+  valid = None
+  if desc['valid'] is not None:
+    valid = bytearray(_buffer(desc['valid']))
+  if encoding == 'pickle':
+    return Column(col_type, cPickle.loads(_buffer(desc['buffers'][0])))
+  if encoding == 'bytes':
+    offsets = _read_int64(_buffer(desc['buffers'][0]))
+    blob = _buffer(desc['buffers'][1])
+    values = [blob[offsets[i]:offsets[i + 1]] for i in xrange(num_rows)]
+    if valid is not None:
+      for i in xrange(num_rows):
+        if not valid[i >> 3] & (1 << (i & 7)):
+          values[i] = None
+    return Column(col_type, values)
+  raw = _buffer(desc['buffers'][0])
+  if encoding == 'int64':
+    values = _read_int64(raw)
+    if not isinstance(values, array.array):
+      column = Column(col_type, values)
+      if valid is not None:
+        for i in xrange(num_rows):
+          if not valid[i >> 3] & (1 << (i & 7)):
+            column[i] = None
+      return column
+  else:
+    values = array.array(_ENCODINGS[col_type][1])
+    values.fromstring(raw)
+    if _BIG_ENDIAN:
+      values.byteswap()
+  return Column.from_buffers(col_type, values, valid, desc['null_count'])
+
+
+def map_file(stream_or_filename):
+  '''
+  Returns the content of a file as a read-only memory map if possible, and as
+  a string otherwise, e.g. for in-memory streams or empty files.
+  '''
+  if not hasattr(stream_or_filename, 'read'):
+    stream = open(stream_or_filename, 'rb')
+  else:
+    stream = stream_or_filename
+  try:
+    return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+  except (AttributeError, IOError, ValueError, EnvironmentError):
+    # not a real file or an empty file
+    return stream.read()
+  finally:
+    if stream is not stream_or_filename:
+      stream.close()
+
+
+def _column_loader(data, data_start, desc, num_rows):
+  def _load():
+    return _decode_column(data, data_start, desc, num_rows)
+  return _load
+
+
+def load(stream_or_filename, cols=None, lazy=False):
+  '''
+  Loads a table saved in the tapb format. If *cols* is given, only the
+  columns with these names are loaded, in the given order.
+
+  If *lazy* is true, the columns are only decoded when they are accessed for 
+  the first time. The file stays memory-mapped until all columns have been 
+  decoded.
+
+  :raises: :class:`ValueError` if one of *cols* is not a column of the table
+  '''
+  data = map_file(stream_or_filename)
+  try:
+    header, data_start = _read_header(data)
+    descs = header['columns']
+    if cols is not None:
+      by_name = {}
+      for desc in reversed(descs):
+        by_name[desc['name']] = desc
+      for col in cols:
+        if col not in by_name:
+          raise ValueError('Tab has no column named "%s"' % col)
+      descs = [by_name[col] for col in cols]
+    num_rows = header['num_rows']
+    if lazy:
+      columns = LazyColumns([_column_loader(data, data_start, desc, num_rows)
+                             for desc in descs])
+    else:
+      columns = [_decode_column(data, data_start, desc, num_rows)
+                 for desc in descs]
+  finally:
+    if not lazy and isinstance(data, mmap.mmap):
+      data.close()
+  tab = base.Tab([desc['name'] for desc in descs],
+                 [desc['type'] for desc in descs])
+  tab.rows = ColumnarRows(columns, num_rows)
+  tab.name = header['name'].encode('utf-8')
+  tab.comment = header['comment'].encode('utf-8')
+  return tab
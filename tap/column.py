@@ -0,0 +1,621 @@
+"""
+Columnar storage backend for tables
+
+The default storage of :class:`~tap.Tab` is a list of rows, each row being a
+list of values. For large tables, storing each column in a typed, contiguous
+buffer is both considerably smaller and faster for column-wise operations.
+:class:`ColumnarRows` implements such a storage while still behaving like a
+list of rows, so that code written against ``tab.rows`` keeps working.
+"""
+import array
+
+# typecodes of the array.array buffers for the fixed-width column types. All
+# other column types (i.e. string) are stored in a plain list.
+TYPECODES = {'int' : 'l', 'float' : 'd', 'bool' : 'b'}
+
+
+def _full_bitmap(num_bits):
+  '''
+  Returns a validity bitmap with the first *num_bits* bits set
+  '''
+  bitmap = bytearray('\xff' * (num_bits >> 3))
+  if num_bits & 7:
+    bitmap.append((1 << (num_bits & 7)) - 1)
+  return bitmap
+
+
+class Column(object):
+  '''
+  Storage for the values of a single column.
+
+  For int, float and bool columns, the values are kept in an
+  :class:`array.array` and None values are tracked in a validity bitmap,
+  where bit *i* is set when row *i* holds a value. Cells set to None store 0
+  in the array. All other columns are stored in a list. When a value does not
+  fit into the typed buffer (e.g. an int exceeding the range of a C long),
+  the column transparently falls back to list storage.
+  '''
+  def __init__(self, col_type, values=None):
+    self.col_type = col_type
+    typecode = TYPECODES.get(col_type)
+    if typecode:
+      self.data = array.array(typecode)
+      self.valid = bytearray()
+    else:
+      self.data = []
+      self.valid = None
+    self.null_count = 0
+    if values is not None:
+      self.extend(values)
+
+  @staticmethod
+  def from_buffers(col_type, data, valid=None, null_count=0):
+    '''
+    Creates a column from an :class:`array.array` of values and a validity
+    bitmap, without copying them. When *valid* is None, all values are
+    considered to be valid.
+    '''
+    col = Column(col_type)
+    col.data = data
+    if valid is None:
+      valid = _full_bitmap(len(data))
+    col.valid = valid
+    col.null_count = null_count
+    return col
+
+  @property
+  def is_typed(self):
+    '''
+    True, if the values are stored in a typed buffer
+    '''
+    return self.valid is not None
+
+  def _to_list(self):
+    self.data = self.tolist()
+    self.valid = None
+
+  def _is_valid(self, index):
+    return self.valid[index >> 3] & (1 << (index & 7))
+
+  def _set_valid(self, index, valid):
+    if valid:
+      self.valid[index >> 3] |= (1 << (index & 7))
+    else:
+      self.valid[index >> 3] &= ~(1 << (index & 7))
+
+  def _index(self, index):
+    length = len(self.data)
+    if index < 0:
+      index += length
+    if index < 0 or index >= length:
+      raise IndexError('column index out of range')
+    return index
+
+  def __len__(self):
+    return len(self.data)
+
+  def is_valid(self, index):
+    '''
+    Returns true, if the cell at *index* is not None
+    '''
+    index = self._index(index)
+    if not self.is_typed:
+      return self.data[index] is not None
+    return bool(self._is_valid(index))
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[i] for i in xrange(*index.indices(len(self)))]
+    if not self.is_typed:
+      return self.data[index]
+    index = self._index(index)
+    if not self._is_valid(index):
+      return None
+    if self.col_type == 'bool':
+      return bool(self.data[index])
+    return self.data[index]
+
+  def __setitem__(self, index, value):
+    if not self.is_typed:
+      if self.data[index] is None:
+        self.null_count -= 1
+      if value is None:
+        self.null_count += 1
+      self.data[index] = value
+      return
+    index = self._index(index)
+    was_valid = self._is_valid(index)
+    if value is None:
+      self.data[index] = 0
+      if was_valid:
+        self._set_valid(index, False)
+        self.null_count += 1
+      return
+    try:
+      self.data[index] = value
+    except (TypeError, OverflowError):
+      self._to_list()
+      self[index] = value
+      return
+    if not was_valid:
+      self._set_valid(index, True)
+      self.null_count -= 1
+
+  def _valid_flags(self):
+    return [bool(self._is_valid(i)) for i in xrange(len(self.data))]
+
+  def _set_valid_flags(self, flags):
+    bitmap = bytearray((len(flags) + 7) >> 3)
+    for i, flag in enumerate(flags):
+      if flag:
+        bitmap[i >> 3] |= 1 << (i & 7)
+    self.valid = bitmap
+
+  def __delitem__(self, index):
+    index = self._index(index)
+    if not self.is_typed:
+      if self.data[index] is None:
+        self.null_count -= 1
+      del self.data[index]
+      return
+    if self.null_count == 0:
+      del self.data[index]
+      self.valid = _full_bitmap(len(self.data))
+      return
+    # the validity bits after index move by one
+    flags = self._valid_flags()
+    if not flags[index]:
+      self.null_count -= 1
+    del self.data[index]
+    del flags[index]
+    self._set_valid_flags(flags)
+
+  def insert(self, index, value):
+    '''
+    Inserts *value* before *index*, with the same semantics as
+    :meth:`list.insert`
+    '''
+    length = len(self.data)
+    if index < 0:
+      index = max(index + length, 0)
+    if index >= length:
+      self.append(value)
+      return
+    if not self.is_typed:
+      if value is None:
+        self.null_count += 1
+      self.data.insert(index, value)
+      return
+    flags = None
+    if self.null_count > 0:
+      flags = self._valid_flags()
+    try:
+      self.data.insert(index, 0 if value is None else value)
+    except (TypeError, OverflowError):
+      self._to_list()
+      self.insert(index, value)
+      return
+    if value is None:
+      self.null_count += 1
+    if self.null_count == 0:
+      self.valid = _full_bitmap(len(self.data))
+      return
+    if flags is None:
+      flags = [True] * length
+    flags.insert(index, value is not None)
+    self._set_valid_flags(flags)
+
+  def append(self, value):
+    if not self.is_typed:
+      if value is None:
+        self.null_count += 1
+      self.data.append(value)
+      return
+    index = len(self.data)
+    if value is None:
+      self.data.append(0)
+      self.null_count += 1
+    else:
+      try:
+        self.data.append(value)
+      except (TypeError, OverflowError):
+        self._to_list()
+        self.append(value)
+        return
+    if (index & 7) == 0:
+      self.valid.append(0)
+    if value is not None:
+      self._set_valid(index, True)
+
+  def extend(self, values):
+    if not self.is_typed:
+      for value in values:
+        self.append(value)
+      return
+    values = list(values)
+    # append values one by one until the bitmap is byte-aligned, then copy
+    # the rest in bulk if none of them is None
+    head = min(-len(self.data) & 7, len(values))
+    for value in values[:head]:
+      self.append(value)
+    rest = values[head:]
+    if self.is_typed and None not in rest:
+      start = len(self.data)
+      try:
+        self.data.extend(rest)
+      except (TypeError, OverflowError):
+        del self.data[start:]
+      else:
+        self.valid.extend(_full_bitmap(len(rest)))
+        return
+    for value in rest:
+      self.append(value)
+
+  def __iter__(self):
+    if not self.is_typed:
+      return iter(self.data)
+    if self.null_count == 0:
+      if self.col_type == 'bool':
+        return (bool(v) for v in self.data)
+      return iter(self.data)
+    return self._iter_with_nulls()
+
+  def _iter_with_nulls(self):
+    valid = self.valid
+    as_bool = self.col_type == 'bool'
+    for index, value in enumerate(self.data):
+      if not valid[index >> 3] & (1 << (index & 7)):
+        yield None
+      elif as_bool:
+        yield bool(value)
+      else:
+        yield value
+
+  def tolist(self):
+    '''
+    Returns the values of the column as a list, None values included
+    '''
+    if not self.is_typed:
+      return list(self.data)
+    return list(iter(self))
+
+  def take(self, indices):
+    '''
+    Returns a new column containing the values at *indices*, in that order.
+    '''
+    result = Column(self.col_type)
+    data = self.data
+    if not self.is_typed:
+      result.data = [data[i] for i in indices]
+      result.valid = None
+      if self.null_count > 0:
+        result.null_count = result.data.count(None)
+      return result
+    result.data = array.array(data.typecode, [data[i] for i in indices])
+    if self.null_count == 0:
+      result.valid = _full_bitmap(len(result.data))
+      return result
+    valid = self.valid
+    bitmap = bytearray((len(result.data) + 7) >> 3)
+    null_count = 0
+    for j, i in enumerate(indices):
+      if valid[i >> 3] & (1 << (i & 7)):
+        bitmap[j >> 3] |= 1 << (j & 7)
+      else:
+        null_count += 1
+    result.valid = bitmap
+    result.null_count = null_count
+    return result
+
+  def values_at(self, indices):
+    '''
+    Returns the list of values at *indices*, in that order
+    '''
+    data = self.data
+    if not self.is_typed:
+      return [data[i] for i in indices]
+    if self.null_count == 0:
+      if self.col_type == 'bool':
+        return [bool(data[i]) for i in indices]
+      return [data[i] for i in indices]
+    return [self[i] for i in indices]
+
+  def reorder(self, indices):
+    '''
+    Reorders the values of the column in-place, such that the new value at
+    position *i* is the old value at position *indices[i]*.
+    '''
+    reordered = self.take(indices)
+    self.data = reordered.data
+    self.valid = reordered.valid
+    self.null_count = reordered.null_count
+
+
+class ColumnarRow(object):
+  '''
+  Proxy for a single row of a :class:`ColumnarRows` storage. Reading and
+  writing values through the proxy reads and writes the underlying columns.
+  '''
+  __slots__ = ('_columns', '_index')
+
+  def __init__(self, columns, index):
+    self._columns = columns
+    self._index = index
+
+  def __len__(self):
+    return len(self._columns)
+
+  def __getitem__(self, col_index):
+    if isinstance(col_index, slice):
+      return [col[self._index] for col in self._columns[col_index]]
+    return self._columns[col_index][self._index]
+
+  def __setitem__(self, col_index, value):
+    self._columns[col_index][self._index] = value
+
+  def __iter__(self):
+    index = self._index
+    for col in self._columns:
+      yield col[index]
+
+  def __contains__(self, value):
+    return value in list(self)
+
+  def __eq__(self, other):
+    try:
+      return list(self) == list(other)
+    except TypeError:
+      return False
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __add__(self, other):
+    return list(self) + list(other)
+
+  def __radd__(self, other):
+    return list(other) + list(self)
+
+  def __repr__(self):
+    return repr(list(self))
+
+
+class ColumnarRows(object):
+  '''
+  Columnar table storage that behaves like a list of rows.
+
+  Indexing and iterating yield :class:`ColumnarRow` proxies. Appending or
+  assigning rows writes the values into the columns. The values are expected
+  to be of the correct column type already, i.e. the caller is responsible
+  for coercion.
+  '''
+  def __init__(self, columns=None, num_rows=None):
+    if columns is None:
+      columns = []
+    self.columns = columns
+    if num_rows is None:
+      num_rows = 0
+      if columns:
+        num_rows = len(columns[0])
+    self._num_rows = num_rows
+
+  @staticmethod
+  def from_rows(rows, col_types):
+    '''
+    Creates a columnar storage from a sequence of rows
+    '''
+    columns = [Column(t) for t in col_types]
+    for i, col in enumerate(columns):
+      col.extend(row[i] for row in rows)
+    return ColumnarRows(columns, len(rows))
+
+  def to_rows(self):
+    '''
+    Returns the data as a list of rows, each row being a list of values
+    '''
+    if not self.columns:
+      return [[] for i in xrange(self._num_rows)]
+    return [list(row) for row in zip(*[col.tolist() for col in self.columns])]
+
+  def _index(self, index):
+    if index < 0:
+      index += self._num_rows
+    if index < 0 or index >= self._num_rows:
+      raise IndexError('row index out of range')
+    return index
+
+  def __len__(self):
+    return self._num_rows
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [ColumnarRow(self.columns, i)
+              for i in xrange(*index.indices(self._num_rows))]
+    return ColumnarRow(self.columns, self._index(index))
+
+  def __setitem__(self, index, row):
+    index = self._index(index)
+    if isinstance(row, ColumnarRow):
+      row = list(row)
+    for col, value in zip(self.columns, row):
+      col[index] = value
+
+  def __iter__(self):
+    columns = self.columns
+    for index in xrange(self._num_rows):
+      yield ColumnarRow(columns, index)
+
+  def __delitem__(self, index):
+    index = self._index(index)
+    for col in self.columns:
+      del col[index]
+    self._num_rows -= 1
+
+  def __eq__(self, other):
+    try:
+      return self.to_rows() == [list(row) for row in other]
+    except TypeError:
+      return False
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __repr__(self):
+    return repr(self.to_rows())
+
+  def insert(self, index, row):
+    if isinstance(row, ColumnarRow):
+      row = list(row)
+    for col, value in zip(self.columns, row):
+      col.insert(index, value)
+    self._num_rows += 1
+
+  def append(self, row):
+    if isinstance(row, ColumnarRow):
+      row = list(row)
+    for col, value in zip(self.columns, row):
+      col.append(value)
+    self._num_rows += 1
+
+  def extend(self, rows):
+    for row in rows:
+      self.append(row)
+
+  def sort(self, cmp=None, key=None, reverse=False):
+    '''
+    In-place sort with the same semantics as :meth:`list.sort`. The *cmp* and
+    *key* functions are called with row proxies.
+    '''
+    order = [row._index for row in sorted(self, cmp=cmp, key=key,
+                                          reverse=reverse)]
+    self.reorder(order)
+
+  def reorder(self, indices):
+    '''
+    Reorders the rows in-place, such that row *i* becomes the old row at
+    position *indices[i]*.
+    '''
+    for col in self.columns:
+      col.reorder(indices)
+
+  def add_column(self, col):
+    if len(col)!=self._num_rows:
+      raise ValueError('Length of column (%i) must correspond to number of '
+                       'existing rows (%i)' % (len(col), self._num_rows))
+    self.columns.append(col)
+
+  def remove_column(self, col_index):
+    del self.columns[col_index]
+
+
+class LazyColumns(object):
+  '''
+  List of columns which are only decoded when they are accessed for the first
+  time. Each column is created by calling its loader without arguments. 
+  Used as the columns of a :class:`ColumnarRows` storage for lazily loaded 
+  tables.
+  '''
+  def __init__(self, loaders):
+    self._loaders = list(loaders)
+    self._columns = [None] * len(self._loaders)
+
+  def is_loaded(self, index):
+    '''
+    Returns true, if the column at *index* has already been decoded
+    '''
+    return self._columns[index] is not None
+
+  def __len__(self):
+    return len(self._columns)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[i] for i in xrange(*index.indices(len(self)))]
+    col = self._columns[index]
+    if col is None:
+      col = self._loaders[index]()
+      self._columns[index] = col
+      # release the loader and with it the references to the file content
+      self._loaders[index] = None
+    return col
+
+  def __setitem__(self, index, col):
+    self._columns[index] = col
+    self._loaders[index] = None
+
+  def __delitem__(self, index):
+    del self._columns[index]
+    del self._loaders[index]
+
+  def __iter__(self):
+    for index in xrange(len(self._columns)):
+      yield self[index]
+
+  def __add__(self, other):
+    return list(self) + list(other)
+
+  def append(self, col):
+    self._columns.append(col)
+    self._loaders.append(None)
+
+  def __reduce__(self):
+    # the loaders can not be pickled, decode all columns instead
+    return (list, (list(self),))
+
+
+class IndexedRows(object):
+  '''
+  Read-only view on the rows of a table storage, i.e. a list of rows or a
+  :class:`ColumnarRows`, at the given row indices. Used as the rows of a
+  :class:`~tap.base.TabView`.
+
+  :param rows: the underlying storage
+  :param indices: :class:`array.array` of row indices into *rows*
+  '''
+  def __init__(self, rows, indices):
+    self.rows = rows
+    self.indices = indices
+
+  @property
+  def is_columnar(self):
+    '''
+    True, if the underlying storage is columnar
+    '''
+    return isinstance(self.rows, ColumnarRows)
+
+  def __len__(self):
+    return len(self.indices)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      rows = self.rows
+      return [rows[i] for i in self.indices[index]]
+    return self.rows[self.indices[index]]
+
+  def __iter__(self):
+    rows = self.rows
+    for index in self.indices:
+      yield rows[index]
+
+  def column(self, col_index):
+    '''
+    Returns the list of values of the column at *col_index*
+    '''
+    if self.is_columnar:
+      return self.rows.columns[col_index].values_at(self.indices)
+    rows = self.rows
+    return [rows[i][col_index] for i in self.indices]
+
+  def take(self, indices):
+    '''
+    Returns a new storage of the same kind as the underlying storage,
+    containing copies of the rows at *indices*, which are indices into the
+    view.
+    '''
+    own = self.indices
+    indices = [own[i] for i in indices]
+    if self.is_columnar:
+      return ColumnarRows([col.take(indices) for col in self.rows.columns],
+                          len(indices))
+    rows = self.rows
+    return [list(rows[i]) for i in indices]
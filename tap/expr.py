@@ -0,0 +1,851 @@
+"""
+Lazy expressions over table columns
+
+Arithmetic, comparisons and functions applied to a column of a table, e.g.
+``tab.x * 2 + tab.y`` or ``tab.score > 0.5``, do not compute anything right
+away. They build a tree of :class:`ColExpr` nodes, which is evaluated as a
+whole when the values are needed, i.e. when iterating over the expression,
+assigning it to a column or filtering a table with it:
+
+.. code-block:: python
+
+  tab['z'] = tab.x * 2 + tab.y
+  high = tab.filter((tab.score > 0.5) & (tab.rank <= 10))
+
+As for a single operation, None values propagate through the tree: the
+result is None when one of the operands is None. Comparing with None tests
+for None values instead, e.g. ``tab.x == None``.
+
+For numeric columns, the tree is evaluated on ndarrays when NumPy is
+available. Otherwise, the whole tree is compiled into a single loop over the
+rows, avoiding intermediate lists and a function call per operation. Both
+evaluations give the same results; operations NumPy would compute differently
+from Python (ints exceeding 64 bits, division by zero, math domain errors)
+are evaluated by the loop.
+"""
+from __future__ import with_statement
+import itertools
+import math
+import operator
+
+import accel
+import typeutil
+
+# python source for the binary operators
+_BINARY_OPS = {
+  '+' : '%s + %s',
+  '-' : '%s - %s',
+  '*' : '%s * %s',
+  '/' : '%s / %s',
+  'truediv' : '_truediv(%s, %s)',
+  '//' : '%s // %s',
+  '%' : '%s %% %s',
+  '**' : '%s ** %s',
+  '<' : '%s < %s',
+  '<=' : '%s <= %s',
+  '>' : '%s > %s',
+  '>=' : '%s >= %s',
+  '==' : '%s == %s',
+  '!=' : '%s != %s',
+  '&' : '%s & %s',
+  '|' : '%s | %s',
+  '^' : '%s ^ %s',
+}
+
+# operators accepted by BinaryColExpr for compatibility with older versions,
+# which took a function from the operator module
+_OPERATOR_FUNCS = {
+  operator.add : '+',
+  operator.sub : '-',
+  operator.mul : '*',
+  operator.div : '/',
+  operator.truediv : 'truediv',
+  operator.floordiv : '//',
+  operator.mod : '%',
+  operator.pow : '**',
+  operator.lt : '<',
+  operator.le : '<=',
+  operator.gt : '>',
+  operator.ge : '>=',
+  operator.eq : '==',
+  operator.ne : '!=',
+  operator.and_ : '&',
+  operator.or_ : '|',
+  operator.xor : '^',
+}
+
+_COMPARISON_OPS = ('<', '<=', '>', '>=', '==', '!=')
+
+# functions which may be applied to expressions, with their implementation
+# for single values and the name of the NumPy ufunc
+FUNCTIONS = {
+  'sqrt' : (math.sqrt, 'sqrt'),
+  'exp' : (math.exp, 'exp'),
+  'log' : (math.log, 'log'),
+  'log10' : (math.log10, 'log10'),
+  'sin' : (math.sin, 'sin'),
+  'cos' : (math.cos, 'cos'),
+  'tan' : (math.tan, 'tan'),
+  'floor' : (math.floor, 'floor'),
+  'ceil' : (math.ceil, 'ceil'),
+}
+
+_NUMERIC_TYPES = ('int', 'float', 'bool')
+
+# largest magnitude of the int64 values computed with NumPy
+_INT64_LIMIT = 2**63
+
+
+class ColExpr(object):
+  '''
+  Base class of the nodes of an expression tree.
+
+  Expressions support the arithmetic operators, comparisons and the operators
+  ``&``, ``|``, ``^`` and ``~``, which act as logical operators on bool
+  values. Since ``and``, ``or`` and ``not`` can not be overloaded, they can
+  not be used to combine expressions, neither can chained comparisons.
+  '''
+  __hash__ = object.__hash__
+
+  def __add__(self, rhs):
+    return BinaryColExpr('+', self, rhs)
+
+  def __radd__(self, lhs):
+    return BinaryColExpr('+', lhs, self)
+
+  def __sub__(self, rhs):
+    return BinaryColExpr('-', self, rhs)
+
+  def __rsub__(self, lhs):
+    return BinaryColExpr('-', lhs, self)
+
+  def __mul__(self, rhs):
+    return BinaryColExpr('*', self, rhs)
+
+  def __rmul__(self, lhs):
+    return BinaryColExpr('*', lhs, self)
+
+  def __div__(self, rhs):
+    return BinaryColExpr('/', self, rhs)
+
+  def __rdiv__(self, lhs):
+    return BinaryColExpr('/', lhs, self)
+
+  def __truediv__(self, rhs):
+    return BinaryColExpr('truediv', self, rhs)
+
+  def __rtruediv__(self, lhs):
+    return BinaryColExpr('truediv', lhs, self)
+
+  def __floordiv__(self, rhs):
+    return BinaryColExpr('//', self, rhs)
+
+  def __rfloordiv__(self, lhs):
+    return BinaryColExpr('//', lhs, self)
+
+  def __mod__(self, rhs):
+    return BinaryColExpr('%', self, rhs)
+
+  def __rmod__(self, lhs):
+    return BinaryColExpr('%', lhs, self)
+
+  def __pow__(self, rhs):
+    return BinaryColExpr('**', self, rhs)
+
+  def __rpow__(self, lhs):
+    return BinaryColExpr('**', lhs, self)
+
+  def __lt__(self, rhs):
+    return BinaryColExpr('<', self, rhs)
+
+  def __le__(self, rhs):
+    return BinaryColExpr('<=', self, rhs)
+
+  def __gt__(self, rhs):
+    return BinaryColExpr('>', self, rhs)
+
+  def __ge__(self, rhs):
+    return BinaryColExpr('>=', self, rhs)
+
+  def __eq__(self, rhs):
+    if rhs is None:
+      return IsNullExpr(self)
+    return BinaryColExpr('==', self, rhs)
+
+  def __ne__(self, rhs):
+    if rhs is None:
+      return UnaryColExpr('~', IsNullExpr(self))
+    return BinaryColExpr('!=', self, rhs)
+
+  def __and__(self, rhs):
+    return BinaryColExpr('&', self, rhs)
+
+  def __rand__(self, lhs):
+    return BinaryColExpr('&', lhs, self)
+
+  def __or__(self, rhs):
+    return BinaryColExpr('|', self, rhs)
+
+  def __ror__(self, lhs):
+    return BinaryColExpr('|', lhs, self)
+
+  def __xor__(self, rhs):
+    return BinaryColExpr('^', self, rhs)
+
+  def __rxor__(self, lhs):
+    return BinaryColExpr('^', lhs, self)
+
+  def __neg__(self):
+    return UnaryColExpr('-', self)
+
+  def __abs__(self):
+    return UnaryColExpr('abs', self)
+
+  def __invert__(self):
+    return UnaryColExpr('~', self)
+
+  def __nonzero__(self):
+    raise TypeError('The truth value of a column expression is ambiguous. '
+                    'Use & and | instead of "and" and "or" and avoid chained '
+                    'comparisons')
+
+  def __iter__(self):
+    return iter(self.evaluate())
+
+  def __len__(self):
+    # number of rows. As when iterating over columns with zip, the shortest
+    # column wins.
+    leaves = {}
+    self._leaves(leaves)
+    if not leaves:
+      raise ValueError('expression does not refer to any column')
+    return min(len(leaf) for leaf in leaves.itervalues())
+
+  def isin(self, values):
+    '''
+    Returns an expression which is true for the rows where the value is one
+    of *values*. Unlike for the other operators, None values are matched if
+    *values* contains None.
+    '''
+    return InSetExpr(self, values)
+
+  def between(self, low, high):
+    '''
+    Returns an expression which is true for the rows where the value lies in
+    the closed interval [*low*, *high*]
+    '''
+    return (self>=low) & (self<=high)
+
+  def evaluate(self):
+    '''
+    Evaluates the expression and returns the list of values, one for each
+    row
+    '''
+    return evaluate(self)
+
+  def result_type(self):
+    '''
+    Returns the column type of the values of the expression, i.e. one of
+    *int*, *float*, *bool* or *string*
+    '''
+    raise NotImplementedError
+
+  def _children(self):
+    return ()
+
+  def _leaves(self, leaves):
+    for child in self._children():
+      child._leaves(leaves)
+
+  def _emit(self, ctx):
+    # appends the python statements computing the expression for a single row
+    # to ctx, returns the name of the variable holding the result
+    raise NotImplementedError
+
+  def _numpy(self, ctx):
+    # returns the values as ndarray, the validity mask (None if all values are
+    # valid) and the largest possible magnitude of int values (None for other
+    # types)
+    raise NotImplementedError
+
+
+def _as_expr(value):
+  if isinstance(value, ColExpr):
+    return value
+  if typeutil.is_scalar(value) or value is None:
+    return ConstExpr(value)
+  return ValuesExpr(value)
+
+
+def _type_of_value(value):
+  if isinstance(value, bool):
+    return 'bool'
+  if isinstance(value, (int, long)):
+    return 'int'
+  if isinstance(value, float):
+    return 'float'
+  return 'string'
+
+
+class ConstExpr(ColExpr):
+  '''
+  Constant value, used for every row
+  '''
+  def __init__(self, value):
+    self.value = value
+
+  def result_type(self):
+    return _type_of_value(self.value)
+
+  def _emit(self, ctx):
+    return ctx.const(self.value)
+
+  def _numpy(self, ctx):
+    value = self.value
+    if not isinstance(value, (bool, int, long, float)):
+      raise _NotVectorizable()
+    bound = None
+    if self.result_type() == 'int':
+      bound = _check_bound(abs(value))
+    return value, None, bound
+
+
+class LeafExpr(ColExpr):
+  '''
+  Base class of the leaves of an expression tree holding the values of a
+  column. Subclasses provide the values as a list and, if possible, as
+  ndarray.
+  '''
+  def _leaves(self, leaves):
+    leaves.setdefault(self._leaf_key(), self)
+
+  def _leaf_key(self):
+    # leaves with the same key are evaluated only once
+    return id(self)
+
+  def __len__(self):
+    raise NotImplementedError
+
+  def _leaf_values(self):
+    raise NotImplementedError
+
+  def _leaf_arrays(self, np):
+    # returns the values and the validity mask, None if the values can not be
+    # represented as ndarray
+    raise NotImplementedError
+
+  def _emit(self, ctx):
+    return ctx.leaf(self)
+
+  def _numpy(self, ctx):
+    return ctx.leaf(self)
+
+
+class ValuesExpr(LeafExpr):
+  '''
+  Leaf holding the values of an arbitrary iterable, e.g. a list
+  '''
+  def __init__(self, values):
+    self.values = list(values)
+
+  def result_type(self):
+    return typeutil.guess_array_type(self.values)
+
+  def __len__(self):
+    return len(self.values)
+
+  def _leaf_values(self):
+    return self.values
+
+  def _leaf_arrays(self, np):
+    col_type = self.result_type()
+    if col_type not in _NUMERIC_TYPES:
+      return None
+    values = self.values
+    valid = None
+    if None in values:
+      valid = np.array([v is not None for v in values], dtype=bool)
+      values = [v if v is not None else 0 for v in values]
+    try:
+      return np.array(values, dtype=accel.DTYPES[col_type]), valid
+    except (OverflowError, TypeError, ValueError):
+      return None
+
+
+class BinaryColExpr(ColExpr):
+  '''
+  Binary operation on two expressions. The operands which are not
+  expressions themselves are turned into constants (scalars) or leaves
+  holding their values (iterables).
+
+  :param op: operator symbol, e.g. ``+`` or ``<=``. For compatibility, the
+             corresponding function from the :mod:`operator` module is
+             accepted as well.
+  '''
+  def __init__(self, op, lhs, rhs):
+    op = _OPERATOR_FUNCS.get(op, op)
+    if op not in _BINARY_OPS:
+      raise ValueError('unknown operator "%s"' % op)
+    self.op = op
+    self.lhs = _as_expr(lhs)
+    self.rhs = _as_expr(rhs)
+
+  def _children(self):
+    return (self.lhs, self.rhs)
+
+  def result_type(self):
+    op = self.op
+    lhs, rhs = self.lhs.result_type(), self.rhs.result_type()
+    if op in _COMPARISON_OPS:
+      return 'bool'
+    if op in ('&', '|', '^'):
+      if lhs == 'bool' and rhs == 'bool':
+        return 'bool'
+      return 'int'
+    if 'string' in (lhs, rhs):
+      return 'string'
+    if 'float' in (lhs, rhs) or op == 'truediv':
+      return 'float'
+    return 'int'
+
+  def _emit(self, ctx):
+    lhs, rhs = self.lhs._emit(ctx), self.rhs._emit(ctx)
+    return ctx.assign(_BINARY_OPS[self.op] % (lhs, rhs), [lhs, rhs])
+
+  def _numpy(self, ctx):
+    np = ctx.np
+    op = self.op
+    lhs, lhs_valid, lhs_bound = self.lhs._numpy(ctx)
+    rhs, rhs_valid, rhs_bound = self.rhs._numpy(ctx)
+    valid = _combine_valid(np, lhs_valid, rhs_valid)
+    if op in _COMPARISON_OPS:
+      return _NUMPY_COMPARISONS[op](np, lhs, rhs), valid, None
+    if op in ('&', '|', '^'):
+      func = {'&' : np.bitwise_and, '|' : np.bitwise_or,
+              '^' : np.bitwise_xor}[op]
+      bound = None
+      if self.result_type() == 'int':
+        bound = _check_bound(2 * max(lhs_bound or 1, rhs_bound or 1))
+      return func(lhs, rhs), valid, bound
+    # bools take part in arithmetic as ints, as in Python
+    lhs, rhs = _bool_to_int(np, lhs), _bool_to_int(np, rhs)
+    result_type = self.result_type()
+    bound = None
+    if result_type == 'int':
+      lhs_bound, rhs_bound = lhs_bound or 1, rhs_bound or 1
+      if op in ('+', '-'):
+        bound = lhs_bound + rhs_bound
+      elif op == '*':
+        bound = lhs_bound * rhs_bound
+      elif op in ('/', '//'):
+        bound = lhs_bound
+      elif op == '%':
+        bound = rhs_bound
+      elif op == '**':
+        if rhs_bound >= 64 and lhs_bound > 1:
+          raise _NotVectorizable()
+        bound = lhs_bound ** rhs_bound
+      bound = _check_bound(bound)
+    if op == '/':
+      if result_type == 'int':
+        return np.floor_divide(lhs, rhs), valid, bound
+      return np.true_divide(lhs, rhs), valid, bound
+    func = {'+' : np.add, '-' : np.subtract, '*' : np.multiply,
+            'truediv' : np.true_divide, '//' : np.floor_divide,
+            '%' : np.remainder, '**' : np.power}[op]
+    return func(lhs, rhs), valid, bound
+
+
+class UnaryColExpr(ColExpr):
+  '''
+  Unary operation on an expression: negation (``-``), absolute value (*abs*)
+  and inversion (``~``), which is the logical not for bool values.
+  '''
+  def __init__(self, op, operand):
+    if op not in ('-', 'abs', '~'):
+      raise ValueError('unknown operator "%s"' % op)
+    self.op = op
+    self.operand = _as_expr(operand)
+
+  def _children(self):
+    return (self.operand,)
+
+  def result_type(self):
+    operand_type = self.operand.result_type()
+    if operand_type == 'bool' and self.op != '~':
+      return 'int'
+    return operand_type
+
+  def _emit(self, ctx):
+    operand = self.operand._emit(ctx)
+    if self.op == '-':
+      code = '-%s'
+    elif self.op == 'abs':
+      code = 'abs(%s)'
+    elif self.operand.result_type() == 'bool':
+      code = 'not %s'
+    else:
+      code = '~%s'
+    return ctx.assign(code % operand, [operand])
+
+  def _numpy(self, ctx):
+    np = ctx.np
+    values, valid, bound = self.operand._numpy(ctx)
+    if self.op == '~':
+      if self.operand.result_type() == 'bool':
+        return np.logical_not(values), valid, None
+      return np.invert(values), valid, _check_bound(bound + 1)
+    values = _bool_to_int(np, values)
+    if self.result_type() == 'int':
+      bound = bound or 1
+    if self.op == '-':
+      return np.negative(values), valid, bound
+    return np.absolute(values), valid, bound
+
+
+class FuncColExpr(ColExpr):
+  '''
+  Application of one of the :data:`FUNCTIONS` to an expression
+  '''
+  def __init__(self, name, operand):
+    if name not in FUNCTIONS:
+      raise ValueError('unknown function "%s"' % name)
+    self.name = name
+    self.operand = _as_expr(operand)
+
+  def _children(self):
+    return (self.operand,)
+
+  def result_type(self):
+    return 'float'
+
+  def _emit(self, ctx):
+    operand = self.operand._emit(ctx)
+    func = ctx.func(FUNCTIONS[self.name][0])
+    return ctx.assign('%s(%s)' % (func, operand), [operand])
+
+  def _numpy(self, ctx):
+    values, valid, bound = self.operand._numpy(ctx)
+    ufunc = getattr(ctx.np, FUNCTIONS[self.name][1])
+    return ufunc(_bool_to_int(ctx.np, values), dtype='float64'), valid, None
+
+
+class IsNullExpr(ColExpr):
+  '''
+  True for the rows where the value of the expression is None, false
+  otherwise. Never None itself.
+  '''
+  def __init__(self, operand):
+    self.operand = _as_expr(operand)
+
+  def _children(self):
+    return (self.operand,)
+
+  def result_type(self):
+    return 'bool'
+
+  def _emit(self, ctx):
+    operand = self.operand._emit(ctx)
+    return ctx.assign('%s is None' % operand, [], nullable=False)
+
+  def _numpy(self, ctx):
+    np = ctx.np
+    values, valid, bound = self.operand._numpy(ctx)
+    if valid is None:
+      return np.zeros(ctx.num_rows, dtype=bool), None, None
+    return np.logical_not(valid), None, None
+
+
+class InSetExpr(ColExpr):
+  '''
+  True for the rows where the value of the expression is contained in a set
+  of values, false otherwise. Never None itself.
+  '''
+  def __init__(self, operand, values):
+    self.operand = _as_expr(operand)
+    self.values = frozenset(values)
+
+  def _children(self):
+    return (self.operand,)
+
+  def result_type(self):
+    return 'bool'
+
+  def _emit(self, ctx):
+    operand = self.operand._emit(ctx)
+    return ctx.assign('%s in %s' % (operand, ctx.const(self.values)), [],
+                      nullable=False)
+
+  def _numpy(self, ctx):
+    np = ctx.np
+    values, valid, bound = self.operand._numpy(ctx)
+    numbers = [v for v in self.values if v is not None]
+    if not all(isinstance(v, (bool, int, long, float)) for v in numbers):
+      raise _NotVectorizable()
+    if not isinstance(values, np.ndarray):
+      values = np.repeat(values, ctx.num_rows)
+    result = np.in1d(values, numbers)
+    if valid is not None:
+      if None in self.values:
+        result |= ~valid
+      else:
+        result &= valid
+    return result, None, None
+
+
+def _function(name):
+  def _apply(operand):
+    return FuncColExpr(name, operand)
+  _apply.__name__ = name
+  _apply.__doc__ = '''
+  Applies :func:`math.%s` to the values of *operand*
+  ''' % name
+  return _apply
+
+sqrt = _function('sqrt')
+exp = _function('exp')
+log = _function('log')
+log10 = _function('log10')
+sin = _function('sin')
+cos = _function('cos')
+tan = _function('tan')
+floor = _function('floor')
+ceil = _function('ceil')
+
+
+def is_null(operand):
+  '''
+  Returns an expression which is true for the rows where *operand* is None
+  '''
+  return IsNullExpr(operand)
+
+
+class _NotVectorizable(Exception):
+  pass
+
+
+def _check_bound(bound):
+  if bound >= _INT64_LIMIT:
+    raise _NotVectorizable()
+  return bound
+
+
+def _bool_to_int(np, values):
+  if isinstance(values, bool):
+    return int(values)
+  if isinstance(values, np.ndarray) and values.dtype == bool:
+    return values.astype('int64')
+  return values
+
+
+def _combine_valid(np, lhs_valid, rhs_valid):
+  if lhs_valid is None:
+    return rhs_valid
+  if rhs_valid is None:
+    return lhs_valid
+  return np.logical_and(lhs_valid, rhs_valid)
+
+
+_NUMPY_COMPARISONS = {
+  '<' : lambda np, a, b: np.less(a, b),
+  '<=' : lambda np, a, b: np.less_equal(a, b),
+  '>' : lambda np, a, b: np.greater(a, b),
+  '>=' : lambda np, a, b: np.greater_equal(a, b),
+  '==' : lambda np, a, b: np.equal(a, b),
+  '!=' : lambda np, a, b: np.not_equal(a, b),
+}
+
+
+class _SourceContext(object):
+  '''
+  Collects the statements of the loop evaluating an expression tree
+  '''
+  def __init__(self, indices=None):
+    self.indices = indices
+    self.namespace = {'_truediv' : operator.truediv}
+    self.leaf_vars = {}
+    self.leaf_values = []
+    self.lines = []
+    self.nullable = set()
+    self._num_temps = 0
+
+  def _name(self, prefix, value):
+    name = '%s%d' % (prefix, len(self.namespace))
+    self.namespace[name] = value
+    return name
+
+  def const(self, value):
+    name = self._name('k', value)
+    if value is None:
+      self.nullable.add(name)
+    return name
+
+  def func(self, func):
+    return self._name('f', func)
+
+  def leaf(self, leaf):
+    key = leaf._leaf_key()
+    name = self.leaf_vars.get(key)
+    if name is None:
+      name = 'v%d' % len(self.leaf_values)
+      self.leaf_vars[key] = name
+      values = leaf._leaf_values()
+      if self.indices is not None:
+        values = [values[i] for i in self.indices]
+      self.leaf_values.append(values)
+      self.nullable.add(name)
+    return name
+
+  def assign(self, code, operands, nullable=True):
+    name = 't%d' % self._num_temps
+    self._num_temps += 1
+    checks = [op for op in operands if op in self.nullable]
+    if checks:
+      code = 'None if %s else %s' % (' or '.join('%s is None' % op
+                                                 for op in checks), code)
+      if nullable:
+        self.nullable.add(name)
+    self.lines.append('%s = %s' % (name, code))
+    return name
+
+
+def _evaluate_python(expr, indices=None):
+  # evaluates the expression for the rows at indices, all rows if None
+  ctx = _SourceContext(indices)
+  result = expr._emit(ctx)
+  num_leaves = len(ctx.leaf_values)
+  columns = ', '.join('c%d' % i for i in range(num_leaves))
+  loop_vars = ', '.join('v%d' % i for i in range(num_leaves))
+  if num_leaves == 1:
+    loop = '  for v0 in c0:'
+  else:
+    loop = '  for %s in _izip(%s):' % (loop_vars, columns)
+  source = '\n'.join(['def _fused(%s):' % columns,
+                      '  result = []',
+                      '  append = result.append',
+                      loop] +
+                     ['    %s' % line for line in ctx.lines] +
+                     ['    append(%s)' % result,
+                      '  return result'])
+  ctx.namespace['_izip'] = itertools.izip
+  # compiled without inheriting the future statements of this module, so
+  # that / is the classic division, as for the values themselves
+  code = compile(source, '<column expression>', 'exec', 0, True)
+  exec code in ctx.namespace
+  return ctx.namespace['_fused'](*ctx.leaf_values)
+
+
+class _NumpyContext(object):
+  def __init__(self, np, leaves):
+    self.np = np
+    self.arrays = {}
+    self.num_rows = None
+    for key, leaf in leaves.iteritems():
+      arrays = leaf._leaf_arrays(np)
+      if arrays is None:
+        raise _NotVectorizable()
+      values, valid = arrays
+      if self.num_rows is None:
+        self.num_rows = len(values)
+      elif self.num_rows != len(values):
+        # lengths differ, leave truncating to the loop
+        raise _NotVectorizable()
+      if valid is not None:
+        # None values are stored as 0, avoid spurious errors for them, e.g.
+        # when dividing
+        values = values.copy()
+        values[~valid] = 1
+      bound = None
+      if values.dtype.kind == 'i':
+        bound = 1
+        if len(values):
+          bound = int(np.absolute(values).max())
+      self.arrays[key] = (values, valid, bound)
+
+  def leaf(self, leaf):
+    return self.arrays[leaf._leaf_key()]
+
+
+def _numpy_arrays(np, expr, leaves):
+  # values and validity mask of the expression as ndarrays
+  ctx = _NumpyContext(np, leaves)
+  with np.errstate(all='raise'):
+    values, valid, bound = expr._numpy(ctx)
+  if not isinstance(values, np.ndarray):
+    values = np.repeat(values, ctx.num_rows)
+  return values, valid
+
+
+def _evaluate_numpy(np, expr, leaves):
+  values, valid = _numpy_arrays(np, expr, leaves)
+  values = values.tolist()
+  if valid is None:
+    return values
+  return [v if ok else None for v, ok in itertools.izip(values, valid)]
+
+
+def _true_mask_numpy(np, expr, leaves):
+  values, valid = _numpy_arrays(np, expr, leaves)
+  selected = values.astype(bool)
+  if valid is not None:
+    selected &= valid
+  return selected
+
+
+# errors raised by NumPy for operations which are evaluated in Python instead
+_NUMPY_ERRORS = (_NotVectorizable, FloatingPointError, ValueError,
+                 OverflowError, TypeError, ZeroDivisionError)
+
+
+def _vectorized(func, expr):
+  # calls func with NumPy and the leaves of the expression, returns None when
+  # the expression can not be evaluated with NumPy
+  leaves = {}
+  expr._leaves(leaves)
+  if not leaves:
+    raise ValueError('expression does not refer to any column')
+  np = accel.numpy_module()
+  if np is None:
+    return None
+  try:
+    return func(np, expr, leaves)
+  except _NUMPY_ERRORS:
+    return None
+
+
+def evaluate(expr):
+  '''
+  Evaluates the expression and returns the list of values, one for each row.
+  '''
+  values = _vectorized(_evaluate_numpy, expr)
+  if values is None:
+    values = _evaluate_python(expr)
+  return values
+
+
+def true_indices(*exprs):
+  '''
+  Evaluates the expressions and returns the indices of the rows for which
+  all of them are true, in ascending order.
+
+  The expressions which can be evaluated with NumPy are evaluated first. The
+  remaining ones are only evaluated for the rows matching the former.
+  '''
+  mask, remaining = None, []
+  for expr in exprs:
+    selected = _vectorized(_true_mask_numpy, expr)
+    if selected is None:
+      remaining.append(expr)
+    elif mask is None:
+      mask = selected
+    else:
+      mask &= selected
+  indices = None
+  if mask is not None:
+    indices = accel.numpy_module().flatnonzero(mask).tolist()
+  if remaining:
+    values = _evaluate_python(reduce(operator.and_, remaining), indices)
+    if indices is None:
+      indices = xrange(len(values))
+    indices = [i for i, ok in itertools.izip(indices, values) if ok]
+  return indices
@@ -1,3 +1,13 @@
+"""
+Extensions add methods defined in other modules to :class:`~tap.Tab`
+
+An :class:`Extension` binds functions which have already been imported. A
+:class:`LazyExtension` only names the functions and their module. It binds
+stubs which import the module when one of them is called for the first time,
+so that ``import tap`` does not import the dependencies of the extension,
+e.g. matplotlib.
+"""
+
 class Extension:
   def __init__(self, name, *funcs):
     self.name = name
@@ -6,3 +16,28 @@ class Extension:
     for func in self.funcs:
       setattr(cls, func.func_name, func)
 
+
+def _lazy_method(cls, module_name, func_name):
+  def stub(self, *args, **kwargs):
+    # replace the stub with the function, later calls go to it directly
+    module = __import__(module_name, fromlist=[func_name])
+    func = getattr(module, func_name)
+    setattr(cls, func_name, func)
+    return func(self, *args, **kwargs)
+  stub.__name__ = func_name
+  stub.__doc__ = 'See :func:`%s.%s`' % (module_name, func_name)
+  return stub
+
+
+class LazyExtension:
+  '''
+  Extension whose functions are imported from the module *module_name* on
+  first use
+  '''
+  def __init__(self, name, module_name, *func_names):
+    self.name = name
+    self.module_name = module_name
+    self.func_names = func_names
+  def apply(self, cls):
+    for func_name in self.func_names:
+      setattr(cls, func_name, _lazy_method(cls, self.module_name, func_name))
@@ -0,0 +1,83 @@
+"""
+Grouping engine for :meth:`tap.Tab.group_by`
+
+The functions in this module assign the rows of a table to groups, given the
+grouping key of each row. The result is the list of distinct keys together
+with the index of the group of each row. Computing the aggregates of the
+groups is left to the caller.
+
+Like for joins (see :mod:`tap.join`), two algorithms are available: the hash
+grouping looks up the key of each row in a dictionary. The sort grouping walks
+the keys in sorted order and starts a new group whenever the key changes,
+which does not need the dictionary and is cheaper when the rows are already
+sorted by the key. Both number the groups in the order of their first row.
+"""
+from join import is_sorted
+
+GROUP_METHODS = ('auto', 'hash', 'sort',)
+
+
+def _hash_groups(keys):
+  groups = {}
+  unique, group_ids = [], []
+  find = groups.get
+  add_id = group_ids.append
+  for key in keys:
+    group = find(key)
+    if group is None:
+      group = groups[key] = len(unique)
+      unique.append(key)
+    add_id(group)
+  return unique, group_ids
+
+
+def _sort_groups(keys):
+  order = None
+  if not is_sorted(keys):
+    order = sorted(xrange(len(keys)), key=keys.__getitem__)
+    keys = [keys[i] for i in order]
+  unique, group_ids, starts = [], [], []
+  add_id = group_ids.append
+  group = -1
+  for pos, key in enumerate(keys):
+    if group < 0 or key != unique[group]:
+      unique.append(key)
+      starts.append(pos)
+      group += 1
+    add_id(group)
+  if order is None:
+    return unique, group_ids
+
+  # renumber the groups in the order of their first row. The sort is stable,
+  # so the first row of each run is the first row of the group.
+  first_rows = [order[pos] for pos in starts]
+  ranked = sorted(xrange(len(unique)), key=first_rows.__getitem__)
+  renumbered = [0]*len(unique)
+  for new, old in enumerate(ranked):
+    renumbered[old] = new
+  row_ids = [0]*len(group_ids)
+  for i, group in zip(order, group_ids):
+    row_ids[i] = renumbered[group]
+  return [unique[old] for old in ranked], row_ids
+
+
+def group_rows(keys, method='auto'):
+  '''
+  Assigns each row to the group of the rows sharing its key. Keys are compared
+  for equality, None values included.
+
+  :param keys: grouping key for each row
+  :param method: *hash*, *sort* or *auto*. With *auto*, the sort grouping is
+                 used when the keys are sorted, the hash grouping otherwise.
+  :returns: tuple of the list of distinct keys, in the order of their first
+            row, and the list holding the index of the group of each row
+  '''
+  if method not in GROUP_METHODS:
+    raise ValueError('unknown grouping method "%s"' % method)
+  if method == 'auto':
+    method = 'hash'
+    if is_sorted(keys):
+      method = 'sort'
+  if method == 'hash':
+    return _hash_groups(keys)
+  return _sort_groups(keys)
@@ -0,0 +1,76 @@
+"""
+Hash indices on table columns
+"""
+import bisect
+
+
+class HashIndex(object):
+  '''
+  Maps the values of a column to the ascending list of indices of the rows
+  holding that value.
+
+  Values which are not equal to themselves (i.e. NaN) are not indexed, since
+  they never compare equal to any value.
+  '''
+  def __init__(self, values=()):
+    self._rows = {}
+    for row_index, value in enumerate(values):
+      self.add(value, row_index)
+
+  def add(self, value, row_index):
+    '''
+    Add *row_index* to the rows holding *value*. Appending rows in ascending
+    order is O(1).
+    '''
+    if value != value:
+      return
+    rows = self._rows.get(value)
+    if rows is None:
+      self._rows[value] = [row_index]
+    elif rows[-1] < row_index:
+      rows.append(row_index)
+    else:
+      bisect.insort(rows, row_index)
+
+  def remove(self, value, row_index):
+    '''
+    Remove *row_index* from the rows holding *value*
+    '''
+    if value != value:
+      return
+    rows = self._rows.get(value)
+    if rows is None:
+      return
+    pos = bisect.bisect_left(rows, row_index)
+    if pos < len(rows) and rows[pos] == row_index:
+      del rows[pos]
+    if not rows:
+      del self._rows[value]
+
+  def update(self, row_index, old_value, new_value):
+    '''
+    Update the index after the value of the row at *row_index* has been
+    changed from *old_value* to *new_value*
+    '''
+    if old_value is new_value:
+      return
+    self.remove(old_value, row_index)
+    self.add(new_value, row_index)
+
+  def lookup(self, value):
+    '''
+    Returns the ascending list of indices of the rows holding *value*.
+
+    :raises: :class:`TypeError` if value is not hashable
+    '''
+    return self._rows.get(value, [])
+
+  def first(self, value):
+    '''
+    Returns the index of the first row holding *value*, or None if no such
+    row exists.
+    '''
+    rows = self.lookup(value)
+    if rows:
+      return rows[0]
+    return None
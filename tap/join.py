@@ -0,0 +1,179 @@
+"""
+Join engine for :func:`tap.merge`
+
+The functions in this module compute which rows of two tables are combined,
+given the join keys of each row. The result is a pair of lists holding the
+row indices into the first and second table, respectively, None marking rows
+which are padded with None values. Building the joined table from these
+indices is left to the caller.
+
+Two algorithms are available: the hash join builds a dictionary from the keys
+of the second table and probes it with the keys of the first table. The sort-
+merge join walks both key lists in sorted order and does not need the
+dictionary, which is cheaper when both inputs are already sorted by the key.
+Both produce the same, stable output order:
+
+- inner and left joins: in the order of the first table. Rows matching
+  several rows of the second table are repeated, in the order of the second
+  table.
+- right joins: in the order of the second table, and for each row of the
+  second table in the order of the first table.
+- outer joins: like left joins, followed by the unmatched rows of the second
+  table in their original order.
+"""
+import itertools
+import operator
+
+JOIN_TYPES = ('inner', 'left', 'right', 'outer',)
+
+JOIN_METHODS = ('auto', 'hash', 'sort',)
+
+
+def is_sorted(keys):
+  '''
+  Returns true, if *keys* is sorted in ascending order
+  '''
+  return all(itertools.imap(operator.le, keys, itertools.islice(keys, 1, None)))
+
+
+def _hash_join(keys1, keys2, keep_unmatched, track_matched):
+  # maps each key to the index of its first row. The indices of further rows
+  # with the same key are collected in duplicates, which is usually empty.
+  first = {}
+  duplicates = {}
+  for j, key in enumerate(keys2):
+    if first.setdefault(key, j) != j:
+      bucket = duplicates.get(key)
+      if bucket is None:
+        duplicates[key] = [first[key], j]
+      else:
+        bucket.append(j)
+  left, right = [], []
+  matched = bytearray(len(keys2)) if track_matched else None
+  find = first.get
+  for i, key in enumerate(keys1):
+    j = find(key)
+    if j is None:
+      if keep_unmatched:
+        left.append(i)
+        right.append(None)
+      continue
+    bucket = duplicates.get(key) if duplicates else None
+    if bucket is None:
+      left.append(i)
+      right.append(j)
+      if track_matched:
+        matched[j] = 1
+      continue
+    left.extend(itertools.repeat(i, len(bucket)))
+    right.extend(bucket)
+    if track_matched:
+      for j in bucket:
+        matched[j] = 1
+  return left, right, matched
+
+
+def _sorted_order(keys):
+  # permutation sorting keys, None if they are sorted already. Since the sort
+  # is stable, rows with equal keys stay in their original order.
+  if is_sorted(keys):
+    return None
+  return sorted(xrange(len(keys)), key=keys.__getitem__)
+
+
+def _sort_merge_join(keys1, keys2, keep_unmatched, track_matched):
+  order1, order2 = _sorted_order(keys1), _sorted_order(keys2)
+  if order1 is not None:
+    keys1 = [keys1[i] for i in order1]
+  if order2 is not None:
+    keys2 = [keys2[j] for j in order2]
+  n1, n2 = len(keys1), len(keys2)
+  left, right = [], []
+  add_left, add_right = left.append, right.append
+  matched = bytearray(n2) if track_matched else None
+  i, j = 0, 0
+  while i < n1 and j < n2:
+    key1, key2 = keys1[i], keys2[j]
+    if key1 < key2:
+      if keep_unmatched:
+        add_left(i)
+        add_right(None)
+      i += 1
+    elif key2 < key1:
+      j += 1
+    else:
+      # groups of rows with equal keys
+      end1, end2 = i + 1, j + 1
+      while end1 < n1 and keys1[end1] == key1:
+        end1 += 1
+      while end2 < n2 and keys2[end2] == key2:
+        end2 += 1
+      if end1 - i == 1 and end2 - j == 1:
+        add_left(i)
+        add_right(j)
+      else:
+        group = range(j, end2)
+        for k in xrange(i, end1):
+          left.extend(itertools.repeat(k, end2 - j))
+          right.extend(group)
+      if track_matched:
+        matched[j:end2] = '\x01' * (end2 - j)
+      i, j = end1, end2
+  if keep_unmatched:
+    left.extend(xrange(i, n1))
+    right.extend(itertools.repeat(None, n1 - i))
+
+  # map the positions in the sorted keys back to row indices
+  if order2 is not None:
+    right = [order2[j] if j is not None else None for j in right]
+    if track_matched:
+      original = bytearray(n2)
+      for j, m in itertools.izip(order2, matched):
+        original[j] = m
+      matched = original
+  if order1 is not None:
+    left = [order1[i] for i in left]
+    # restore the order of the first table. The sort is stable, so the rows
+    # of the second table stay in their order for each row of the first.
+    order = sorted(xrange(len(left)), key=left.__getitem__)
+    left = [left[k] for k in order]
+    right = [right[k] for k in order]
+  return left, right, matched
+
+
+def join_indices(keys1, keys2, how='inner', method='auto'):
+  '''
+  Computes the rows of two tables which are combined when joining them on
+  the given keys. Keys are compared for equality, None values included.
+
+  :param keys1: join key for each row of the first table
+  :param keys2: join key for each row of the second table
+  :param how: one of *inner*, *left*, *right* or *outer*
+  :param method: *hash*, *sort* or *auto*. With *auto*, the sort-merge join is
+                 used when both key lists are sorted, the hash join otherwise.
+  :returns: tuple of two lists of equal length, containing the row indices
+            into the first and second table, or None.
+  '''
+  if how not in JOIN_TYPES:
+    raise ValueError('unknown join type "%s"' % how)
+  if method not in JOIN_METHODS:
+    raise ValueError('unknown join method "%s"' % method)
+  if how == 'right':
+    right, left = join_indices(keys2, keys1, 'left', method)
+    return left, right
+  if method == 'auto':
+    method = 'hash'
+    if is_sorted(keys1) and is_sorted(keys2):
+      method = 'sort'
+  if method == 'hash':
+    left, right, matched = _hash_join(keys1, keys2, how != 'inner',
+                                      how == 'outer')
+  else:
+    left, right, matched = _sort_merge_join(keys1, keys2, how != 'inner',
+                                            how == 'outer')
+  if how == 'outer':
+    for j, m in enumerate(matched):
+      if not m:
+        left.append(None)
+        right.append(j)
+  return left, right
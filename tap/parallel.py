@@ -0,0 +1,77 @@
+"""
+Process-based parallelism for column-wise computations
+
+Threads do not speed up computations on columns written in Python, so
+:class:`~tap.Tab` methods that work on many independent columns can spread
+them over a pool of worker processes instead. Large column buffers are placed
+in shared memory before the pool is started, so that the workers can read them
+without the rows of the table being pickled.
+
+:mod:`multiprocessing` is imported on first use, not when importing this
+module.
+"""
+import array
+import ctypes
+from column import Column
+
+
+def map_in_processes(func, tasks, processes, initializer=None, initargs=()):
+  '''
+  Maps *func* over *tasks* in a pool of at most *processes* worker processes
+  and returns the list of results. *func* must be a module-level function,
+  and *func* and the tasks must be picklable. *initializer* is called with
+  *initargs* in each worker before the first task.
+  '''
+  import multiprocessing
+  pool = multiprocessing.Pool(min(processes, len(tasks)), initializer,
+                              initargs)
+  try:
+    return pool.map(func, tasks)
+  finally:
+    pool.close()
+    pool.join()
+
+
+def _shared_copy(address, num_bytes):
+  from multiprocessing import sharedctypes
+  shared = sharedctypes.RawArray(ctypes.c_char, max(num_bytes, 1))
+  if num_bytes:
+    ctypes.memmove(shared, address, num_bytes)
+  return shared
+
+
+class SharedColumn(object):
+  '''
+  Copy of a typed :class:`~tap.column.Column` in shared memory.
+
+  A shared column must be created before the worker processes are started and
+  passed to them as argument of the pool initializer. The workers then turn it
+  back into a column with :meth:`to_column`.
+  '''
+  def __init__(self, column):
+    if not column.is_typed:
+      raise ValueError('only typed columns can be shared')
+    data = column.data
+    self.col_type = column.col_type
+    self.typecode = data.typecode
+    self.null_count = column.null_count
+    self.num_bytes = len(data)*data.itemsize
+    self.data = _shared_copy(data.buffer_info()[0], self.num_bytes)
+    self.valid = None
+    if column.null_count > 0:
+      valid = column.valid
+      self.valid = _shared_copy(
+          ctypes.addressof((ctypes.c_char*len(valid)).from_buffer(valid)),
+          len(valid))
+      self.valid_bytes = len(valid)
+
+  def to_column(self):
+    '''
+    Returns a :class:`~tap.column.Column` with the values of the shared column
+    '''
+    data = array.array(self.typecode)
+    data.fromstring(buffer(self.data, 0, self.num_bytes))
+    valid = None
+    if self.valid is not None:
+      valid = bytearray(buffer(self.valid, 0, self.valid_bytes))
+    return Column.from_buffers(self.col_type, data, valid, self.null_count)
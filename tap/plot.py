@@ -2,35 +2,119 @@
 Plotting related functionality
 """
 
+import math
 from extension import Extension
 import typeutil
-try:
-  import matplotlib.pyplot as plt
-  HAS_MATPLOTLIB = True
-except ImportError:
-  HAS_MATPLOTLIB = False
+import accel
+
+# methods supported by downsample
+DOWNSAMPLE_METHODS = ('lttb', 'minmax', 'random')
+
+# aggregates of the z values supported by density_grid
+DENSITY_AGGREGATES = ('count', 'sum', 'mean', 'min', 'max')
+
+# number of points binned at once by density_grid, bounding the memory used
+# for temporary arrays
+_DENSITY_CHUNK_SIZE = 1 << 20
 
 def make_title(col_name):
   return col_name.replace('_', ' ')
 
+def _buckets(np, values, size, fill):
+  # values padded with fill to a multiple of size, one bucket per row
+  num_buckets = int(math.ceil(len(values)/float(size)))
+  padded = np.empty(num_buckets*size)
+  padded[:len(values)] = values
+  padded[len(values):] = fill
+  return padded.reshape(num_buckets, size)
+
+def downsample(xs, ys, max_points, method='lttb'):
+  '''
+  Reduces the series of points (*xs*, *ys*) to at most *max_points* points,
+  which are returned as two arrays in their original order. Series with at 
+  most *max_points* points are returned unchanged.
+
+  The *lttb* and *minmax* methods split the series into buckets of 
+  consecutive points:
+
+  - lttb (largest triangle three buckets): keeps the first and the last point
+    and from each bucket the point forming the largest triangle with the 
+    averages of the neighbouring buckets. This keeps the shape of lines.
+  - minmax: keeps the points with the smallest and largest y value of each 
+    bucket, so that spikes are not lost.
+  - random: keeps a random subset of the points. Use it for scatter plots of
+    points which are not ordered by x.
+
+  :raises: :class:`ValueError` if *method* is unknown or *max_points* is 
+           less than 3
+  '''
+  import numpy as np
+  if method not in DOWNSAMPLE_METHODS:
+    raise ValueError('unknown downsampling method "%s"' % method)
+  if max_points < 3:
+    raise ValueError('max_points must be at least 3')
+  xs, ys = np.asarray(xs, dtype='float64'), np.asarray(ys, dtype='float64')
+  num = len(xs)
+  if num <= max_points:
+    return xs, ys
+  if method == 'random':
+    keep = np.sort(np.random.choice(num, max_points, replace=False))
+    return xs[keep], ys[keep]
+  if method == 'minmax':
+    size = int(math.ceil(num/float(max_points//2)))
+    offsets = np.arange(0, num, size)
+    lows = np.argmin(_buckets(np, ys, size, np.inf), axis=1)
+    highs = np.argmax(_buckets(np, ys, size, -np.inf), axis=1)
+    keep = np.unique(np.concatenate((offsets+lows, offsets+highs)))
+    return xs[keep], ys[keep]
+  # lttb, comparing against the average of the previous bucket instead of 
+  # the point chosen from it, so that all buckets are handled at once
+  size = int(math.ceil((num-2)/float(max_points-2)))
+  bucket_xs = _buckets(np, xs[1:-1], size, np.nan)
+  bucket_ys = _buckets(np, ys[1:-1], size, np.nan)
+  counts = np.sum(~np.isnan(bucket_xs), axis=1)
+  mean_xs = np.nansum(bucket_xs, axis=1)/counts
+  mean_ys = np.nansum(bucket_ys, axis=1)/counts
+  prev_xs = np.concatenate(([xs[0]], mean_xs[:-1]))[:, None]
+  prev_ys = np.concatenate(([ys[0]], mean_ys[:-1]))[:, None]
+  next_xs = np.concatenate((mean_xs[1:], [xs[-1]]))[:, None]
+  next_ys = np.concatenate((mean_ys[1:], [ys[-1]]))[:, None]
+  areas = np.abs((prev_xs-next_xs)*(bucket_ys-prev_ys)-
+                 (prev_xs-bucket_xs)*(next_ys-prev_ys))
+  areas[np.isnan(areas)] = -1.0
+  picked = np.argmax(areas, axis=1)+np.arange(0, num-2, size)+1
+  keep = np.concatenate(([0], picked, [num-1]))
+  return xs[keep], ys[keep]
+
+def _maybe_downsample(xs, ys, max_points, method):
+  if max_points is None:
+    return xs, ys
+  return downsample(xs, ys, max_points, method)
+
 def plot_enrichment(self, score_col, class_col, score_dir='-', 
                     class_dir='-', class_cutoff=2.0,
                     style='-', title=None, x_title=None, y_title=None,
-                    clear=True, save=None):
+                    clear=True, save=None, max_points=None, 
+                    downsample='lttb'):
   '''
   Plot an enrichment curve using matplotlib of column *score_col* classified
   according to *class_col*.
   
   For more information about parameters of the enrichment, see
-  :meth:`compute_enrichment`, and for plotting see :meth:`Plot`.
+  :meth:`compute_enrichment`, and for plotting see :meth:`Plot`. The curve 
+  has one point per distinct score, *max_points* and *downsample* limit the 
+  number of points which are drawn, see :meth:`plot`.
   
   :warning: The function depends on *matplotlib*
   '''
-  if not HAS_MATPLOTLIB:
+  try:
+    import matplotlib.pyplot as plt
+  except ImportError:
     raise ImportError('Matplotlib is required')
   
   enrx, enry = self.compute_enrichment(score_col, class_col, score_dir,
                                       class_dir, class_cutoff)
+  enrx, enry = _maybe_downsample(enrx, enry, max_points, downsample)
   
   if not title:
     title = 'Enrichment of %s'%score_col
@@ -133,11 +217,66 @@ class PlotData:
     return self._make_title(self.z, self._z_title)
 
 
+def grid_z(xs, ys, zs, grid_size=100, interp='linear'):
+  '''
+  Averages the values *zs* at the points (*xs*, *ys*) on a regular grid of
+  *grid_size* times *grid_size* points spanning the range of the points. Each
+  point contributes to the nearest grid point. Grid points without any
+  points are interpolated from the averages (see 
+  :func:`matplotlib.mlab.griddata` for *interp*), and masked if they are 
+  outside of the convex hull of the other grid points.
+
+  :returns: the x and y coordinates of the grid and a masked array of shape 
+            (*grid_size*, *grid_size*) holding the z values, indexed by y 
+            first as expected by :func:`matplotlib.pyplot.contour`
+  '''
+  import numpy as np
+  xs, ys, zs = [np.asarray(v, dtype='float64') for v in (xs, ys, zs)]
+  xi = np.linspace(xs.min(), xs.max(), grid_size)
+  yi = np.linspace(ys.min(), ys.max(), grid_size)
+  def _nearest(vs, grid):
+    width = grid[-1]-grid[0]
+    if width == 0:
+      return np.zeros(len(vs), dtype='intp')
+    return np.rint((vs-grid[0])*((grid_size-1)/width)).astype('intp')
+  cells = _nearest(ys, yi)*grid_size+_nearest(xs, xi)
+  counts = np.bincount(cells, minlength=grid_size*grid_size)
+  sums = np.bincount(cells, weights=zs, minlength=grid_size*grid_size)
+  filled = counts > 0
+  zi = np.ma.zeros(grid_size*grid_size)
+  zi[filled] = sums[filled]/counts[filled]
+  zi[~filled] = np.ma.masked
+  zi = zi.reshape(grid_size, grid_size)
+  empty = ~filled.reshape(grid_size, grid_size)
+  if empty.any() and filled.sum() >= 3:
+    import matplotlib.mlab as mlab
+    grid_x, grid_y = np.meshgrid(xi, yi)
+    interpolated = mlab.griddata(grid_x[~empty], grid_y[~empty],
+                                 zi[~empty].data, xi, yi, interp=interp)
+    zi[empty] = interpolated[empty]
+  return xi, yi, zi
+
+def _non_null_arrays(tab, cols):
+  # float arrays of the values of cols in the rows where none of them is None
+  num_cols = [accel.numeric_column(tab, col) for col in cols]
+  if None in num_cols:
+    np = accel.numpy_module()
+    return [np.array(vals, dtype='float64')
+            for vals in zip(*tab.zip_non_null(*cols))]
+  valid = None
+  for num_col in num_cols:
+    if num_col.valid is not None:
+      valid = num_col.valid if valid is None else valid & num_col.valid
+  if valid is None:
+    return [num_col.values.astype('float64') for num_col in num_cols]
+  return [num_col.values[valid].astype('float64') for num_col in num_cols]
+
 def plot(self, x, y=None, z=None, style='.', x_title=None, y_title=None,
          z_title=None, x_range=None, y_range=None, z_range=None,
          color=None, legend=None, num_z_levels=10, z_contour=True, 
-         z_interpol='nn', diag_line=False, labels=None, max_num_labels=None, 
-         title=None, clear=True, save=False, **kwargs):
+         z_interpol='nn', z_grid_size=100, diag_line=False, labels=None, 
+         max_num_labels=None, title=None, clear=True, save=False, 
+         max_points=None, downsample='lttb', **kwargs):
   """
   Function to plot values from your table in 1, 2 or 3 dimensions using
   `Matplotlib <http://matplotlib.sourceforge.net>`__
@@ -206,13 +345,27 @@ def plot(self, x, y=None, z=None, style='.', x_title=None, y_title=None,
   :param save: filename for saving plot
   :type save: :class:`str`
 
+  :param max_points: maximal number of points drawn for one or two 
+                     dimensional plots. Larger series are reduced with the 
+                     method *downsample* (one of 'lttb', 'minmax', 'random', 
+                     see :func:`~tap.plot.downsample`) before plotting, which
+                     keeps rendering fast and saved vector graphics small.
+                     All points are drawn if None.
+  :type max_points: :class:`int`
+
   :param z_contour: draw contour lines
   :type z_contour: :class:`bool`
 
-  :param z_interpol: interpolation method for 3-dimensional plot (one of 'nn',
-                      'linear')
+  :param z_interpol: interpolation method for the grid points of a 
+                     3-dimensional plot without any data point (one of 'nn',
+                     'linear')
   :type z_interpol: :class:`str`
 
+  :param z_grid_size: number of grid points along x and y for a 3-dimensional 
+                      plot. The z values are averaged over the data points 
+                      closest to each grid point, see :func:`grid_z`.
+  :type z_grid_size: :class:`int`
+
   :param \*\*kwargs: additional arguments passed to matplotlib
   
   :returns: the ``matplotlib.pyplot`` module 
@@ -241,7 +394,6 @@ def plot(self, x, y=None, z=None, style='.', x_title=None, y_title=None,
   """
   try:
     import matplotlib.pyplot as plt
-    import matplotlib.mlab as mlab
     import numpy as np
     idx1 = self.col_index(x)
     xs = []
@@ -260,23 +412,21 @@ def plot(self, x, y=None, z=None, style='.', x_title=None, y_title=None,
     if legend:
       kwargs['label']=legend
     if y and z:
-      xs, ys, zs = zip(*self.zip_non_null(x, y, z))
+      xs, ys, zs = _non_null_arrays(self, [x, y, z])
 
       levels = []
       if z_range:
-        z_spacing = (z_range[1] - z_range[0]) / num_z_levels
+        z_spacing = (z_range[1] - z_range[0]) / float(num_z_levels)
         l = z_range[0]
       else:
-        l = self.min(z)
-        z_spacing = (self.max(z) - l) / num_z_levels
+        l = zs.min()
+        z_spacing = (zs.max() - l) / num_z_levels
       
       for i in range(0,num_z_levels+1):
         levels.append(l)
         l += z_spacing
 
-      xi = np.linspace(min(xs),max(xs),len(xs)*10)
-      yi = np.linspace(min(ys),max(ys),len(ys)*10)
-      zi = mlab.griddata(xs, ys, zs, xi, yi, interp=z_interpol)
+      xi, yi, zi = grid_z(xs, ys, zs, z_grid_size, z_interpol)
 
       if z_contour:
         plt.contour(xi,yi,zi,levels,linewidths=0.5,colors='k')
@@ -285,7 +435,11 @@ def plot(self, x, y=None, z=None, style='.', x_title=None, y_title=None,
       plt.colorbar(ticks=levels)
           
     elif y:
-      xs, ys = zip(*self.zip_non_null(x, y))
+      if max_points is None:
+        xs, ys = zip(*self.zip_non_null(x, y))
+      else:
+        xs, ys = _non_null_arrays(self, [x, y])
+        xs, ys = _maybe_downsample(xs, ys, max_points, downsample)
       plt.plot(xs, ys, style, **kwargs)
     else:
       label_vals=[]
@@ -297,7 +451,12 @@ def plot(self, x, y=None, z=None, style='.', x_title=None, y_title=None,
           xs.append(row[idx1])
           if labels:
             label_vals.append(row[label_idx])
-      plt.plot(xs, style, **kwargs)
+      if max_points is None:
+        plt.plot(xs, style, **kwargs)
+      else:
+        indices, values = _maybe_downsample(np.arange(len(xs)), xs, 
+                                            max_points, downsample)
+        plt.plot(indices, values, style, **kwargs)
       if labels:
         interval = 1
         if max_num_labels:
@@ -361,7 +520,7 @@ def plot_histogram(self, col, x_range=None, num_bins=10, normed=False,
   :param y_range: start and end value for second dimension (e.g. [start_y, end_y])
   :type y_range: :class:`list` of length two
 
-  :param num_bins: number of bins in range
+  :param num_bins: number of bins in range, or list of bin edges
   :type num_bins: :class:`int`
 
   :param color: Color to be used for the histogram. If not set, color will be 
@@ -417,18 +576,19 @@ def plot_histogram(self, col, x_range=None, num_bins=10, normed=False,
     kwargs={}
     if color:
       kwargs['color']=color
-    idx = self.col_index(col)
-    data = []
-    for r in self.rows:
-      if r[idx]!=None:
-        data.append(r[idx])
+    # the values are counted by Tab.histogram, matplotlib only draws the 
+    # bins, weighted by their counts
+    if typeutil.is_scalar(num_bins):
+      hist = self.histogram(col, num_bins, bounds=x_range)
+    else:
+      hist = self.histogram(col, edges=num_bins)
       
     if clear:
       plt.clf()
       
-    n, bins, patches = plt.hist(data, bins=num_bins, range=x_range,
-                                normed=normed, histtype=histtype, align=align,
-                                **kwargs)
+    n, bins, patches = plt.hist(hist.edges[:-1], bins=hist.edges, 
+                                weights=hist.counts, normed=normed, 
+                                histtype=histtype, align=align, **kwargs)
     
     if x_title!=None:
       nice_x=x_title
@@ -594,7 +754,8 @@ def plot_hexbin(self, x, y, title=None, x_title=None, y_title=None, x_range=None
                 colormap='jet', show_scalebar=False, scalebar_label=None, clear=True, save=False, show=False):
 
   """
-  Create a heatplot of the data in col x vs the data in col y using matplotlib
+  Create a heatplot of the data in col x vs the data in col y using matplotlib.
+  For tables with millions of rows, :meth:`plot_density` is faster.
 
   :param x: column name with x data
   :type x: :class:`str`
@@ -653,15 +814,7 @@ def plot_hexbin(self, x, y, title=None, x_title=None, y_title=None, x_range=None
   except:
     raise ImportError('plot_hexbin relies on matplotlib, but I could not import it')
 
-  idx=self.col_index(x)
-  idy=self.col_index(y)
-  xdata=[]
-  ydata=[]
-
-  for r in self.rows:
-    if r[idx]!=None and r[idy]!=None:
-      xdata.append(r[idx])
-      ydata.append(r[idy])
+  xdata, ydata = _non_null_arrays(self, [x, y])
 
   if clear:
     plt.clf()
@@ -714,15 +867,200 @@ def plot_hexbin(self, x, y, title=None, x_title=None, y_title=None, x_range=None
 
   return plt
 
+def _bin_range(values, given):
+  if given:
+    low, high = float(given[0]), float(given[1])
+  elif len(values):
+    low, high = float(values.min()), float(values.max())
+  else:
+    low, high = 0.0, 1.0
+  if low == high:
+    low, high = low-0.5, high+0.5
+  return low, high
+
+def density_grid(xs, ys, zs=None, num_bins=200, x_range=None, y_range=None,
+                 aggregate='mean'):
+  '''
+  Bins the points (*xs*, *ys*) on a regular 2D grid. Without *zs*, the value
+  of a bin is the number of points falling into it, otherwise the aggregate 
+  (one of 'count', 'sum', 'mean', 'min', 'max') of the z values of these 
+  points. The points are binned in chunks, so that the temporary arrays stay
+  small.
+
+  :param num_bins: number of bins along x and y, or a pair with the number 
+                   of bins along x and along y
+  :param x_range: start and end of the grid along x. By default, the grid 
+                  spans all points. Points outside of the grid are ignored.
+  :param y_range: start and end of the grid along y
+
+  :returns: the grid as masked array of shape (number of y bins, number of x
+            bins), in which the bins without points are masked, and the 
+            extent of the grid as [x_start, x_end, y_start, y_end]
+  :raises: :class:`ValueError` if *aggregate* is unknown
+  '''
+  import numpy as np
+  if aggregate not in DENSITY_AGGREGATES:
+    raise ValueError('unknown aggregate "%s"' % aggregate)
+  if typeutil.is_scalar(num_bins):
+    num_bins = (num_bins, num_bins)
+  num_x, num_y = num_bins
+  xs, ys = np.asarray(xs, dtype='float64'), np.asarray(ys, dtype='float64')
+  if zs is None:
+    aggregate = 'count'
+  else:
+    zs = np.asarray(zs, dtype='float64')
+  x_start, x_end = _bin_range(xs, x_range)
+  y_start, y_end = _bin_range(ys, y_range)
+  size = num_x*num_y
+  counts = np.zeros(size, dtype='int64')
+  if aggregate in ('sum', 'mean'):
+    accum = np.zeros(size)
+  elif aggregate == 'min':
+    accum = np.empty(size)
+    accum.fill(np.inf)
+  elif aggregate == 'max':
+    accum = np.empty(size)
+    accum.fill(-np.inf)
+  for start in xrange(0, len(xs), _DENSITY_CHUNK_SIZE):
+    end = start+_DENSITY_CHUNK_SIZE
+    chunk_xs, chunk_ys = xs[start:end], ys[start:end]
+    cols = np.floor((chunk_xs-x_start)*(num_x/(x_end-x_start))).astype('intp')
+    rows = np.floor((chunk_ys-y_start)*(num_y/(y_end-y_start))).astype('intp')
+    # points on the upper end of the grid belong to the last bin
+    cols[chunk_xs == x_end] = num_x-1
+    rows[chunk_ys == y_end] = num_y-1
+    inside = (cols >= 0) & (cols < num_x) & (rows >= 0) & (rows < num_y)
+    cells = (rows*num_x+cols)[inside]
+    counts += np.bincount(cells, minlength=size)
+    if aggregate == 'count':
+      continue
+    chunk_zs = zs[start:end][inside]
+    if aggregate in ('sum', 'mean'):
+      accum += np.bincount(cells, weights=chunk_zs, minlength=size)
+    elif aggregate == 'min':
+      np.minimum.at(accum, cells, chunk_zs)
+    else:
+      np.maximum.at(accum, cells, chunk_zs)
+  filled = counts > 0
+  if aggregate == 'count':
+    values = counts
+  elif aggregate == 'mean':
+    values = accum/np.maximum(counts, 1)
+  else:
+    values = accum
+  grid = np.ma.masked_array(values, mask=~filled).reshape(num_y, num_x)
+  return grid, [x_start, x_end, y_start, y_end]
+
+def _scale_density(np, grid, binning):
+  # the bin values transformed as the hexagon values by plt.hexbin
+  if binning is None:
+    return grid
+  if binning == 'log':
+    return np.ma.log10(grid+1)
+  values = grid.compressed()
+  if len(values) == 0:
+    return grid
+  if typeutil.is_scalar(binning):
+    num = binning-1
+    low, high = values.min(), values.max()
+    bounds = low+(high-low)*np.arange(num)/float(num)
+  else:
+    bounds = np.sort(np.asarray(binning, dtype='float64'))
+  return np.ma.masked_array(bounds.searchsorted(grid.filled(0)),
+                            mask=np.ma.getmaskarray(grid))
+
+def plot_density(self, x, y, z=None, aggregate='mean', num_bins=200, 
+                 title=None, x_title=None, y_title=None, x_range=None, 
+                 y_range=None, binning='log', colormap='jet', 
+                 show_scalebar=False, scalebar_label=None, clear=True, 
+                 save=False, show=False):
+  """
+  Create a density plot of the data in col x vs the data in col y using 
+  matplotlib. Unlike :meth:`plot_hexbin`, the points are counted on a 
+  rectangular grid with numpy (see :func:`~tap.plot.density_grid`) and the 
+  grid is drawn as a single image, so that plotting tables with tens of 
+  millions of rows takes one pass over the columns.
+
+  :param z: column name with z data. If given, the color of a bin shows the
+            aggregate of the z values of its points instead of their number.
+  :type z: :class:`str`
+
+  :param aggregate: aggregate of the z values, one of 'count', 'sum', 
+                    'mean', 'min' and 'max'
+  :type aggregate: :class:`str`
+
+  :param num_bins: number of bins along x and y, or a pair with the number of
+                   bins along x and along y
+
+  :param binning: transformation of the bin values, see :meth:`plot_hexbin`
+
+  The other parameters are the same as for :meth:`plot_hexbin`. Bins without
+  any points are not drawn.
+  """
+  try:
+    import matplotlib.pyplot as plt
+    import matplotlib.cm as cm
+    import numpy as np
+  except ImportError:
+    raise ImportError('plot_density relies on numpy and matplotlib, but I '
+                      'could not import it')
+
+  for r, n in ((x_range, 'x_range'), (y_range, 'y_range')):
+    if r and (typeutil.is_scalar(r) or len(r)!=2):
+      raise ValueError('parameter %s must contain exactly two elements' % n)
+  if z is None:
+    xdata, ydata = _non_null_arrays(self, [x, y])
+    zdata = None
+  else:
+    xdata, ydata, zdata = _non_null_arrays(self, [x, y, z])
+  grid, extent = density_grid(xdata, ydata, zdata, num_bins, x_range, 
+                              y_range, aggregate)
+
+  if clear:
+    plt.clf()
+
+  nice_x = x_title if x_title!=None else make_title(x)
+  nice_y = y_title if y_title!=None else make_title(y)
+  if title==None:
+    title = '%s vs. %s' % (nice_x, nice_y)
+
+  if typeutil.is_string_like(colormap):
+    colormap=getattr(cm, colormap)
+
+  plt.imshow(_scale_density(np, grid, binning), origin='lower', 
+             extent=extent, aspect='auto', interpolation='nearest', 
+             cmap=colormap)
+
+  plt.title(title, size='x-large', fontweight='bold',
+            verticalalignment='bottom')
+
+  plt.xlabel(nice_x)
+  plt.ylabel(nice_y)
+
+  if show_scalebar:
+    cb=plt.colorbar()
+    if scalebar_label:
+      cb.set_label(scalebar_label)
+
+  if save:
+    plt.savefig(save)
+
+  if show:
+    plt.show()
+
+  return plt
+
 def plot_roc(self, score_col, class_col, score_dir='-',
             class_dir='-', class_cutoff=2.0,
             style='-', title=None, x_title=None, y_title=None,
-            clear=True, save=None):
+            clear=True, save=None, max_points=None, downsample='lttb'):
   '''
   Plot an ROC curve using matplotlib.
   
   For more information about parameters of the ROC, see
-  :meth:`compute_roc`, and for plotting see :meth:`Plot`.
+  :meth:`compute_roc`, and for plotting see :meth:`Plot`. The curve has one 
+  point per distinct score, *max_points* and *downsample* limit the number of
+  points which are drawn, see :meth:`plot`.
 
   :warning: The function depends on *matplotlib*
   '''
@@ -736,7 +1074,7 @@ def plot_roc(self, score_col, class_col, score_dir='-',
     if not roc:
       return None
 
-    enrx, enry = roc
+    enrx, enry = _maybe_downsample(roc[0], roc[1], max_points, downsample)
 
     if not title:
       title = 'ROC of %s'%score_col
@@ -766,4 +1104,4 @@ def plot_roc(self, score_col, class_col, score_dir='-',
     
 EXT = Extension('plotting', plot_enrichment,
                 plot, plot_histogram, plot_bar, plot_hexbin,
-                plot_roc)
+                plot_density, plot_roc)
@@ -1,73 +1,397 @@
 """
 Contains tabular data importers
 """
-import csv, re, cPickle, os
-import base, typeutil
+import csv, re, cPickle, os, itertools, time, array
+import base, binary, typeutil
+from column import Column, ColumnarRows, LazyColumns
 
-def _load_ost(stream_or_filename):
-  fieldname_pattern=re.compile(r'(?P<name>[^[]+)(\[(?P<type>\w+)\])?')
-  values_pattern=re.compile("([^\" ]+|\"[^\"]*\")+")
-  if not hasattr(stream_or_filename, 'read'):
-    stream=open(stream_or_filename, 'r')
-  else:
-    stream=stream_or_filename
-  header=False
-  num_lines=0
+_OST_FIELDNAME_PATTERN=re.compile(r'(?P<name>[^[]+)(\[(?P<type>\w+)\])?')
+_OST_VALUES_PATTERN=re.compile("([^\" ]+|\"[^\"]*\")+")
+
+def _ost_lines(stream):
   for line in stream:
     line=line.strip()
     if line.startswith('#'):
       continue
     if len(line)==0:
       continue
-    num_lines+=1
-    if not header:
-      fieldnames=[]
-      fieldtypes=[]
-      for col in line.split():
-        match=fieldname_pattern.match(col)
-        if match:
-          if match.group('type'):
-            fieldtypes.append(match.group('type'))
-          else:
-            fieldtypes.append('string')
-          fieldnames.append(match.group('name'))
-      tab=base.Tab(fieldnames, fieldtypes)
-      header=True
-      continue
-    tab.add_row([x.strip('"') for x in values_pattern.findall(line)])
-  if num_lines==0:
+    yield line
+
+def _parse_ost_header(line):
+  fieldnames=[]
+  fieldtypes=[]
+  for col in line.split():
+    match=_OST_FIELDNAME_PATTERN.match(col)
+    if match:
+      if match.group('type'):
+        fieldtypes.append(match.group('type'))
+      else:
+        fieldtypes.append('string')
+      fieldnames.append(match.group('name'))
+  return fieldnames, fieldtypes
+
+def _parse_ost_row(line):
+  return [x.strip('"') for x in _OST_VALUES_PATTERN.findall(line)]
+
+def _load_ost(stream_or_filename):
+  if not hasattr(stream_or_filename, 'read'):
+    stream=open(stream_or_filename, 'r')
+  else:
+    stream=stream_or_filename
+  lines=_ost_lines(stream)
+  try:
+    header=lines.next()
+  except StopIteration:
     raise IOError("Cannot read table from empty stream")
+  tab=base.Tab(*_parse_ost_header(header))
+  for line in lines:
+    tab.add_row(_parse_ost_row(line))
   return tab
 
-def _coerce_col_types(table):
-  for col_idx in range(len(table.col_names)):
-    table.col_types[col_idx]=typeutil.guess_array_type(table[table.col_names[col_idx]])
-  for row in table.rows:
-    for idx in range(len(row)):
-      row[idx]=typeutil.coerce(row[idx], table.col_types[idx])
-      
+# start of the lines which are neither empty nor comments
+_OST_DATA_LINE_PATTERN=re.compile(r'^[^\S\n]*[^#\s]', re.M)
+
+def _ost_line(data, start):
+  end=data.find('\n', start)
+  if end<0:
+    end=len(data)
+  return data[start:end].strip()
+
+class _OstColumnDecoder(object):
+  '''
+  Decodes the columns of a lazily loaded ost file.
+
+  The values of a line can only be split all at once, so decoding one column
+  costs as much parsing as decoding all of them. When the first column is 
+  requested, all lines are parsed once and all columns which have not been 
+  requested yet are decoded. They are handed out on their first request, 
+  after which the decoder no longer refers to them.
+  '''
+  def __init__(self, data, line_starts, col_types):
+    self.data=data
+    self.line_starts=line_starts
+    self.col_types=col_types
+    self._pending=set(range(len(col_types)))
+    self._decoded={}
+
+  def _decode_pending(self):
+    num_cols=len(self.col_types)
+    pending=[(idx, self.col_types[idx], []) for idx in sorted(self._pending)]
+    for start in self.line_starts:
+      row=_parse_ost_row(_ost_line(self.data, start))
+      if len(row)!=num_cols:
+        msg='data array must have %d elements, not %d'
+        raise ValueError(msg % (num_cols, len(row)))
+      for idx, col_type, values in pending:
+        values.append(typeutil.coerce(row[idx], col_type))
+    for idx, col_type, values in pending:
+      self._decoded[idx]=Column(col_type, values)
+    self._pending.clear()
+    # all columns are decoded, release the file content
+    self.data=None
+    self.line_starts=None
+
+  def column(self, col_idx):
+    '''
+    Returns the decoded column at *col_idx*. Each column can only be 
+    requested once.
+    '''
+    if col_idx in self._pending:
+      self._decode_pending()
+    return self._decoded.pop(col_idx)
+
+def _ost_column_loader(decoder, col_idx):
+  def _load():
+    return decoder.column(col_idx)
+  return _load
+
+def _load_ost_lazy(stream_or_filename):
+  data=binary.map_file(stream_or_filename)
+  # row-offset index: the start of each data line
+  line_starts=array.array('l')
+  for match in _OST_DATA_LINE_PATTERN.finditer(data):
+    line_starts.append(match.start())
+  if len(line_starts)==0:
+    raise IOError("Cannot read table from empty stream")
+  tab=base.Tab(*_parse_ost_header(_ost_line(data, line_starts[0])))
+  del line_starts[0]
+  decoder=_OstColumnDecoder(data, line_starts, tab.col_types)
+  loaders=[_ost_column_loader(decoder, idx) 
+           for idx in range(len(tab.col_types))]
+  tab.rows=ColumnarRows(LazyColumns(loaders), len(line_starts))
+  return tab
+
+# values which are treated as missing when guessing the column types of csv
+# files, see typeutil.is_null_string
+_NULL_STRINGS=frozenset(['', 'NULL', 'NONE', 'NA'])
+
+def _is_null(value):
+  # fast path: the null strings are short and only padded by whitespace
+  if len(value)>4 and not value[0].isspace() and not value[-1].isspace():
+    return False
+  return value.strip().upper() in _NULL_STRINGS
+
+def _csv_to_null(value):
+  if _is_null(value):
+    return None
+  raise ValueError('not a null value: %s' % value)
+
+def _csv_to_int(value):
+  if _is_null(value):
+    return None
+  return int(value)
+
+def _csv_to_float(value):
+  if _is_null(value):
+    return None
+  return float(value)
+
+def _csv_to_bool(value):
+  if _is_null(value):
+    return None
+  upper=value.upper()
+  if upper in ('TRUE', 'YES'):
+    return True
+  if upper in ('FALSE', 'NO'):
+    return False
+  raise ValueError('invalid literal for bool: %s' % value)
+
+def _csv_to_string(value):
+  if value=='NA':
+    return None
+  return value
+
+# converters from csv values to column values. The None type is used for 
+# columns which only contained null values so far.
+_CSV_CONVERTERS={
+  None : _csv_to_null,
+  'int' : _csv_to_int,
+  'float' : _csv_to_float,
+  'bool' : _csv_to_bool,
+  'string' : _csv_to_string,
+}
+
+# types a column may be widened to, in order of preference
+_CSV_TRANSITIONS={
+  None : ('int', 'float', 'bool', 'string'),
+  'int' : ('float', 'string'),
+  'float' : ('string',),
+  'bool' : ('string',),
+}
+
+
+class _CsvColumn(object):
+  '''
+  Infers the type of a csv column while converting its values.
+
+  The column starts out without a type and moves to the narrowest type able to
+  hold all values seen so far, following the same rules as
+  :func:`typeutil.guess_array_type`. When the type changes, the values 
+  converted so far are converted again from the original strings, except 
+  for ints widened to floats, which are converted from the int values. Since 
+  the type can change at most three times, each value is converted only once 
+  in the common case.
+
+  The original strings are kept until the column is finished or widened to 
+  string, since any typed column may still turn out to hold strings, which 
+  must keep their original text, e.g. leading zeros.
+  '''
+  def __init__(self):
+    self.col_type=None
+    self.values=[]
+    # the original strings, only kept as long as the type may still change
+    self._raw=[]
+
+  def extend(self, raw_values):
+    if self.col_type=='string':
+      self.values.extend([_csv_to_string(v) for v in raw_values])
+      return
+    self._raw.extend(raw_values)
+    convert=_CSV_CONVERTERS[self.col_type]
+    try:
+      self.values.extend([convert(v) for v in raw_values])
+      return
+    except ValueError:
+      pass
+    for value in raw_values:
+      try:
+        self.values.append(convert(value))
+      except ValueError:
+        self._widen(value)
+        convert=_CSV_CONVERTERS[self.col_type]
+        self.values.append(convert(value))
+
+  def _widen(self, value):
+    old_type=self.col_type
+    for col_type in _CSV_TRANSITIONS[old_type]:
+      try:
+        _CSV_CONVERTERS[col_type](value)
+      except ValueError:
+        continue
+      break
+    self.col_type=col_type
+    if old_type=='int' and col_type=='float':
+      self.values=[None if v is None else float(v) for v in self.values]
+      return
+    convert=_CSV_CONVERTERS[col_type]
+    self.values=[convert(v) for v in self._raw[:len(self.values)]]
+    if col_type=='string':
+      self._raw=None
+
+  def finish(self):
+    '''
+    Returns the column type and the converted values
+    '''
+    if self.col_type is None:
+      # only null values, these are stored as strings
+      self.col_type='string'
+      self.values=[_csv_to_string(v) for v in self._raw]
+    self._raw=None
+    return self.col_type, self.values
 
-def _load_csv(stream_or_filename, sep):
+
+def _check_csv_row(header, row):
+  if len(row)!=len(header):
+    msg='data array must have %d elements, not %d'
+    raise ValueError(msg % (len(header), len(row)))
+  return row
+
+# number of rows which are read before converting them column-wise
+_CSV_BATCH_ROWS=10000
+
+def _load_csv(stream_or_filename, sep, timings=None):
   if not hasattr(stream_or_filename, 'read'):
     stream=open(stream_or_filename, 'r')
   else:
     stream=stream_or_filename
+  phases={'read' : 0.0, 'convert' : 0.0, 'build' : 0.0}
   reader=csv.reader(stream, delimiter=sep)
-  first=True
-  for row in reader:
-    if first:
-      header=row
-      types='s'*len(row)
-      tab=base.Tab(header, types)
-      first=False
-    else:
-      tab.add_row(row)
-  if first:
+  try:
+    header=reader.next()
+  except StopIteration:
     raise IOError('trying to load table from empty CSV stream/file')
+  rows=(_check_csv_row(header, row) for row in reader)
+  columns=[_CsvColumn() for name in header]
+  while True:
+    start=time.time()
+    batch=list(itertools.islice(rows, _CSV_BATCH_ROWS))
+    raw_columns=zip(*batch)
+    del batch
+    phases['read']+=time.time()-start
+    if not raw_columns:
+      break
+    start=time.time()
+    for column, raw_values in zip(columns, raw_columns):
+      column.extend(raw_values)
+    phases['convert']+=time.time()-start
 
-  _coerce_col_types(tab)
+  start=time.time()
+  col_types=[]
+  values=[]
+  for column in columns:
+    col_type, col_values=column.finish()
+    col_types.append(col_type)
+    values.append(col_values)
+  tab=base.Tab(header, col_types)
+  tab.rows=[list(row) for row in zip(*values)]
+  phases['build']+=time.time()-start
+  if timings is not None:
+    timings.update(phases)
   return tab
 
+# strategies for values which do not match the column type guessed from the
+# sample prefix when loading a csv file in chunks
+WIDEN_STRATEGIES=('promote', 'null', 'error',)
+
+# next wider column type, used by the promote strategy
+_WIDER_TYPES={'int' : 'float', 'float' : 'string', 'bool' : 'string'}
+
+def _convert_csv_column(col_name, col_type, values, widen):
+  # returns the (possibly widened) column type and the converted values
+  while True:
+    convert=_CSV_CONVERTERS[col_type]
+    converted=[]
+    try:
+      for value in values:
+        converted.append(convert(value))
+      return col_type, converted
+    except ValueError:
+      if widen=='error':
+        raise ValueError('value "%s" in column "%s" is not of type %s' % \
+                         (value, col_name, col_type))
+      if widen=='null':
+        for value in values[len(converted):]:
+          try:
+            converted.append(convert(value))
+          except ValueError:
+            converted.append(None)
+        return col_type, converted
+      col_type=_WIDER_TYPES[col_type]
+
+def _csv_chunk(header, col_types, raw_rows, widen):
+  columns=[]
+  for idx, col_name in enumerate(header):
+    col_type, values=_convert_csv_column(col_name, col_types[idx],
+                                         [row[idx] for row in raw_rows], widen)
+    # later chunks start off with the widened type
+    col_types[idx]=col_type
+    columns.append(values)
+  tab=base.Tab(list(header), list(col_types))
+  tab.rows=[list(row) for row in zip(*columns)]
+  return tab
+
+def _iter_csv_chunks(stream, sep, chunk_rows, sample_rows, widen):
+  reader=csv.reader(stream, delimiter=sep)
+  try:
+    header=reader.next()
+  except StopIteration:
+    raise IOError('trying to load table from empty CSV stream/file')
+  rows=(_check_csv_row(header, row) for row in reader)
+  sample=list(itertools.islice(rows, sample_rows))
+  col_types=[]
+  for idx in range(len(header)):
+    column=_CsvColumn()
+    column.extend([row[idx] for row in sample])
+    col_types.append(column.finish()[0])
+  rows=itertools.chain(sample, rows)
+  while True:
+    raw_rows=list(itertools.islice(rows, chunk_rows))
+    if not raw_rows:
+      return
+    yield _csv_chunk(header, col_types, raw_rows, widen)
+
+def _iter_ost_chunks(stream, chunk_rows):
+  lines=_ost_lines(stream)
+  try:
+    header=lines.next()
+  except StopIteration:
+    raise IOError("Cannot read table from empty stream")
+  schema=base.Tab(*_parse_ost_header(header))
+  while True:
+    tab=base.Tab(list(schema.col_names), list(schema.col_types))
+    for line in itertools.islice(lines, chunk_rows):
+      tab.add_row(_parse_ost_row(line))
+    if len(tab.rows)==0:
+      return
+    yield tab
+
+def _iter_chunks(stream_or_filename, format, sep, chunk_rows, sample_rows, 
+                 widen):
+  if not hasattr(stream_or_filename, 'read'):
+    stream=open(stream_or_filename, 'r')
+  else:
+    stream=stream_or_filename
+  try:
+    if format=='csv':
+      chunks=_iter_csv_chunks(stream, sep, chunk_rows, sample_rows, widen)
+    else:
+      chunks=_iter_ost_chunks(stream, chunk_rows)
+    for chunk in chunks:
+      yield chunk
+  finally:
+    if stream is not stream_or_filename:
+      stream.close()
+
 def _load_pickle(stream_or_filename):
   if not hasattr(stream_or_filename, 'read'):
     stream=open(stream_or_filename, 'rb')
@@ -85,10 +409,13 @@ def guess_format(filename):
     return 'csv'
   if extension == '.pickle':
     return 'pickle'
+  if extension == '.tapb':
+    return 'tapb'
   return 'ost'
   
   
-def load(stream_or_filename, format='auto', sep=','):
+def load(stream_or_filename, format='auto', sep=',', timings=None, cols=None,
+         lazy=False):
   """
   Load table from an input stream or the file pointed to by filename.
 
@@ -102,10 +429,11 @@ def load(stream_or_filename, format='auto', sep=','):
   ============    ======================
   .csv            comma separated values
   .pickle         pickled byte stream
+  .tapb           columnar binary format
   <all others>    ost-specific format
   ============    ======================
   
-  For csv and pickle files with other file extensions, the format must be 
+  For csv, pickle and tapb files with other file extensions, the format must be 
   specified explicitly by setting *format* the appropriate format string.
 
   The following file formats are understood:
@@ -127,6 +455,24 @@ def load(stream_or_filename, format='auto', sep=','):
 
     Deserializes the table from a pickled byte stream
 
+  - tapb
+
+    Compact binary format storing each column in a typed buffer, see 
+    :mod:`tap.binary`. Loading does not parse any values and returns a table
+    with columnar storage. The file is memory-mapped, and when a list of 
+    column names is passed as *cols*, only these columns are read.
+
+  If *lazy* is true, ost and tapb files are memory-mapped and only an index
+  of the rows (ost) or columns (tapb) is built when loading. The values of a
+  column are decoded when the column is accessed for the first time, e.g. 
+  through ``tab['x']``, :meth:`Tab.zip` or :attr:`Tab.rows`. Lazily loaded
+  tables use the columnar storage. This is much faster when only a few 
+  columns of a large file are needed. The values of an ost line can not be
+  split column by column, so the first access to a column of an ost file 
+  parses the whole file once and decodes all columns, which are then kept 
+  until they are accessed. Since the column types of csv files can only be 
+  guessed from all values, csv files can not be loaded lazily.
+
   - csv
 
     Reads the table from comma separated values stream. Since there is no
@@ -139,17 +485,82 @@ def load(stream_or_filename, format='auto', sep=','):
     * if all non-null values are true/false/yes/no, the value is set to bool
     * for all other cases, the column type is set to string
 
+    The types are guessed while converting the values, in a single pass over
+    the file. If a dictionary is passed as *timings*, the time in seconds
+    spent reading and splitting the lines (*read*), guessing the types and
+    converting the values (*convert*) and assembling the table (*build*) is
+    stored in it.
+
   :returns: A new :class:`Tab` instance
   """
   format=format.lower()
   if format=='auto':
     format = guess_format(stream_or_filename)
+  if cols is not None and format!='tapb':
+    raise ValueError('loading a subset of columns is only supported for the '
+                     'tapb format')
+  if lazy and format not in ('ost', 'tapb',):
+    raise ValueError('format "%s" can not be loaded lazily' % format)
     
   if format=='ost':
+    if lazy:
+      return _load_ost_lazy(stream_or_filename)
     return _load_ost(stream_or_filename)
   if format=='csv':
-    return _load_csv(stream_or_filename, sep=sep)
+    return _load_csv(stream_or_filename, sep=sep, timings=timings)
   if format=='pickle':
     return _load_pickle(stream_or_filename)
+  if format=='tapb':
+    return binary.load(stream_or_filename, cols=cols, lazy=lazy)
   raise ValueError('unknown format ""' % format)
 
+
+def load_chunks(stream_or_filename, chunk_rows=10000, format='auto', sep=',',
+                sample_rows=1000, widen='promote'):
+  """
+  Load a table in chunks of at most *chunk_rows* rows. Returns an iterator 
+  over :class:`Tab` instances, which all have the same columns. Only one chunk 
+  is held in memory at a time, which allows to process files which are too 
+  large to be loaded at once:
+
+  .. code-block:: python
+
+    num_hits=0
+    for chunk in load_chunks('scores.csv', chunk_rows=100000):
+      num_hits+=len(chunk.filter(hit=True).rows)
+
+  To compute statistics over all chunks, merge the accumulators returned by
+  :meth:`~tap.Tab.running_stats` and :meth:`~tap.Tab.running_correl`.
+
+  The ost and csv formats are supported, see :func:`load` for a description.
+
+  For csv files, the column types are guessed from the first *sample_rows* 
+  rows. When a later value does not match the guessed type of its column,
+  *widen* determines what happens:
+
+  - promote: the column type is widened to the next type that can hold the 
+    value, int to float and float or bool to string. The chunk containing the 
+    value and all subsequent chunks use the wider type.
+  - null: the value is replaced by None and the column type is kept
+  - error: a :exc:`ValueError` is raised
+
+  :param chunk_rows: maximal number of rows per chunk
+  :type chunk_rows: :class:`int`
+  :param sample_rows: number of rows used to guess the column types of csv 
+                      files
+  :type sample_rows: :class:`int`
+  :param widen: one of *promote*, *null* or *error*
+  :type widen: :class:`str`
+  :returns: iterator over :class:`Tab` instances
+  """
+  if chunk_rows<1:
+    raise ValueError('chunk_rows must be positive, not %d' % chunk_rows)
+  if widen not in WIDEN_STRATEGIES:
+    raise ValueError('unknown widening strategy "%s"' % widen)
+  format=format.lower()
+  if format=='auto':
+    format = guess_format(stream_or_filename)
+  if format not in ('ost', 'csv',):
+    raise ValueError('format "%s" can not be loaded in chunks' % format)
+  return _iter_chunks(stream_or_filename, format, sep, chunk_rows, 
+                      max(sample_rows, 1), widen)
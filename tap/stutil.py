@@ -1,4 +1,7 @@
+import bisect
+import itertools
 import math
+import random
 
 def mean(xs):
   """
@@ -14,11 +17,54 @@ def median(xs):
   """
   if len(xs)==0:
     raise RuntimeError("Can't calculate median of empty sequence")
-  sorted_xs=sorted(xs)
   if (len(xs) % 2)==0:
-    return (sorted_xs[(len(xs)-1)/2]+sorted_xs[(len(xs)-1)/2+1])/2.0
+    low, high=select(xs, [(len(xs)-1)/2, (len(xs)-1)/2+1])
+    return (low+high)/2.0
   else:
-    return sorted_xs[(len(xs)-1)/2]
+    return select(xs, [(len(xs)-1)/2])[0]
+
+def select(xs, ks):
+  """
+  Return the values which would be at the positions ks if xs was sorted. For
+  a few positions, this is faster than sorting xs (quickselect).
+  """
+  if len(ks)>8:
+    sorted_xs=sorted(xs)
+    return [sorted_xs[k] for k in ks]
+  found={}
+  stack=[(xs, sorted(set(ks)), 0)]
+  while stack:
+    part, part_ks, offset=stack.pop()
+    if len(part)<=32:
+      sorted_part=sorted(part)
+      for k in part_ks:
+        found[k]=sorted_part[k-offset]
+      continue
+    pivot=part[random.randrange(len(part))]
+    lows=[x for x in part if x<pivot]
+    highs=[x for x in part if x>pivot]
+    num_low=len(lows)
+    num_high_start=len(part)-len(highs)
+    low_ks=[]
+    high_ks=[]
+    for k in part_ks:
+      if k-offset<num_low:
+        low_ks.append(k)
+      elif k-offset>=num_high_start:
+        high_ks.append(k)
+      else:
+        found[k]=pivot
+    if low_ks:
+      stack.append((lows, low_ks, offset))
+    if high_ks:
+      stack.append((highs, high_ks, offset+num_high_start))
+  return [found[k] for k in ks]
+
+def percentile_index(num, nth):
+  """
+  Position of the *nth* percentile in a sorted dataset with *num* values
+  """
+  return min(num-1, int(round(num*nth/100.0+0.5)-1))
 
 def std_dev(xs):
   """
@@ -58,12 +104,489 @@ def correl(xs, ys):
   sigma_y=math.sqrt(sigma_y)
   return cross_term/(sigma_x*sigma_y)
 
+class RunningStats(object):
+  """
+  Single-pass accumulator for the number of values, the mean, the standard 
+  deviation, the minimum and the maximum of a dataset. None values are 
+  ignored.
+
+  Values are added one at a time with :meth:`add` or :meth:`extend`, using
+  Welford's algorithm for the variance. Accumulators for different parts of a
+  dataset, e.g. the chunks of a file or the results of worker processes, are 
+  combined with :meth:`merge`:
+
+  .. code-block:: python
+
+    stats=RunningStats()
+    for chunk in load_chunks('scores.csv'):
+      stats.merge(chunk.running_stats('score'))
+    print stats.mean(), stats.std_dev()
+  """
+  def __init__(self, xs=None):
+    self._count=0
+    self._mean=0.0
+    self._m2=0.0
+    self._min=None
+    self._max=None
+    if xs is not None:
+      self.extend(xs)
+
+  @staticmethod
+  def from_moments(count, mean, m2, min_val, max_val):
+    """
+    Create an accumulator from the number of values, their mean, the sum of 
+    squared differences from the mean, the minimum and the maximum
+    """
+    stats=RunningStats()
+    stats._count=count
+    stats._mean=float(mean)
+    stats._m2=float(m2)
+    stats._min=min_val
+    stats._max=max_val
+    return stats
+
+  def add(self, x):
+    if x==None:
+      return
+    self._count+=1
+    delta=x-self._mean
+    self._mean+=delta/self._count
+    self._m2+=delta*(x-self._mean)
+    if self._count==1 or x<self._min:
+      self._min=x
+    if self._count==1 or x>self._max:
+      self._max=x
+
+  def extend(self, xs):
+    for x in xs:
+      self.add(x)
+
+  def merge(self, other):
+    """
+    Add the values accumulated by *other* to this accumulator
+    """
+    if other._count==0:
+      return self
+    if self._count==0:
+      self._count, self._mean, self._m2=other._count, other._mean, other._m2
+      self._min, self._max=other._min, other._max
+      return self
+    count=self._count+other._count
+    delta=other._mean-self._mean
+    self._mean+=delta*other._count/count
+    self._m2+=other._m2+delta*delta*self._count*other._count/count
+    self._count=count
+    self._min=min(self._min, other._min)
+    self._max=max(self._max, other._max)
+    return self
+
+  def count(self):
+    return self._count
+
+  def mean(self):
+    if self._count==0:
+      raise RuntimeError("Can't calculate mean of empty sequence")
+    return self._mean
+
+  def variance(self):
+    if self._count==0:
+      raise RuntimeError("Can't calculate mean of empty sequence")
+    return self._m2/self._count
+
+  def std_dev(self):
+    return math.sqrt(self.variance())
+
+  def min(self):
+    return self._min
+
+  def max(self):
+    return self._max
+
+class RunningCorrel(object):
+  """
+  Single-pass accumulator for the correlation coefficient of pairs of values 
+  (see :func:`correl`). Pairs where one of the values is None are ignored. 
+  Like :class:`RunningStats`, accumulators can be combined with 
+  :meth:`merge`.
+  """
+  def __init__(self, pairs=None):
+    self._count=0
+    self._mean_x=0.0
+    self._mean_y=0.0
+    self._m2_x=0.0
+    self._m2_y=0.0
+    self._c_xy=0.0
+    if pairs is not None:
+      self.extend(pairs)
+
+  @staticmethod
+  def from_moments(count, mean_x, mean_y, m2_x, m2_y, c_xy):
+    """
+    Create an accumulator from the number of pairs, the means, the sums of 
+    squared differences from the means and the sum of the products of the
+    differences
+    """
+    acc=RunningCorrel()
+    acc._count=count
+    acc._mean_x, acc._mean_y=float(mean_x), float(mean_y)
+    acc._m2_x, acc._m2_y, acc._c_xy=float(m2_x), float(m2_y), float(c_xy)
+    return acc
+
+  def add(self, x, y):
+    if x==None or y==None:
+      return
+    self._count+=1
+    dx=x-self._mean_x
+    dy=y-self._mean_y
+    self._mean_x+=dx/self._count
+    self._mean_y+=dy/self._count
+    self._m2_x+=dx*(x-self._mean_x)
+    self._m2_y+=dy*(y-self._mean_y)
+    self._c_xy+=dx*(y-self._mean_y)
+
+  def extend(self, pairs):
+    for x, y in pairs:
+      self.add(x, y)
+
+  def merge(self, other):
+    """
+    Add the pairs accumulated by *other* to this accumulator
+    """
+    if other._count==0:
+      return self
+    if self._count==0:
+      self.__dict__.update(other.__dict__)
+      return self
+    count=self._count+other._count
+    dx=other._mean_x-self._mean_x
+    dy=other._mean_y-self._mean_y
+    factor=float(self._count)*other._count/count
+    self._m2_x+=other._m2_x+dx*dx*factor
+    self._m2_y+=other._m2_y+dy*dy*factor
+    self._c_xy+=other._c_xy+dx*dy*factor
+    self._mean_x+=dx*other._count/count
+    self._mean_y+=dy*other._count/count
+    self._count=count
+    return self
+
+  def count(self):
+    return self._count
+
+  def correl(self):
+    if self._count==0:
+      raise RuntimeError("Can't calculate mean of empty sequence")
+    if self._count==1:
+      raise RuntimeError("Can't calculate correl of sequences with length 1.")
+    return self._c_xy/(math.sqrt(self._m2_x)*math.sqrt(self._m2_y))
+
+class QuantileSketch(object):
+  """
+  Approximate percentiles of a dataset with bounded memory (KLL sketch). 
+  None values are ignored.
+
+  The sketch keeps at most about 3*k of the values, each representing a 
+  number of values of the dataset. The rank error of the percentiles is 
+  roughly 1.7/k, i.e. below 1% for the default of k=200, independently of 
+  the number of values. Like :class:`RunningStats`, sketches of parts of a 
+  dataset are combined with :meth:`merge`:
+
+  .. code-block:: python
+
+    sketch=QuantileSketch()
+    for chunk in load_chunks('scores.csv'):
+      sketch.merge(chunk.quantile_sketch('score'))
+    p50, p90, p99=sketch.percentiles([50, 90, 99])
+
+  The minimum and maximum (percentiles 0 and 100) are exact. 
+  """
+  def __init__(self, k=200, xs=None):
+    if k<8:
+      raise ValueError("k must be at least 8")
+    self._k=k
+    self._levels=[[]]
+    self._count=0
+    self._min=None
+    self._max=None
+    if xs is not None:
+      self.extend(xs)
+
+  def _capacity(self, level):
+    depth=len(self._levels)-level-1
+    return max(2, int(math.ceil(self._k*(2.0/3.0)**depth)))
+
+  def _update_range(self, low, high):
+    if self._count==0 or low<self._min:
+      self._min=low
+    if self._count==0 or high>self._max:
+      self._max=high
+
+  def add(self, x):
+    if x==None:
+      return
+    self._update_range(x, x)
+    self._count+=1
+    self._levels[0].append(x)
+    if len(self._levels[0])>=self._capacity(0):
+      self._compress()
+
+  def extend(self, xs):
+    self.add_sorted(sorted(x for x in xs if x!=None))
+
+  def add_sorted(self, values):
+    """
+    Add sorted values without None. *values* can be a list or any other 
+    sequence supporting slicing, e.g. a numpy array.
+    """
+    num=len(values)
+    if num==0:
+      return
+    self._update_range(values[0], values[-1])
+    self._count+=num
+    # taking every 2^level-th value of the sorted values is equivalent to
+    # compacting them level times
+    level=0
+    while (num>>level)>self._k:
+      level+=1
+    step=1<<level
+    whole=(num//step)*step
+    while len(self._levels)<=level:
+      self._levels.append([])
+    offset=random.randrange(step)
+    self._levels[level].extend(_as_list(values[offset:whole:step]))
+    self._levels[0].extend(_as_list(values[whole:]))
+    self._compress()
+
+  def _compress(self):
+    level=0
+    while level<len(self._levels):
+      items=self._levels[level]
+      if len(items)>=self._capacity(level):
+        if level+1==len(self._levels):
+          self._levels.append([])
+        items.sort()
+        # with an odd number of items, the largest stays on this level
+        keep=[items.pop()] if len(items)%2 else []
+        self._levels[level+1].extend(items[random.randint(0, 1)::2])
+        self._levels[level]=keep
+      level+=1
+
+  def merge(self, other):
+    """
+    Add the values summarized by *other* to this sketch
+    """
+    if other._count==0:
+      return self
+    self._update_range(other._min, other._max)
+    self._count+=other._count
+    while len(self._levels)<len(other._levels):
+      self._levels.append([])
+    for level, items in enumerate(other._levels):
+      self._levels[level].extend(items)
+    self._compress()
+    return self
+
+  def count(self):
+    return self._count
+
+  def percentiles(self, nths):
+    """
+    Approximate percentiles, see :meth:`tap.Tab.percentiles` for their 
+    definition. Returns None for each percentile if the sketch is empty.
+    """
+    if self._count==0:
+      return [None]*len(nths)
+    weighted=sorted((x, 1<<level) for level, items in enumerate(self._levels)
+                    for x in items)
+    result=[]
+    for nth in nths:
+      rank=percentile_index(self._count, nth)
+      if rank<=0:
+        result.append(self._min)
+        continue
+      if rank>=self._count-1:
+        result.append(self._max)
+        continue
+      total=0
+      for x, weight in weighted:
+        total+=weight
+        if total>rank:
+          break
+      result.append(x)
+    return result
+
+  def median(self):
+    return self.percentiles([50])[0]
+
+def _as_list(values):
+  if hasattr(values, 'tolist'):
+    return values.tolist()
+  return list(values)
+
+def ranks(xs):
+  """
+  Calculate the ranks of the values in xs, starting at 1. Tied values get the
+  average of the ranks they span.
+  """
+  order=sorted(range(len(xs)), key=xs.__getitem__)
+  result=[0.0]*len(xs)
+  start=0
+  while start<len(order):
+    end=start+1
+    while end<len(order) and xs[order[end]]==xs[order[start]]:
+      end+=1
+    for i in order[start:end]:
+      result[i]=(start+end+1)/2.0
+    start=end
+  return result
+
+def trapz(ys, xs):
+  """
+  Calculate the area under the curve given by the points xs and ys using the
+  trapezoidal rule
+  """
+  area=0.0
+  for i in range(1, len(xs)):
+    area+=(xs[i]-xs[i-1])*(ys[i]+ys[i-1])/2.0
+  return area
+
+def matthews_correl(tp, fp, fn, tn):
+  """
+  Calculate the Matthews correlation coefficient from the number of true
+  positives, false positives, false negatives and true negatives
+  
+               tp*tn - fp*fn
+  mcc=-------------------------------------
+      sqrt((tp+fn)*(tp+fp)*(tn+fn)*(tn+fp))
+  """
+  for factor, name in ((tp+fn, 'tp + fn'), (tp+fp, 'tp + fp'),
+                       (tn+fn, 'tn + fn'), (tn+fp, 'tn + fp')):
+    if factor==0:
+      raise RuntimeError("MCC is not defined since factor (%s) is zero" % name)
+  return ((tp*tn)-(fp*fn)) / math.sqrt((tp+fn)*(tp+fp)*(tn+fn)*(tn+fp))
+
+class RunningHistogram(object):
+  """
+  Weighted counts of values falling into bins. The bins are given either by 
+  their *edges*, a strictly increasing list of bin boundaries, or by *bounds*,
+  the start and end of *num_bins* bins of equal width. Like in 
+  :func:`numpy.histogram`, bin i holds the values x with 
+  edges[i] <= x < edges[i+1], and the last bin also holds the values equal to
+  the last edge.
+
+  Besides the *counts* of the bins, the histogram counts the values below the
+  first and above the last edge (*below* and *above*) and the None and NaN 
+  values (*na_count*). Each value counts with its weight, 1 by default.
+
+  Like :class:`RunningStats`, the histograms of parts of a dataset are 
+  combined with :meth:`merge`, as long as they have the same edges:
+
+  .. code-block:: python
+
+    hist=RunningHistogram(bounds=(0.0, 10.0), num_bins=20)
+    for chunk in load_chunks('scores.csv'):
+      hist.merge(chunk.histogram('score', edges=hist.edges))
+    print hist.counts
+
+  :raises: :class:`ValueError` if the edges are not strictly increasing or
+           the bounds are empty
+  """
+  def __init__(self, edges=None, bounds=None, num_bins=10, xs=None, 
+               weights=None):
+    if edges is None:
+      if bounds is None:
+        raise ValueError("either edges or bounds are required")
+      low, high=float(bounds[0]), float(bounds[1])
+      if not low<high:
+        raise ValueError("the lower bound must be smaller than the upper bound")
+      if num_bins<1:
+        raise ValueError("num_bins must be at least 1")
+      step=(high-low)/num_bins
+      edges=[i*step+low for i in range(num_bins)]+[high]
+      self._scale=num_bins/(high-low)
+    else:
+      edges=[float(edge) for edge in edges]
+      if len(edges)<2 or any(a>=b for a, b in zip(edges, edges[1:])):
+        raise ValueError("edges must be strictly increasing, with at least "
+                         "two edges")
+      self._scale=None
+    self.edges=edges
+    self.counts=[0]*(len(edges)-1)
+    self.below=0
+    self.above=0
+    self.na_count=0
+    if xs is not None:
+      self.extend(xs, weights)
+
+  def _bin(self, x):
+    # index of the bin holding x, -1 below the first and len(counts) above
+    # the last edge
+    edges=self.edges
+    last=len(edges)-2
+    if x<edges[0]:
+      return -1
+    if x>=edges[-1]:
+      return last if x==edges[-1] else last+1
+    if self._scale is None:
+      return bisect.bisect_right(edges, x)-1
+    index=min(int((x-edges[0])*self._scale), last)
+    # correct rounding errors of the scaled value with the edges
+    if x<edges[index]:
+      return index-1
+    if x>=edges[index+1]:
+      return index+1
+    return index
+
+  def add(self, x, weight=1):
+    if x==None or x!=x:
+      self.na_count+=weight
+      return
+    index=self._bin(x)
+    if index<0:
+      self.below+=weight
+    elif index>=len(self.counts):
+      self.above+=weight
+    else:
+      self.counts[index]+=weight
+
+  def extend(self, xs, weights=None):
+    """
+    Add the values *xs*, weighted by the values *weights*. Values whose weight
+    is None are ignored.
+    """
+    if weights is None:
+      for x in xs:
+        self.add(x)
+      return
+    for x, weight in itertools.izip(xs, weights):
+      if weight!=None:
+        self.add(x, weight)
+
+  def add_counts(self, counts, below=0, above=0, na_count=0):
+    """
+    Add counts which have been computed for the same bins elsewhere, e.g. 
+    with :func:`numpy.histogram`
+    """
+    if len(counts)!=len(self.counts):
+      raise ValueError("expected %d counts, got %d" % (len(self.counts),
+                                                       len(counts)))
+    self.counts=[a+b for a, b in zip(self.counts, counts)]
+    self.below+=below
+    self.above+=above
+    self.na_count+=na_count
+    return self
+
+  def merge(self, other):
+    """
+    Add the counts of the histogram *other*, which must have the same edges
+    """
+    if other.edges!=self.edges:
+      raise ValueError("histograms with different edges can not be merged")
+    return self.add_counts(other.counts, other.below, other.above, 
+                           other.na_count)
+
 def Histogram(xs, bounds, num_bins):
-  bins=[0 for i in range(num_bins)]
-  d=1.0*num_bins/(bounds[1]-bounds[0])
-  for x in xs:
-    index=int((x-bounds[0])*d)
-    if index>num_bins-1 or index<0:
-      continue
-    bins[index]+=1
-  return bins
+  """
+  Counts of the values xs in num_bins bins of equal width between the 
+  bounds, see :class:`RunningHistogram`
+  """
+  return RunningHistogram(bounds=bounds, num_bins=num_bins, xs=xs).counts
@@ -0,0 +1,102 @@
+import unittest
+
+HAS_NUMPY=True
+try:
+  import numpy as np
+except ImportError:
+  HAS_NUMPY=False
+  print "Could not find numpy: ignoring some accel unit tests"
+
+from tap import Tab, accel
+import fixtures
+
+
+class TestNumericColumn(unittest.TestCase):
+
+  def _tables(self):
+    tab = fixtures.create_test_table()
+    tab.add_col('fourth', 'bool', [False, True, None])
+    columnar = fixtures.create_test_table()
+    columnar.add_col('fourth', 'bool', [False, True, None])
+    columnar.set_storage('columnar')
+    return tab, columnar
+
+  def test_returns_none_for_non_numeric_columns(self):
+    if not HAS_NUMPY:
+      return
+    tab = fixtures.create_test_table()
+    self.assertEqual(accel.numeric_column(tab, 'first'), None)
+
+  def test_extracts_values_and_validity(self):
+    if not HAS_NUMPY:
+      return
+    for tab in self._tables():
+      num_col = accel.numeric_column(tab, 'second')
+      self.assertEqual(list(num_col.non_null), [3, 9])
+      self.assertEqual(list(num_col.valid), [True, False, True])
+      num_col = accel.numeric_column(tab, 'fourth')
+      self.assertEqual(list(num_col.non_null), [False, True])
+
+  def test_computes_aggregates(self):
+    if not HAS_NUMPY:
+      return
+    for tab in self._tables():
+      num_col = accel.numeric_column(tab, 'second')
+      self.assertEqual(num_col.count(), 2)
+      self.assertEqual(num_col.sum(), 12)
+      self.assertTrue(isinstance(num_col.sum(), int))
+      self.assertAlmostEqual(num_col.mean(), 6.0)
+      self.assertAlmostEqual(num_col.median(), 6.0)
+      self.assertAlmostEqual(num_col.std_dev(), 3.0)
+      self.assertEqual(num_col.percentiles([0, 50, 100]), [3, 9, 9])
+      self.assertEqual(num_col.min(), 3)
+      self.assertEqual(num_col.max(), 9)
+      # only one row where both values are not None
+      self.assertRaises(RuntimeError, accel.correl,
+                        accel.numeric_column(tab, 'second'),
+                        accel.numeric_column(tab, 'third'))
+
+  def test_selects_percentiles_without_sorting(self):
+    if not HAS_NUMPY:
+      return
+    values = [(i*7919)%1009 for i in range(1009)]
+    tab = Tab(['x'], 'i', x=values+[None])
+    num_col = accel.numeric_column(tab, 'x')
+    nths = [0, 1, 25, 50, 99, 100]
+    expected = [sorted(values)[min(1008, int(round(1009*nth/100.0+0.5)-1))]
+                for nth in nths]
+    self.assertEqual(num_col.percentiles(nths), expected)
+    self.assertEqual(num_col.median(), 504)
+    # a sketch holding fewer than k values is exact
+    sketch = num_col.quantile_sketch(k=2000)
+    self.assertEqual(sketch.count(), 1009)
+    self.assertEqual(sketch.percentiles(nths), expected)
+
+  def test_raises_for_empty_columns(self):
+    if not HAS_NUMPY:
+      return
+    tab = Tab(['x'], 'f', x=[None, None])
+    num_col = accel.numeric_column(tab, 'x')
+    self.assertEqual(num_col.sum(), 0)
+    self.assertEqual(num_col.percentiles([50]), [None])
+    self.assertRaises(RuntimeError, num_col.mean)
+    self.assertRaises(RuntimeError, num_col.median)
+
+  def test_matches_pure_python_results(self):
+    if not HAS_NUMPY:
+      return
+    tab = Tab(['x', 'y'], 'fi', x=[0.5, None, 2.5, 7.0, 1.0, 3.0],
+              y=[3, 1, None, 10, -2, 4])
+    vectorized = [tab.sum('x'), tab.mean('y'), tab.median('x'),
+                  tab.std_dev('y'), tab.percentiles('x', [10, 90]),
+                  tab.correl('x', 'y')]
+    try:
+      accel._numpy = None
+      pure = [tab.sum('x'), tab.mean('y'), tab.median('x'),
+              tab.std_dev('y'), tab.percentiles('x', [10, 90]),
+              tab.correl('x', 'y')]
+    finally:
+      accel._numpy = accel._NOT_LOADED
+    self.assertEqual(vectorized[4], pure[4])
+    for v, p in zip(vectorized[:4]+vectorized[5:], pure[:4]+pure[5:]):
+      self.assertAlmostEqual(v, p)
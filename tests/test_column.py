@@ -0,0 +1,188 @@
+import unittest
+import cPickle
+
+from tap import Tab
+from tap.column import Column, ColumnarRows
+from tap.parallel import SharedColumn
+import fixtures
+import helper
+import test_table
+
+
+class TestColumn(unittest.TestCase):
+
+  def test_stores_values_and_none(self):
+    col = Column('int', [1, None, 3])
+    self.assertEqual(len(col), 3)
+    self.assertEqual(list(col), [1, None, 3])
+    self.assertEqual(col[0], 1)
+    self.assertEqual(col[1], None)
+    self.assertEqual(col[-1], 3)
+    self.assertEqual(col.null_count, 1)
+    self.assertTrue(col.is_typed)
+
+  def test_bool_columns_return_bools(self):
+    col = Column('bool', [True, False, None])
+    self.assertEqual(list(col), [True, False, None])
+    self.assertTrue(col[0] is True)
+
+  def test_tracks_validity_when_overwriting(self):
+    col = Column('float', [None]*10)
+    self.assertEqual(col.null_count, 10)
+    col[9] = 2.5
+    col[0] = None
+    self.assertEqual(col[9], 2.5)
+    self.assertEqual(col.null_count, 9)
+    col[9] = None
+    self.assertEqual(col.null_count, 10)
+    self.assertEqual(list(col), [None]*10)
+
+  def test_falls_back_to_list_storage(self):
+    col = Column('int', [1, 2])
+    col.append(2**80)
+    self.assertFalse(col.is_typed)
+    self.assertEqual(list(col), [1, 2, 2**80])
+
+  def test_string_columns_are_lists(self):
+    col = Column('string', ['a', None])
+    self.assertFalse(col.is_typed)
+    self.assertEqual(col.null_count, 1)
+    self.assertEqual(list(col), ['a', None])
+
+  def test_take_reorders_values(self):
+    col = Column('int', range(10))
+    self.assertEqual(list(col.take([9, 0, 5])), [9, 0, 5])
+    col = Column('int', [1, None, 3])
+    col.reorder([2, 1, 0])
+    self.assertEqual(list(col), [3, None, 1])
+    col.append(None)
+    self.assertEqual(list(col), [3, None, 1, None])
+
+  def test_extends_in_bulk(self):
+    col = Column('float', [1.0, None])
+    col.extend([2.0]*20)
+    col.extend([None, 3.0])
+    self.assertEqual(list(col), [1.0, None]+[2.0]*20+[None, 3.0])
+    self.assertEqual(col.null_count, 2)
+    col = Column('int', range(9))
+    col.extend([1, 2**80])
+    self.assertFalse(col.is_typed)
+    self.assertEqual(list(col), range(9)+[1, 2**80])
+
+  def test_copies_into_shared_memory(self):
+    for values in ([1.5, None, 2.5]*5, [True, False], []):
+      col = Column('bool' if values==[True, False] else 'float', values)
+      copy = SharedColumn(col).to_column()
+      self.assertEqual(list(copy), values)
+      self.assertEqual(copy.null_count, col.null_count)
+    self.assertRaises(ValueError, SharedColumn, Column('string', ['a']))
+
+
+class TestColumnarRows(unittest.TestCase):
+
+  def test_behaves_like_list_of_rows(self):
+    rows = ColumnarRows.from_rows([['a', 1], ['b', None]], ['string', 'int'])
+    self.assertEqual(len(rows), 2)
+    self.assertEqual(rows[0], ['a', 1])
+    self.assertEqual(rows[-1], ['b', None])
+    self.assertEqual([list(r) for r in rows], [['a', 1], ['b', None]])
+    self.assertEqual(rows[0:1], [['a', 1]])
+    rows.append(['c', 3])
+    rows[1] = ['d', 4]
+    rows[0][1] = 10
+    self.assertEqual(rows.to_rows(), [['a', 10], ['d', 4], ['c', 3]])
+    self.assertRaises(IndexError, rows.__getitem__, 3)
+
+  def test_sorts_rows(self):
+    rows = ColumnarRows.from_rows([['a', 2], ['b', None], ['c', 1]],
+                                  ['string', 'int'])
+    rows.sort(key=lambda r: r[1])
+    self.assertEqual(rows.to_rows(), [['b', None], ['c', 1], ['a', 2]])
+
+
+  def test_compares_and_modifies_like_a_list(self):
+    rows = ColumnarRows.from_rows([['a', 2], ['b', None], ['c', 1]],
+                                  ['string', 'int'])
+    self.assertEqual(rows, [['a', 2], ['b', None], ['c', 1]])
+    self.assertNotEqual(rows, [['a', 2]])
+    self.assertEqual(repr(rows), "[['a', 2], ['b', None], ['c', 1]]")
+    del rows[0]
+    rows.insert(1, ['d', None])
+    rows.insert(-10, ['e', 5])
+    self.assertEqual(rows, [['e', 5], ['b', None], ['d', None], ['c', 1]])
+    self.assertEqual(rows.columns[1].null_count, 2)
+    del rows[1]
+    self.assertEqual(rows.to_rows(), [['e', 5], ['d', None], ['c', 1]])
+
+class TestColumnarTab(helper.TabTestCase):
+
+  def test_converts_between_storages(self):
+    tab = fixtures.create_test_table()
+    self.assertEqual(tab.get_storage(), 'rows')
+    tab.set_storage('columnar')
+    self.assertEqual(tab.get_storage(), 'columnar')
+    self.compare_data_from_dict(tab, {'first': ['x','foo',None],
+                                      'second': [3,None,9],
+                                      'third': [None,2.2,3.3]})
+    tab.set_storage('rows')
+    self.assertEqual(tab.rows, [['x', 3, None], ['foo', None, 2.2],
+                                [None, 9, 3.3]])
+    self.assertRaises(ValueError, tab.set_storage, 'foo')
+
+  def test_supports_table_operations(self):
+    tab = fixtures.create_test_table()
+    tab.set_storage('columnar')
+    tab.add_row(['bar', 5, 1.0])
+    tab.add_row({'first': 'x', 'second': 7}, overwrite='first')
+    tab.add_col('fourth', 'bool', [True, False, None, True])
+    self.assertEqual(tab.sum('second'), 21)
+    self.assertEqual(tab.count('third'), 3)
+    self.assertEqual(tab.max('second'), 9)
+    self.assertEqual(tab.min_idx('third'), 3)
+    tab.sort('second', '-')
+    self.compare_data_from_dict(tab, {'first': ['foo', 'bar', 'x', None],
+                                      'second': [None, 5, 7, 9],
+                                      'third': [2.2, 1.0, None, 3.3],
+                                      'fourth': [False, True, True, None]})
+    filtered = tab.filter(fourth=True)
+    self.assertEqual(filtered.get_storage(), 'columnar')
+    self.compare_data_for_col(filtered, 'first', ['bar', 'x'])
+    tab.remove_col('third')
+    tab['second'] = 1
+    self.compare_data_from_dict(tab, {'first': ['foo', 'bar', 'x', None],
+                                      'second': [1, 1, 1, 1],
+                                      'fourth': [False, True, True, None]})
+
+  def test_adds_columns_to_empty_tables(self):
+    tab = Tab()
+    tab.set_storage('columnar')
+    tab.add_col('x', 'int', [1, 2])
+    tab.add_col('y', 'float')
+    tab.add_row([3, 1.5])
+    self.compare_data_from_dict(tab, {'x': [1, 2, 3], 'y': [None, None, 1.5]})
+
+  def test_can_be_pickled(self):
+    tab = fixtures.create_test_table()
+    tab.set_storage('columnar')
+    loaded = cPickle.loads(cPickle.dumps(tab, cPickle.HIGHEST_PROTOCOL))
+    self.assertEqual(loaded.get_storage(), 'columnar')
+    self.compare_data_from_dict(loaded, {'first': ['x','foo',None],
+                                         'second': [3,None,9],
+                                         'third': [None,2.2,3.3]})
+
+
+class TestColumnarTabBase(test_table.TestTabBase):
+  '''
+  Runs the table tests with columnar storage for all tables
+  '''
+  def setUp(self):
+    init = Tab.__init__
+    def columnar_init(tab, *args, **kwargs):
+      init(tab, *args, **kwargs)
+      tab.set_storage('columnar')
+    self._init = init
+    Tab.__init__ = columnar_init
+
+  def tearDown(self):
+    Tab.__init__ = self._init
+    test_table.TestTabBase.tearDown(self)
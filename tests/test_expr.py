@@ -0,0 +1,103 @@
+import unittest
+
+HAS_NUMPY=True
+try:
+  import numpy as np
+except ImportError:
+  HAS_NUMPY=False
+  print "Could not find numpy: ignoring some expression unit tests"
+
+from tap import Tab, expr
+import fixtures
+import helper
+
+
+class TestColExpr(helper.TabTestCase):
+
+  def _tables(self):
+    tab = fixtures.create_test_table()
+    columnar = fixtures.create_test_table()
+    columnar.set_storage('columnar')
+    return tab, columnar
+
+  def test_evaluates_arithmetic(self):
+    for tab in self._tables():
+      self.assertEqual(list(tab.second*2+1), [7, None, 19])
+      self.assertEqual(list(tab.second/2), [1, None, 4])
+      self.assertEqual(list(tab.third-tab.second), [None, None, 3.3-9])
+      self.assertEqual(list(-tab.second**2), [-9, None, -81])
+      self.assertEqual(list(10-abs(tab.second)), [7, None, 1])
+      self.assertEqual(list(tab.first+'!'), ['x!', 'foo!', None])
+      self.assertEqual(list(tab.second+[1, 2, 3]), [4, None, 12])
+
+  def test_evaluates_comparisons_and_masks(self):
+    for tab in self._tables():
+      self.assertEqual(list(tab.second>3), [False, None, True])
+      self.assertEqual(list((tab.second>=3) & (tab.third>3.0)),
+                       [None, None, True])
+      self.assertEqual(list(~(tab.second==3)), [False, None, True])
+      self.assertEqual(list(tab.first=='x'), [True, False, None])
+      self.assertEqual(list(tab.first==None), [False, False, True])
+      self.assertEqual(list(tab.third!=None), [False, True, True])
+      self.assertRaises(TypeError, bool, tab.second>3)
+
+  def test_evaluates_functions(self):
+    for tab in self._tables():
+      self.assertEqual(list(expr.sqrt(tab.second)), [3**0.5, None, 3.0])
+      self.assertEqual(list(expr.floor(tab.third)), [None, 2.0, 3.0])
+      self.assertEqual(list(expr.is_null(tab.second+tab.third)),
+                       [True, True, False])
+      self.assertRaises(ValueError, list, expr.log(tab.second-3))
+
+  def test_follows_python_semantics(self):
+    # results which NumPy would compute differently are evaluated in Python
+    tab = Tab(['x', 'b'], 'ib', x=[2**40, -7, 0], b=[True, True, False])
+    self.assertEqual(list(tab.x*tab.x), [2**80, 49, 0])
+    self.assertEqual(list(tab.x/2), [2**39, -4, 0])
+    self.assertEqual(list(tab.b+tab.b), [2, 2, 0])
+    self.assertEqual(list(~tab.b), [False, False, True])
+    self.assertRaises(ZeroDivisionError, list, 1/tab.x)
+
+  def test_numpy_and_python_evaluation_agree(self):
+    if not HAS_NUMPY:
+      return
+    for tab in self._tables():
+      tab.add_col('fourth', 'bool', [True, None, False])
+      for e in [tab.second*3-tab.third, tab.second//2, tab.third%2,
+                tab.second<tab.third, (tab.second>0) | tab.fourth,
+                -tab.fourth, expr.exp(tab.third), tab.second==None]:
+        self.assertEqual(e.evaluate(), expr._evaluate_python(e))
+        self.assertEqual([type(v) for v in e.evaluate()],
+                         [type(v) for v in expr._evaluate_python(e)])
+
+  def test_filters_with_expressions(self):
+    for tab in self._tables():
+      self.compare_data_for_col(tab.filter(tab.second>3), 'first', [None])
+      self.compare_data_for_col(tab.filter(tab.third!=None, first='foo'),
+                                'second', [None])
+      self.compare_data_for_col(tab.filter((tab.second<5) | (tab.third>3),
+                                           lambda row: row[0] is None),
+                                'second', [9])
+      other = Tab(['x'], 'i', x=[1, 2])
+      self.assertRaises(ValueError, tab.filter, other.x>1)
+
+  def test_assigns_expressions_to_columns(self):
+    for tab in self._tables():
+      tab['fourth'] = tab.second*2+tab.third
+      self.assertEqual(tab.col_types[-1], 'float')
+      self.compare_data_for_col(tab, 'fourth', [None, None, 21.3])
+      tab['second'] = tab.second+1
+      self.compare_data_for_col(tab, 'second', [4, None, 10])
+      tab['fifth'] = tab.second>4
+      self.assertEqual(tab.col_types[-1], 'bool')
+      tab['sixth'] = 1
+      self.assertEqual(tab.col_types[-1], 'int')
+      self.compare_data_for_col(tab, 'sixth', [1, 1, 1])
+
+  def test_tests_set_membership(self):
+    for tab in self._tables():
+      self.assertEqual(list(tab.second.isin([3, 4])), [True, False, False])
+      self.assertEqual(list(tab.second.isin([9, None])), [False, True, True])
+      self.assertEqual(list(tab.first.isin(['foo'])), [False, True, False])
+      self.assertEqual(list(tab.third.between(2.0, 3.0)), [None, True, False])
+      self.assertEqual(expr.true_indices(tab.second>0, tab.first!='foo'), [0])
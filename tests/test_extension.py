@@ -0,0 +1,44 @@
+import unittest
+import os
+import subprocess
+import sys
+
+import tap
+from tap import plot, stutil
+from tap.extension import LazyExtension
+
+
+class Values(list):
+  pass
+
+
+class TestExtensions(unittest.TestCase):
+
+  def test_binds_lazy_methods_on_first_call(self):
+    LazyExtension('stats', 'tap.stutil', 'mean').apply(Values)
+    self.assertNotEqual(Values.__dict__['mean'], stutil.mean)
+    self.assertEqual(Values([1, 2, 3]).mean(), 2.0)
+    self.assertEqual(Values.__dict__['mean'], stutil.mean)
+    self.assertEqual(Values([4]).mean(), 4.0)
+
+  def test_declares_all_plot_methods(self):
+    lazy = [ext for ext in tap.EXTENSIONS if ext.module_name == 'tap.plot'][0]
+    self.assertEqual(sorted(lazy.func_names), 
+                     sorted(func.func_name for func in plot.EXT.funcs))
+
+  def test_import_does_not_load_heavy_dependencies(self):
+    # run in a fresh interpreter, the modules are already loaded here
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = ('import sys\n'
+              'import tap\n'
+              'print " ".join(sorted(set(m.split(".")[0] for m, module'
+              ' in sys.modules.items() if module is not None and'
+              ' m.split(".")[0] in ("numpy", "scipy", "matplotlib"))))\n')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([root]+
+                                        [p for p in sys.path if p])
+    proc = subprocess.Popen([sys.executable, '-c', script], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    self.assertEqual(proc.returncode, 0, err)
+    self.assertEqual(out.strip(), '')
@@ -0,0 +1,22 @@
+import unittest
+
+from tap import group
+
+
+class TestGroupRows(unittest.TestCase):
+
+  def test_groups_with_hash_and_sort(self):
+    keys = [2, 1, None, 2, 5, None, 1]
+    for method in group.GROUP_METHODS:
+      self.assertEqual(group.group_rows(keys, method),
+                       ([2, 1, None, 5], [0, 1, 2, 0, 3, 2, 1]))
+      self.assertEqual(group.group_rows([], method), ([], []))
+
+  def test_groups_sorted_keys_in_order(self):
+    keys = [(None, 1), (1, 0), (1, 0), (2, 0)]
+    for method in group.GROUP_METHODS:
+      self.assertEqual(group.group_rows(keys, method),
+                       ([(None, 1), (1, 0), (2, 0)], [0, 1, 1, 2]))
+
+  def test_raises_for_unknown_method(self):
+    self.assertRaises(ValueError, group.group_rows, [], 'tree')
@@ -0,0 +1,83 @@
+import unittest
+import cPickle
+
+from tap import Tab
+from tap.index import HashIndex
+import fixtures
+import helper
+
+
+class TestHashIndex(unittest.TestCase):
+
+  def test_maps_values_to_rows(self):
+    index = HashIndex(['a', 'b', 'a', None, float('nan')])
+    self.assertEqual(index.lookup('a'), [0, 2])
+    self.assertEqual(index.lookup(None), [3])
+    self.assertEqual(index.lookup(float('nan')), [])
+    self.assertEqual(index.first('b'), 1)
+    self.assertEqual(index.first('c'), None)
+
+  def test_updates_rows(self):
+    index = HashIndex(['a', 'b', 'a'])
+    index.update(0, 'a', 'b')
+    self.assertEqual(index.lookup('a'), [2])
+    self.assertEqual(index.lookup('b'), [0, 1])
+    index.update(2, 'a', 'c')
+    self.assertEqual(index.lookup('a'), [])
+    self.assertEqual(index.first('c'), 2)
+
+
+class TestTabIndex(helper.TabTestCase):
+
+  def _tables(self):
+    tab = fixtures.create_test_table()
+    columnar = fixtures.create_test_table()
+    columnar.set_storage('columnar')
+    return tab, columnar
+
+  def test_overwrites_rows_through_index(self):
+    for tab in self._tables():
+      tab.create_index('first')
+      tab.create_index('second')
+      self.assertTrue(tab.has_index('first'))
+      tab.add_row(['foo', 5, 1.0], overwrite='first')
+      tab.add_row({'first': 'x', 'third': 2.0}, overwrite='first')
+      tab.add_row({'first': 'bar', 'second': 3}, overwrite='first')
+      self.compare_data_from_dict(tab, {'first': ['x','foo',None,'bar'],
+                                        'second': [3,5,9,3],
+                                        'third': [2.0,1.0,3.3,None]})
+      self.assertEqual(tab._indices['second'].lookup(3), [0, 3])
+      self.assertEqual(tab._indices['second'].lookup(None), [])
+      tab.add_row({'second': 3, 'first': 'y'}, overwrite='second')
+      self.compare_data_for_col(tab, 'first', ['y','foo',None,'bar'])
+
+  def test_filters_through_index(self):
+    for tab in self._tables():
+      tab.add_row(['x', 7, 1.0])
+      tab.create_index('first')
+      self.compare_data_for_col(tab.filter(first='x'), 'second', [3, 7])
+      self.compare_data_for_col(tab.filter(first='x', second=7), 'second',
+                                [7])
+      self.compare_data_for_col(tab.filter(first=None), 'second', [9])
+      self.compare_row_count(tab.filter(first='y'), 0)
+
+  def test_keeps_index_up_to_date(self):
+    for tab in self._tables():
+      tab.create_index('second')
+      tab.sort('second', '-')
+      self.compare_data_for_col(tab.filter(second=9), 'first', [None])
+      tab.second[0] = 1
+      self.compare_data_for_col(tab.filter(second=1), 'first', ['foo'])
+      tab['second'] = [4, 4, 5]
+      self.compare_data_for_col(tab.filter(second=4), 'first', ['foo', 'x'])
+      tab.rename_col('second', 'fourth')
+      self.assertTrue(tab.has_index('fourth'))
+      self.compare_data_for_col(tab.filter(fourth=5), 'first', [None])
+      loaded = cPickle.loads(cPickle.dumps(tab))
+      self.assertTrue(loaded.has_index('fourth'))
+      self.compare_data_for_col(loaded.filter(fourth=5), 'first', [None])
+      tab.remove_col('fourth')
+      self.assertFalse(tab.has_index('fourth'))
+      tab.create_index('first')
+      tab.drop_index('first')
+      self.assertFalse(tab.has_index('first'))
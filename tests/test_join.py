@@ -0,0 +1,31 @@
+import unittest
+
+from tap import join
+
+
+class TestJoinIndices(unittest.TestCase):
+
+  def test_joins_with_hash_and_sort_merge(self):
+    keys1 = [2, 1, None, 2, 5]
+    keys2 = [3, 2, None, 2, 1]
+    for method in join.JOIN_METHODS:
+      self.assertEqual(join.join_indices(keys1, keys2, 'inner', method),
+                       ([0, 0, 1, 2, 3, 3], [1, 3, 4, 2, 1, 3]))
+      self.assertEqual(join.join_indices(keys1, keys2, 'left', method),
+                       ([0, 0, 1, 2, 3, 3, 4], [1, 3, 4, 2, 1, 3, None]))
+      self.assertEqual(join.join_indices(keys1, keys2, 'right', method),
+                       ([None, 0, 3, 2, 0, 3, 1], [0, 1, 1, 2, 3, 3, 4]))
+      self.assertEqual(join.join_indices(keys1, keys2, 'outer', method),
+                       ([0, 0, 1, 2, 3, 3, 4, None], 
+                        [1, 3, 4, 2, 1, 3, None, 0]))
+
+  def test_detects_sorted_keys(self):
+    self.assertTrue(join.is_sorted([]))
+    self.assertTrue(join.is_sorted([(None, 1), (1, 0), (1, 0), (2, 0)]))
+    self.assertFalse(join.is_sorted([1, 3, 2]))
+    self.assertEqual(join.join_indices([1, 2, 2], [2, 2, 3], 'outer'),
+                     ([0, 1, 1, 2, 2, None], [None, 0, 1, 0, 1, 2]))
+
+  def test_raises_for_unknown_options(self):
+    self.assertRaises(ValueError, join.join_indices, [], [], 'cross')
+    self.assertRaises(ValueError, join.join_indices, [], [], 'inner', 'nested')
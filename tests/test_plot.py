@@ -44,6 +44,52 @@ class TestPlotExtension(unittest.TestCase):
     self.assertRaises(ValueError, tab.plot, x='second', y='third', y_range=[1,2,3])
     self.assertRaises(ValueError, tab.plot, x='second', y='third', z_range='st')
 
+  def test_grids_z_values(self):
+    if not HAS_MPL or not HAS_NUMPY:
+      return
+    from tap import plot
+    # the cell at (2, 1) holds two points, the cell at (1, 2) none
+    xi, yi, zi = plot.grid_z([0, 1, 2, 0, 2, 0, 1, 2, 2],
+                             [0, 0, 0, 2, 2, 1, 1, 1, 1],
+                             [1, 2, 3, 7, 9, 4, 5, 6, 8], grid_size=3)
+    self.assertEqual(list(xi), [0.0, 1.0, 2.0])
+    self.assertEqual(zi.shape, (3, 3))
+    self.assertEqual(zi[1].tolist(), [4.0, 5.0, 7.0])
+    self.assertAlmostEqual(zi[2, 1], 8.0)
+    self.assertFalse(np.ma.is_masked(zi))
+    tab = Tab(['x', 'y', 'z'], 'fff', x=[i%100 for i in range(20000)],
+              y=[i/100 for i in range(20000)], z=[i%7 for i in range(20000)])
+    tab.plot('x', 'y', 'z', z_interpol='linear', z_grid_size=50)
+
+  def test_downsamples_series(self):
+    if not HAS_NUMPY:
+      return
+    from tap import plot
+    xs = np.arange(1000, dtype=float)
+    ys = np.sin(xs/50.0)
+    ys[321] = 10.0
+    for method in plot.DOWNSAMPLE_METHODS:
+      dxs, dys = plot.downsample(xs, ys, 100, method)
+      self.assertTrue(len(dxs) <= 100)
+      self.assertEqual(len(dxs), len(dys))
+      self.assertTrue(np.all(np.diff(dxs) > 0))
+      self.assertTrue(np.all(np.sin(dxs/50.0)[dxs!=321] == dys[dxs!=321]))
+      if method != 'random':
+        # the spike is kept
+        self.assertEqual(dys.max(), 10.0)
+    dxs, dys = plot.downsample(xs, ys, 100, 'lttb')
+    self.assertEqual((dxs[0], dxs[-1]), (0.0, 999.0))
+    dxs, dys = plot.downsample([1, 2], [3, 4], 100)
+    self.assertEqual(list(dys), [3.0, 4.0])
+    self.assertRaises(ValueError, plot.downsample, xs, ys, 100, 'every_nth')
+    self.assertRaises(ValueError, plot.downsample, xs, ys, 2)
+    if not HAS_MPL:
+      return
+    tab = Tab(['score', 'rmsd'], 'ff', score=list(ys), rmsd=list(xs/100.0))
+    tab.plot('score', 'rmsd', max_points=50, downsample='random')
+    tab.plot_roc('score', 'rmsd', max_points=50)
+    tab.plot_enrichment('score', 'rmsd', max_points=50, downsample='minmax')
+
   def test_hexbin(self):
     if not HAS_MPL or not HAS_NUMPY:
       return
@@ -51,6 +97,36 @@ class TestPlotExtension(unittest.TestCase):
     self.assertRaises(ValueError, tab.plot_hexbin, x='second', y='third', x_range=1)
     self.assertRaises(ValueError, tab.plot_hexbin, x='second', y='third', x_range=[1,2,3])
 
+  def test_bins_points_for_density_plots(self):
+    if not HAS_NUMPY:
+      return
+    from tap import plot
+    grid, extent = plot.density_grid([0, 1, 1, 2, 2, 2], [0, 0, 0, 2, 2, 1],
+                                     num_bins=(2, 3))
+    self.assertEqual(extent, [0.0, 2.0, 0.0, 2.0])
+    self.assertEqual(grid.shape, (3, 2))
+    self.assertEqual(grid.filled(0).tolist(), [[1, 2], [0, 1], [0, 2]])
+    self.assertEqual(grid.mask.tolist(), [[False, False], [True, False], 
+                                          [True, False]])
+    grid, extent = plot.density_grid([0, 1, 1, 2, 5], [0, 0, 0, 2, 1], 
+                                     [1, 2, 4, 9, 7], num_bins=2, 
+                                     x_range=[0, 2], aggregate='mean')
+    self.assertEqual(grid.filled(0).tolist(), [[1.0, 3.0], [0.0, 9.0]])
+    grid, extent = plot.density_grid([0, 1, 1], [0, 0, 0], [1, 2, 4],
+                                     num_bins=2, aggregate='max')
+    # the range of y is widened around 0, the points fall into the upper bin
+    self.assertEqual(extent[2:], [-0.5, 0.5])
+    self.assertEqual(grid[1].tolist(), [1.0, 4.0])
+    self.assertRaises(ValueError, plot.density_grid, [0], [0], [0], 2, 
+                      None, None, 'median')
+    if not HAS_MPL:
+      return
+    tab = Tab(['x', 'y', 'z'], 'ffi', x=[0.5, 1.0, None, 2.0], 
+              y=[1.0, 2.0, 3.0, 2.0], z=[1, 2, 3, 4])
+    tab.plot_density('x', 'y', num_bins=10)
+    tab.plot_density('x', 'y', z='z', aggregate='max', binning=4)
+    self.assertRaises(ValueError, tab.plot_density, 'x', 'y', x_range=1)
+
   def test_plot_enrichment(self):
     if not HAS_MPL or not HAS_PIL:
       return
@@ -1,5 +1,5 @@
 import unittest, os, sys
-from tap import Tab, load
+from tap import Tab, load, load_chunks, RunningStats, RunningCorrel
 from tap import reader
 import fixtures
 import helper
@@ -158,3 +158,184 @@ class TestReader(helper.TabTestCase):
     # check content
     self.compare_data_from_dict(tab_loaded_stream, {'first': ['x','foo',None], 'second': [3,None,9], 'third': [None,2.2,3.3]})
     self.compare_data_from_dict(tab_loaded_fname, {'first': ['x','foo',None], 'second': [3,None,9], 'third': [None,2.2,3.3]})
+
+  def test_loads_csv_in_chunks(self):
+    import StringIO
+    data = 'a,b,c\n' + ''.join('%d,%d.5,x%d\n' % (i, i, i) for i in range(5))
+    chunks = list(load_chunks(StringIO.StringIO(data), chunk_rows=2, 
+                              format='csv'))
+    self.assertEqual([len(c.rows) for c in chunks], [2, 2, 1])
+    for chunk in chunks:
+      self.assertEqual(chunk.col_names, ['a', 'b', 'c'])
+      self.assertEqual(chunk.col_types, ['int', 'float', 'string'])
+    self.compare_data_from_dict(chunks[2], {'a': [4], 'b': [4.5], 'c': ['x4']})
+    self.assertEqual(list(load_chunks(StringIO.StringIO('a,b\n'), 
+                                      format='csv')), [])
+    self.assertRaises(IOError, list, load_chunks(StringIO.StringIO(''), 
+                                                 format='csv'))
+
+  def test_accumulates_statistics_over_chunks(self):
+    import StringIO
+    data = 'a,b\n' + ''.join('%d,%s\n' % (i, 'NA' if i%3 else i*0.5) 
+                             for i in range(10))
+    stats, correl = RunningStats(), RunningCorrel()
+    for chunk in load_chunks(StringIO.StringIO(data), chunk_rows=4,
+                             format='csv'):
+      stats.merge(chunk.running_stats('b'))
+      correl.merge(chunk.running_correl('a', 'b'))
+    tab = load(StringIO.StringIO(data), format='csv')
+    self.assertEqual(stats.count(), 4)
+    self.assertAlmostEqual(stats.mean(), tab.mean('b'))
+    self.assertAlmostEqual(stats.std_dev(), tab.std_dev('b'))
+    self.assertEqual((stats.min(), stats.max()), (0.0, 4.5))
+    self.assertAlmostEqual(correl.correl(), 1.0)
+
+  def test_widens_types_of_later_chunks(self):
+    import StringIO
+    data = 'a,b\n1,yes\n2,no\n3.5,NA\n4,maybe\n'
+    def _load(widen):
+      return list(load_chunks(StringIO.StringIO(data), chunk_rows=2, 
+                              format='csv', sample_rows=2, widen=widen))
+    first, second = _load('promote')
+    self.assertEqual(first.col_types, ['int', 'bool'])
+    self.assertEqual(second.col_types, ['float', 'string'])
+    self.compare_data_from_dict(second, {'a': [3.5, 4.0], 
+                                         'b': [None, 'maybe']})
+    first, second = _load('null')
+    self.assertEqual(second.col_types, ['int', 'bool'])
+    self.compare_data_from_dict(second, {'a': [None, 4], 'b': [None, None]})
+    self.assertRaises(ValueError, _load, 'error')
+    self.assertRaises(ValueError, load_chunks, 'x.csv', widen='foo')
+
+  def test_loads_ost_in_chunks(self):
+    tab = fixtures.create_test_table()
+    tab.save('chunks_out.tab')
+    chunks = list(load_chunks('chunks_out.tab', chunk_rows=2))
+    self.assertEqual([len(c.rows) for c in chunks], [2, 1])
+    self.compare_data_from_dict(chunks[0], {'first': ['x','foo'], 
+                                            'second': [3,None], 
+                                            'third': [None,2.2]})
+    self.assertRaises(ValueError, load_chunks, 'chunks_out.pickle')
+
+  def test_guesses_csv_types_while_converting(self):
+    import StringIO
+    data = 'a,b,c,d,e\n1,1,yes,x,NA\nNA,2.5,NO,NA,\n007,3,NULL,003,NA\n'
+    timings = {}
+    tab = load(StringIO.StringIO(data), format='csv', timings=timings)
+    self.assertEqual(tab.col_types, ['int', 'float', 'bool', 'string', 
+                                     'string'])
+    self.compare_data_from_dict(tab, {'a': [1, None, 7], 
+                                      'b': [1.0, 2.5, 3.0],
+                                      'c': [True, False, None],
+                                      'd': ['x', None, '003'],
+                                      'e': [None, '', None]})
+    self.assertEqual(sorted(timings.keys()), ['build', 'convert', 'read'])
+    self.assertRaises(ValueError, load, StringIO.StringIO('a,b\n1\n'), 
+                      format='csv')
+
+  def test_widens_csv_columns_keeping_original_strings(self):
+    import StringIO
+    data = ('zip,flag,x,n,y\n007,yes,1,NA,1\n2,Yes,2.50,,2.5\n'
+            'abc,maybe,,x,\n,NA,x,,3\n')
+    batch_rows = reader._CSV_BATCH_ROWS
+    try:
+      for rows in (1, 2, batch_rows):
+        reader._CSV_BATCH_ROWS = rows
+        tab = load(StringIO.StringIO(data), format='csv')
+        self.assertEqual(tab.col_types, ['string', 'string', 'string',
+                                         'string', 'float'])
+        self.compare_data_from_dict(tab, {'zip': ['007', '2', 'abc', ''],
+                                          'flag': ['yes', 'Yes', 'maybe', 
+                                                   None],
+                                          'x': ['1', '2.50', '', 'x'],
+                                          'n': [None, '', 'x', ''],
+                                          'y': [1.0, 2.5, None, 3.0]})
+    finally:
+      reader._CSV_BATCH_ROWS = batch_rows
+
+  def test_saves_and_loads_tapb_files(self):
+    import StringIO
+    tab = fixtures.create_test_table()
+    tab.add_col('fourth', 'bool', [True, None, False])
+    tab.add_row(['big', 2**70, float('inf'), True])
+    tab.comment = 'scores'
+    tab.save('saveloadtable_out.tapb', format='tapb')
+    stream = StringIO.StringIO()
+    tab.set_storage('columnar')
+    tab.save(stream, format='tapb')
+    expected = {'first': ['x','foo',None,'big'], 'second': [3,None,9,2**70],
+                'third': [None,2.2,3.3,float('inf')],
+                'fourth': [True,None,False,True]}
+    for source in ['saveloadtable_out.tapb', 
+                   StringIO.StringIO(stream.getvalue())]:
+      loaded = load(source, format='tapb')
+      self.assertEqual(loaded.get_storage(), 'columnar')
+      self.assertEqual(loaded.col_types, ['string', 'int', 'float', 'bool'])
+      self.assertEqual(loaded.comment, 'scores')
+      self.compare_data_from_dict(loaded, expected)
+
+  def test_loads_subset_of_tapb_columns(self):
+    tab = fixtures.create_test_table()
+    tab.save('saveloadtable_out.tapb', format='tapb')
+    loaded = load('saveloadtable_out.tapb', cols=['third', 'first'])
+    self.assertEqual(loaded.col_names, ['third', 'first'])
+    self.compare_data_from_dict(loaded, {'first': ['x','foo',None], 
+                                         'third': [None,2.2,3.3]})
+    self.assertRaises(ValueError, load, 'saveloadtable_out.tapb', 
+                      cols=['fifth'])
+    self.assertRaises(ValueError, load, 'saveloadtable_out.tab', 
+                      cols=['first'])
+    empty = Tab(['a'], 'i')
+    empty.save('saveloadtable_empty_out.tapb', format='tapb')
+    self.compare_row_count(load('saveloadtable_empty_out.tapb'), 0)
+    self.assertRaises(IOError, load, os.path.join('tests/data', 
+                                                  'emptytable.csv'), 
+                      format='tapb')
+
+  def test_loads_tables_lazily(self):
+    tab = fixtures.create_test_table()
+    tab.save('lazy_out.tab')
+    tab.save('lazy_out.tapb', format='tapb')
+    for filename in ['lazy_out.tab', 'lazy_out.tapb']:
+      loaded = load(filename, lazy=True)
+      columns = loaded.rows.columns
+      self.assertEqual(loaded.col_types, ['string', 'int', 'float'])
+      self.compare_row_count(loaded, 3)
+      self.assertFalse(columns.is_loaded(1))
+      self.assertEqual(loaded.max('second'), 9)
+      self.assertTrue(columns.is_loaded(1))
+      self.assertFalse(columns.is_loaded(0))
+      self.assertEqual(loaded.zip('third', 'second'), 
+                       [(None, 3), (2.2, None), (3.3, 9)])
+      self.assertFalse(columns.is_loaded(0))
+      self.assertEqual(loaded.rows[1], ['foo', None, 2.2])
+      self.compare_data_from_dict(loaded, {'first': ['x','foo',None], 
+                                           'second': [3,None,9], 
+                                           'third': [None,2.2,3.3]})
+    self.assertRaises(ValueError, load, 'lazy_out.csv', lazy=True)
+
+  def test_parses_lazy_ost_files_once(self):
+    import StringIO
+    data = 'x[int] y[float] z\n1 1.5 a\n2 NA b\n3 2.5 c\n'
+    parse_row = reader._parse_ost_row
+    parsed = []
+    def _parse_row(line):
+      parsed.append(line)
+      return parse_row(line)
+    reader._parse_ost_row = _parse_row
+    try:
+      tab = load(StringIO.StringIO(data), format='ost', lazy=True)
+      self.assertEqual(tab.sum('y'), 4.0)
+      self.compare_data_from_dict(tab, {'x': [1, 2, 3], 'y': [1.5, None, 2.5],
+                                        'z': ['a', 'b', 'c']})
+    finally:
+      reader._parse_ost_row = parse_row
+    self.assertEqual(len(parsed), 3)
+
+  def test_loads_ost_comments_lazily(self):
+    import StringIO
+    data = '# comment\nx[int] y\n\n  # another comment\n1 "a b"\n \n2 c'
+    tab = load(StringIO.StringIO(data), format='ost', lazy=True)
+    self.compare_data_from_dict(tab, {'x': [1, 2], 'y': ['a b', 'c']})
+    self.assertRaises(IOError, load, StringIO.StringIO('# comment\n'), 
+                      format='ost', lazy=True)
@@ -91,6 +91,33 @@ class TestTabBase(helper.TabTestCase):
     for i in (35,15,50,40,20):
       tab.add_row([i])
     self.assertEqual(tab.percentiles('nums', [0,30,40,100]), [15,20,35,50])
+  def test_keeps_column_lookup_consistent(self):
+    import cPickle
+    tab = fixtures.create_test_table()
+    self.assertEqual(tab.col_index('third'), 2)
+    tab.add_col('fourth', 'i')
+    self.assertEqual(tab.col_index('fourth'), 3)
+    tab.remove_col('first')
+    self.assertEqual(tab.col_index('second'), 0)
+    self.assertEqual(tab.col_index('fourth'), 2)
+    self.assertRaises(ValueError, tab.col_index, 'first')
+    tab.rename_col('second', 'first')
+    self.assertEqual(tab.col_index('first'), 2)
+    self.assertEqual(tab.col_index('third'), 0)
+    self.assertFalse(tab.has_col('second'))
+    self.assertRaises(ValueError, tab.add_col, 'x', 'i', [1, 2])
+    self.assertFalse(tab.has_col('x'))
+    tab.extend(Tab(['y'], 'i', y=[1]))
+    self.assertEqual(tab.col_index('y'), 3)
+    loaded = cPickle.loads(cPickle.dumps(tab))
+    self.assertEqual(loaded.col_index('y'), 3)
+    self.assertEqual(list(loaded.y), [None, None, None, 1])
+    # direct modifications of the column names are picked up
+    tab.col_names[0] = 'renamed'
+    self.assertEqual(tab.col_index('renamed'), 0)
+    self.assertRaises(ValueError, tab.col_index, 'third')
+    self.assertRaises(ValueError, tab.col_index, ['third'])
+
   def test_default_initialises_to_empty_table(self):
     tab = Tab()
     self.compare_col_count(tab, 0)
@@ -622,6 +649,34 @@ class TestTabBase(helper.TabTestCase):
     tab.sort('third', '+')
     self.compare_data_from_dict(tab, {'first': [None,'foo','x'], 'second': [9,None,3], 'third': [3.3,2.2,None]})
 
+  def testsortTabByMultipleColumns(self):
+    for storage in ['rows', 'columnar']:
+      tab = Tab(['a', 'b', 'c'], 'ifb', a=[2, 1, 2, None, 1],
+                b=[0.5, None, 1.5, 2.0, 3.0], c=[True, False, None, True, False])
+      tab.set_storage(storage)
+      perm = tab.argsort(['a', 'b'], ['-', '+'])
+      self.assertEqual(perm, [3, 4, 1, 2, 0])
+      # argsort leaves the table untouched
+      self.compare_data_for_col(tab, 'a', [2, 1, 2, None, 1])
+      self.assertEqual(tab.sort(['a', 'b'], ['-', '+']), perm)
+      self.compare_data_for_col(tab, 'b', [2.0, 3.0, None, 1.5, 0.5])
+      # order given as a single string applies to all columns
+      tab.sort(['c', 'a'], '-')
+      self.compare_data_for_col(tab, 'c', [None, False, False, True, True])
+      self.compare_data_for_col(tab, 'a', [2, 1, 1, None, 2])
+      self.assertRaises(ValueError, tab.sort, ['a', 'b'], ['+'])
+      self.assertRaises(ValueError, tab.sort, 'a', na_position='middle')
+
+  def testsortTabWithNaPosition(self):
+    for storage in ['rows', 'columnar']:
+      tab = Tab(['a', 'b'], 'if', a=[2, None, 1, None], b=[1.0, 2.0, None, 0.5])
+      tab.set_storage(storage)
+      self.assertEqual(tab.argsort('a', '-', na_position='last'), [2, 0, 1, 3])
+      self.assertEqual(tab.argsort('a', '+', na_position='last'), [0, 2, 1, 3])
+      self.assertEqual(tab.argsort('a', '+', na_position='first'), [1, 3, 0, 2])
+      self.assertEqual(tab.argsort(['a', 'b'], '-', na_position='first'),
+                       [3, 1, 2, 0])
+
 
   def testmergeTab(self):
     '''
@@ -668,6 +723,29 @@ class TestTabBase(helper.TabTestCase):
     tab_merged.sort('x', order='-')
     self.compare_data_from_dict(tab_merged, {'x': [1,3], 'y': [10,20], 'u': [100,200]})
     
+  def test_merges_with_join_types(self):
+    tab1 = Tab(['x','y'], 'ii', x=[3,1,2,1], y=[30,10,20,11])
+    tab2 = Tab(['x','y'], 'fi', x=[1.0,4.0,1.0], y=[100,400,101])
+    for method in ['hash', 'sort', 'auto']:
+      merged = merge(tab1, tab2, 'x', how='inner', method=method)
+      self.compare_data_from_dict(merged, {'x': [1,1,1,1], 
+                                           'y': [10,10,11,11],
+                                           'y_2': [100,101,100,101]})
+      merged = merge(tab1, tab2, 'x', how='left', method=method)
+      self.compare_data_for_col(merged, 'y_2', [None,100,101,None,100,101])
+      merged = merge(tab1, tab2, 'x', how='right', method=method)
+      self.compare_data_from_dict(merged, {'x': [1,1,4,1,1], 
+                                           'y': [10,11,None,10,11],
+                                           'y_2': [100,100,400,101,101]})
+      self.assertTrue(isinstance(merged.rows[2][0], int))
+      merged = merge(tab1, tab2, 'x', method=method)
+      self.compare_data_for_col(merged, 'x', [3,1,1,2,1,1,4])
+    tab1.set_storage('columnar')
+    merged = merge(tab1, tab2, 'x', only_matching=True)
+    self.assertEqual(merged.get_storage(), 'columnar')
+    self.compare_row_count(merged, 4)
+    self.assertRaises(ValueError, merge, tab1, tab2, 'x', how='cross')
+
   def testfilterTab(self):
     tab = fixtures.create_test_table()
     tab.add_row(['foo',1,5.15])
@@ -688,7 +766,22 @@ class TestTabBase(helper.TabTestCase):
     
     # raise Error when using non existing column name for filtering
     self.assertRaises(ValueError,tab.filter,first='foo',nonexisting=1)
-    
+
+  def testfilterTabWithSetsAndRanges(self):
+    tab = fixtures.create_test_table()
+    tab.add_row(['foo',1,5.15])
+    tab.add_row(['foo',0,1])
+    for storage in ('rows', 'columnar'):
+      tab.set_storage(storage)
+      filtered = tab.filter(second=set([1, 9, None]))
+      self.compare_data_for_col(filtered, 'first', ['foo', None, 'foo'])
+      self.assertEqual(filtered.get_storage(), storage)
+      filtered = tab.filter(tab.third.between(1.0, 3.0), first='foo')
+      self.compare_data_for_col(filtered, 'second', [None, 0])
+      self.assertEqual(tab.filter_indices(first=set(['x', 'bar'])), [0])
+      self.assertEqual(tab.filter_mask(tab.second>0, lambda row: row[2]>5),
+                       [False, False, False, True, False])
+
   def testminTab(self):
     tab = fixtures.create_test_table()
     tab.add_col('fourth','bool',[True,True,False])
@@ -998,6 +1091,76 @@ class TestTabBase(helper.TabTestCase):
     auc = tab.compute_roc_auc(score_col='score', score_dir='+', class_col='classific')
     self.assertAlmostEquals(auc, auc_ref)
 
+  def testCalcROCForSeveralColumns(self):
+    for storage in ['rows', 'columnar']:
+      tab = Tab(['classific', 'score', 'other', 'none'], 'bffi',
+                classific=[True, False, None, True, False],
+                score=[0.9, 0.2, 0.5, 0.4, None],
+                other=[1.0, 2.0, 3.0, 1.0, 0.5],
+                none=[None, None, None, None, None])
+      tab.set_storage(storage)
+      rocs = tab.compute_roc(['score', 'other', 'none'], 'classific',
+                             score_dir='+')
+      self.assertEqual(rocs[0], tab.compute_roc('score', 'classific', '+'))
+      self.assertEqual(rocs[0], ([0.0, 0.0, 0.0, 1.0], [0.0, 0.5, 1.0, 1.0]))
+      self.assertEqual(rocs[1], ([0.0, 0.5, 0.5, 1.0], [0.0, 0.0, 1.0, 1.0]))
+      self.assertEqual(rocs[2], None)
+      enrs = tab.compute_enrichment(['score', 'other'], 'classific', '+')
+      self.assertEqual(enrs[1], ([0.0, 0.25, 0.75, 1.0], [0.0, 0.0, 1.0, 1.0]))
+      # the table is not sorted
+      self.compare_data_for_col(tab, 'score', [0.9, 0.2, 0.5, 0.4, None])
+      if HAS_NUMPY:
+        aucs = tab.compute_roc_auc(['score', 'other', 'none'], 'classific',
+                                   score_dir='+')
+        self.assertEqual(aucs, [1.0, 0.5, None])
+
+  def testDescribe(self):
+    tab = Tab(['a', 'b', 'c', 'd'], 'ifbs', a=[4, None, 1, 3, 2], 
+              b=[None, None, None, None, None], c=[True, False, True, None, True],
+              d=['x', 'y', None, 'z', 'x'])
+    for storage in ['rows', 'columnar']:
+      tab.set_storage(storage)
+      res = tab.describe(percentiles=[50, 100])
+      self.assertEqual(res.col_names, ['col_name', 'count', 'mean', 'median',
+                                       'std_dev', 'min', 'max', 'p50', 'p100'])
+      self.compare_data_for_col(res, 'col_name', ['a', 'b', 'c'])
+      self.assertEqual(res.rows[0][1:], [4, 2.5, 2.5, 1.25**0.5, 1.0, 4.0, 
+                                         3.0, 4.0])
+      self.assertEqual(res.rows[1][1:], [0]+[None]*7)
+      self.assertAlmostEqual(res.rows[2][2], 0.75)
+      self.assertEqual(tab.describe(['a', 'c'], workers=2).rows,
+                       tab.describe(['a', 'c']).rows)
+      self.assertRaises(TypeError, tab.describe, ['d'])
+      self.assertRaises(ValueError, tab.describe, percentiles=[101])
+
+  def testEvaluateScores(self):
+    tab = Tab(['score', 'rmsd', 'classific', 'pred'], 'ffbb',
+              score=[2.64,1.11,2.17,0.45,0.15,0.85,1.13,2.90,0.50,1.03,1.46,2.83],
+              rmsd=[9.58,1.61,7.48,0.29,1.68,3.52,3.34,8.17,4.31,2.85,6.28,None],
+              classific=[False,True,False,True,True,False,False,False,False,False,False,True],
+              pred=[False,True,True,True,False,False,False,None,False,False,True,True])
+    for storage in ['rows', 'columnar']:
+      tab.set_storage(storage)
+      res = tab.evaluate_scores(['score', 'rmsd'], 'classific', 
+                                metrics=['roc_auc', 'enrichment_auc', 'mcc'])
+      self.assertEqual(res.col_names, ['score_col', 'roc_auc', 
+                                       'enrichment_auc', 'mcc'])
+      self.compare_data_for_col(res, 'score_col', ['score', 'rmsd'])
+      for row in res.rows:
+        if HAS_NUMPY:
+          self.assertAlmostEqual(row[1], tab.compute_roc_auc(row[0], 'classific'))
+          self.assertAlmostEqual(row[2], tab.compute_enrichment_auc(row[0], 
+                                                                   'classific'))
+        self.assertAlmostEqual(row[3], tab.compute_mcc(row[0], 'classific'))
+      res = tab.evaluate_scores(['score', 'pred'], 'rmsd', metrics=['mcc'], 
+                                score_cutoff=1.0, workers=2)
+      self.assertAlmostEqual(res.rows[0][1], 
+                             tab.compute_mcc('score', 'rmsd', score_cutoff=1.0))
+      self.assertAlmostEqual(res.rows[1][1], tab.compute_mcc('pred', 'rmsd'))
+      self.assertRaises(ValueError, tab.evaluate_scores, ['score'], 'rmsd',
+                        metrics=['auc'])
+      self.assertRaises(TypeError, tab.evaluate_scores, ['pred'], 'rmsd')
+
   def testCalcMCC(self):
     tab = Tab(['score', 'rmsd', 'class_rmsd', 'class_score', 'class_wrong'], 'ffbbb',
                 score=      [2.64, 1.11, 2.17, 0.45,0.15,0.85, 1.13, 2.90, 0.50, 1.03, 1.46, 2.83, 1.15, 2.04, 0.67, 1.27, 2.22, 1.90, 0.68, 0.36,1.04, 2.46, 0.91,0.60],
@@ -1225,6 +1388,145 @@ class TestTabBase(helper.TabTestCase):
     tab.add_row([None,8, 2])
     self.assertAlmostEquals(tab.spearman_correl('second','third'), -0.316227766)
     
+  def testrunning_stats(self):
+    tab = fixtures.create_test_table()
+    tab.add_row(['foo',4, 6.3])
+    for storage in ['rows', 'columnar']:
+      tab.set_storage(storage)
+      stats = tab.running_stats('second')
+      self.assertEqual(stats.count(), 3)
+      self.assertAlmostEqual(stats.mean(), tab.mean('second'))
+      self.assertAlmostEqual(stats.std_dev(), tab.std_dev('second'))
+      self.assertEqual((stats.min(), stats.max()), (3, 9))
+      merged = tab.filter(first='x').running_stats('second')
+      merged.merge(tab.filter(first='foo').running_stats('second'))
+      merged.merge(tab.filter(first=None).running_stats('second'))
+      self.assertAlmostEqual(merged.mean(), stats.mean())
+      self.assertAlmostEqual(merged.std_dev(), stats.std_dev())
+      self.assertEqual(tab.filter(first='y').running_stats('third').count(), 0)
+      correl = tab.running_correl('second', 'third')
+      self.assertEqual(correl.count(), 2)
+      self.assertAlmostEqual(correl.correl(), -1.0)
+      self.assertRaises(TypeError, tab.running_stats, 'first')
+
+  def testgroup_by(self):
+    tab = Tab(['target', 'method', 'score', 'hit', 'name'], 'sifbs',
+              target=['a', 'b', 'a', 'a', None, 'b'],
+              method=[1, 1, 2, 1, 1, None],
+              score=[1.0, 4.0, 3.0, None, 2.0, 6.0],
+              hit=[True, False, True, False, None, None],
+              name=['x', 'y', None, 'z', 'u', 'w'])
+    for storage in ['rows', 'columnar']:
+      tab.set_storage(storage)
+      groups = tab.group_by('target')
+      self.assertEqual(len(groups), 3)
+      self.assertEqual(groups.keys(), ['a', 'b', None])
+      stats = groups.agg(mean='score', count=['score', 'name'], sum='hit',
+                         median='score', std_dev='score', min='name', 
+                         max=['score', 'hit'])
+      self.assertEqual(stats.col_names, ['target', 'count_score', 'count_name', 
+                                         'sum_hit', 'mean_score', 
+                                         'median_score', 'std_dev_score', 
+                                         'min_name', 'max_score', 'max_hit'])
+      self.assertEqual(stats.col_types, ['string', 'int', 'int', 'int', 
+                                         'float', 'float', 'float', 'string', 
+                                         'float', 'bool'])
+      self.compare_data_for_col(stats, 'count_score', [2, 2, 1])
+      self.compare_data_for_col(stats, 'count_name', [2, 2, 1])
+      self.compare_data_for_col(stats, 'sum_hit', [2, 0, 0])
+      self.compare_data_for_col(stats, 'mean_score', [2.0, 5.0, 2.0])
+      self.compare_data_for_col(stats, 'median_score', [2.0, 5.0, 2.0])
+      self.compare_data_for_col(stats, 'std_dev_score', [1.0, 1.0, 0.0])
+      self.compare_data_for_col(stats, 'min_name', ['x', 'w', 'u'])
+      self.compare_data_for_col(stats, 'max_hit', [True, False, None])
+      stats = tab.group_by(['target', 'method']).agg(mean='score')
+      self.assertEqual(stats.col_names, ['target', 'method', 'mean_score'])
+      self.assertEqual(stats.rows[0], ['a', 1, 1.0])
+      self.assertEqual(stats.rows[2], ['a', 2, 3.0])
+      self.assertEqual(len(stats.rows), 5)
+      rows = dict((key, view) for key, view in tab.group_by('target'))
+      self.assertEqual(rows['a'].max('score'), 3.0)
+      self.assertEqual(len(rows[None].rows), 1)
+      self.assertRaises(TypeError, groups.agg, mean='name')
+      self.assertRaises(ValueError, groups.agg, mode='score')
+      self.assertRaises(ValueError, tab.group_by, 'target', 'tree')
+
+  def testhistogram(self):
+    tab = Tab(['x', 'w'], 'fi', x=[0.0, 0.5, 1.0, 1.5, 2.0, -0.1, None, 
+                                   float('nan'), 2.5, 1.2],
+              w=[1, 2, 3, 4, 5, 6, 7, 8, 9, None])
+    for storage in ['rows', 'columnar']:
+      tab.set_storage(storage)
+      hist = tab.histogram('x', num_bins=4, bounds=(0, 2))
+      self.assertEqual(hist.edges, [0.0, 0.5, 1.0, 1.5, 2.0])
+      # the last bin includes the upper edge
+      self.assertEqual(hist.counts, [1, 1, 2, 2])
+      self.assertEqual((hist.below, hist.above, hist.na_count), (1, 1, 2))
+      hist = tab.histogram('x', edges=[-1, 1, 3], weights='w')
+      self.assertEqual(hist.counts, [9, 21])
+      self.assertEqual(hist.na_count, 15)
+      # by default, the bins span the values
+      hist = tab.histogram('x', num_bins=2)
+      self.assertEqual(hist.edges, [-0.1, 1.2, 2.5])
+      self.assertEqual(hist.counts, [4, 4])
+      merged = tab.filter(w=1).histogram('x', edges=hist.edges)
+      merged.merge(tab.filter(w=5).histogram('x', edges=hist.edges))
+      self.assertEqual(merged.counts, [1, 1])
+      self.assertRaises(ValueError, merged.merge, tab.histogram('x'))
+    self.assertEqual(Tab(['x'], 'i', x=[3, 3]).histogram('x', 2).edges, 
+                     [2.5, 3.0, 3.5])
+    self.assertRaises(ValueError, tab.histogram, 'x', edges=[1, 1, 2])
+    self.assertRaises(ValueError, tab.histogram, 'x', bounds=(1, 0))
+    self.assertRaises(TypeError, Tab(['s'], s=['a']).histogram, 's')
+
+  def testquantile_sketch(self):
+    values = [float((i*37)%1000) for i in range(5000)]
+    tab = Tab(['x'], x=values+[None])
+    for storage in ['rows', 'columnar']:
+      tab.set_storage(storage)
+      sketch = tab.quantile_sketch('x')
+      self.assertEqual(sketch.count(), 5000)
+      self.assertEqual(sketch.percentiles([0, 100]), [0.0, 999.0])
+      merged = QuantileSketch(k=50)
+      for start in range(0, 5000, 700):
+        merged.merge(Tab(['x'], x=values[start:start+700]).quantile_sketch('x', k=50))
+      self.assertEqual(merged.count(), 5000)
+      for nth, value in zip([10, 50, 90], merged.percentiles([10, 50, 90])):
+        self.assertTrue(abs(value-tab.percentiles('x', [nth])[0]) < 50)
+      self.assertTrue(abs(merged.median()-tab.median('x')) < 50)
+      self.assertEqual(tab.filter(x=None).quantile_sketch('x').median(), None)
+    self.assertRaises(TypeError, Tab(['s'], s=['a']).quantile_sketch, 's')
+
+  def testcorrel_matrix(self):
+    tab = fixtures.create_test_table()
+    tab.add_row(['foo',4, 3.3])
+    tab.add_row([None,5, 6.3])
+    tab.add_row([None,8, 2])
+    tab.add_col('fourth', 'int', [1, 2, 3, 3, 5, 6])
+    for storage in ['rows', 'columnar']:
+      tab.set_storage(storage)
+      mat = tab.correl_matrix()
+      self.assertEqual(mat.col_names, ['col_name', 'second', 'third', 'fourth'])
+      self.compare_data_for_col(mat, 'col_name', ['second', 'third', 'fourth'])
+      for row in mat.rows:
+        for col, coeff in zip(mat.col_names[1:], row[1:]):
+          self.assertAlmostEqual(coeff, tab.correl(row[0], col))
+      self.assertAlmostEqual(mat.rows[0][2], -0.4954982578)
+      mat = tab.correl_matrix(['second', 'third'], method='spearman')
+      self.assertAlmostEqual(mat.rows[0][2], -0.316227766)
+      self.assertAlmostEqual(mat.rows[1][1], -0.316227766)
+      self.assertAlmostEqual(mat.rows[0][1], 1.0)
+      # without pairwise_na, rows 0 and 1 are ignored for all pairs
+      mat = tab.correl_matrix(['second', 'third', 'fourth'], pairwise_na=False)
+      self.assertAlmostEqual(mat.rows[0][3], 
+                             tab.filter(lambda row: None not in row[1:]).correl(
+                             'second', 'fourth'))
+      tab.add_col('constant', 'float', 1.0)
+      self.assertEqual(tab.correl_matrix(['second', 'constant']).rows[0][2], None)
+      self.assertRaises(TypeError, tab.correl_matrix, ['first'])
+      self.assertRaises(ValueError, tab.correl_matrix, method='kendall')
+      tab.remove_col('constant')
+
   def testextend(self):
     '''
      first  second  third 
@@ -0,0 +1,84 @@
+import unittest
+import cPickle
+import StringIO
+
+from tap import Tab
+from tap.base import TabView
+import fixtures
+import helper
+
+
+class TestTabView(helper.TabTestCase):
+
+  def _tables(self):
+    tab = fixtures.create_test_table()
+    tab.add_row(['bar', 1, 5.0])
+    columnar = fixtures.create_test_table()
+    columnar.add_row(['bar', 1, 5.0])
+    columnar.set_storage('columnar')
+    return tab, columnar
+
+  def test_views_rows_without_copying(self):
+    for tab in self._tables():
+      view = tab.view([3, 0])
+      self.assertTrue(isinstance(view, TabView))
+      self.assertFalse(view.is_materialized())
+      self.assertEqual(view.get_storage(), tab.get_storage())
+      self.compare_data_from_dict(view, {'first': ['bar', 'x'],
+                                         'second': [1, 3],
+                                         'third': [5.0, None]})
+      self.compare_data_for_col(tab.head(2), 'first', ['x', 'foo'])
+      self.compare_data_for_col(tab.tail(1), 'first', ['bar'])
+      self.compare_data_for_col(tab.view(slice(None, None, -2)), 'second',
+                                [1, None])
+      self.compare_data_for_col(tab.view([-1]), 'first', ['bar'])
+      self.assertRaises(IndexError, tab.view, [4])
+
+  def test_supports_read_only_methods(self):
+    for tab in self._tables():
+      view = tab.filter_view(tab.second>0)
+      self.assertEqual(view.sum('second'), 13)
+      self.assertAlmostEqual(view.mean('third'), 4.15)
+      self.assertEqual(view.max('first'), 'x')
+      self.assertEqual(view.zip('first', 'second'),
+                       [('x', 3), (None, 9), ('bar', 1)])
+      self.compare_data_for_col(view.filter(first='bar'), 'second', [1])
+      self.assertEqual(view.to_string(), view.to_tab().to_string())
+      stream = StringIO.StringIO()
+      view.save(stream, format='csv')
+      self.assertEqual(stream.getvalue().splitlines(),
+                       ['first,second,third', 'x,3,NA', 'NA,9,3.3',
+                        'bar,1,5.0'])
+
+  def test_chains_views_on_the_original_table(self):
+    for tab in self._tables():
+      view = tab.filter_view(tab.second>0).filter_view(third=None)
+      self.assertTrue(view._parent is tab)
+      self.assertEqual(list(view.rows.indices), [0])
+      self.compare_data_for_col(view.head(1), 'first', ['x'])
+
+  def test_copies_rows_on_write(self):
+    for tab in self._tables():
+      view = tab.head(2)
+      view.add_row(['y', 7, 1.0])
+      view.second[0] = 4
+      self.assertTrue(view.is_materialized())
+      self.compare_data_for_col(view, 'second', [4, None, 7])
+      self.compare_data_for_col(tab, 'second', [3, None, 9, 1])
+      view = tab.view([1, 2])
+      sorted_view = tab.view([1, 2])
+      sorted_view.sort('second', '+')
+      self.compare_data_for_col(sorted_view, 'second', [9, None])
+      # modifying the table gives the views their own copy
+      tab.second[2] = 0
+      tab.add_col('fourth', 'int', 1)
+      self.compare_data_for_col(tab, 'second', [3, None, 0, 1])
+      self.assertTrue(view.is_materialized())
+      self.compare_data_for_col(view, 'second', [None, 9])
+      self.compare_col_count(view, 3)
+
+  def test_pickles_views_as_tables(self):
+    for tab in self._tables():
+      loaded = cPickle.loads(cPickle.dumps(tab.view([2, 0])))
+      self.assertEqual(type(loaded), Tab)
+      self.compare_data_for_col(loaded, 'first', [None, 'x'])